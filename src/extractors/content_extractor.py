@@ -3,13 +3,25 @@
 """
 
 import logging
-from src.extractors.image_extractor import extract_images_from_xml
-from src.extractors.smartart_extractor import extract_smartart_from_xml, extract_embedded_objects_from_xml
+from src.extractors.extractor_registry import default_registry
 
 logger = logging.getLogger(__name__)
 
-def extract_paragraph_content(para, output_dir, image_references, quick_mode=True):
-    """提取段落中的SmartArt和嵌入对象内容，不再提取图片（避免重复）"""
+def extract_paragraph_content(para, output_dir, image_references, quick_mode=True, conversion_pool=None,
+                              metafile_cache=None, materializer=None, smartart_cache=None, sidecar_pack=None,
+                              embedded_parser=None, extractor_registry=None, embedded_cache=None):
+    """
+    提取段落中的图片、SmartArt和嵌入对象内容
+    conversion_pool: 可选的EMF/WMF转换进程池（非快速模式下使用）
+    metafile_cache: 可选的EMF/WMF转换持久化缓存
+    materializer: 可选的 ImageMaterializer，提供时图片延迟到遍历结束后物化
+    smartart_cache: 可选的 SmartArtCache，同一文档内SmartArt部件只解析一次
+    sidecar_pack: 可选的 SidecarPack，SmartArt和嵌入对象的详细信息登记到文档级数据包
+    embedded_parser: 可选的 EmbeddedDocumentParser，解析嵌入对象中的 .docx/.xlsx 载荷
+    extractor_registry: 可选的 ExtractorRegistry（src.extractors.extractor_registry），默认使用内置提取器。
+        每个 run 元素只遍历一次，匹配的元素分发给对应的提取器，不再为每种内容序列化、解析 run 的XML
+    embedded_cache: 可选的 EmbeddedObjectCache，嵌入对象部件的内容哈希只计算一次
+    """
     content_nodes = []
     context = f"段落: {para.text[:20] if para.text else ''}..." if para.text else "段落"
     
@@ -18,40 +30,30 @@ def extract_paragraph_content(para, output_dir, image_references, quick_mode=Tru
     images_dir = os.path.join(output_dir, "images")
     os.makedirs(images_dir, exist_ok=True)
     
+    registry = extractor_registry if extractor_registry is not None else default_registry()
+    
     for run_idx, run in enumerate(para.runs):
-        if run._element is not None and run._element.xml:
+        if run._element is not None:
             try:
-                # 提取图片（为了在内容结构中创建节点）
-                images = extract_images_from_xml(
-                    run._element.xml,
-                    para.part,
-                    images_dir,
-                    image_references,
-                    f"{context} (运行 {run_idx})"
-                )
-                if images:
-                    content_nodes.extend(images)
-                
-                # 提取SmartArt
-                smartarts = extract_smartart_from_xml(
-                    run._element.xml,
-                    para.part,
-                    output_dir,
-                    f"{context} (运行 {run_idx})"
-                )
-                if smartarts:
-                    content_nodes.extend(smartarts)
-                
-                # 提取嵌入对象 (OLE Objects)
-                embedded_objects = extract_embedded_objects_from_xml(
-                    run._element.xml,
-                    para.part,
-                    output_dir,
-                    f"{context} (运行 {run_idx})",
-                    quick_mode
+                # 图片、SmartArt、嵌入对象 (OLE Objects) 按提取器注册顺序输出
+                nodes = registry.extract(
+                    run._element,
+                    doc_part=para.part,
+                    output_dir=output_dir,
+                    images_dir=images_dir,
+                    image_references=image_references,
+                    context=f"{context} (运行 {run_idx})",
+                    quick_mode=quick_mode,
+                    conversion_pool=conversion_pool,
+                    metafile_cache=metafile_cache,
+                    materializer=materializer,
+                    smartart_cache=smartart_cache,
+                    sidecar_pack=sidecar_pack,
+                    embedded_parser=embedded_parser,
+                    embedded_cache=embedded_cache
                 )
-                if embedded_objects:
-                    content_nodes.extend(embedded_objects)
+                if nodes:
+                    content_nodes.extend(nodes)
                     
             except Exception as e:
                 logger.error(f"提取段落内容失败: {e}")
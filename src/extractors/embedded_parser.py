@@ -0,0 +1,109 @@
+"""
+嵌入文档解析器 - 解析OLE嵌入对象中的 .docx / .xlsx 载荷
+
+嵌入的Word文档（Word.Document.12 等，载荷部件为完整的DOCX包）交给 parse_docx 递归解析，
+与外层文档共用输出目录（图片按内容哈希命名，写入同一个 images/ 目录）、EMF/WMF转换进程池和
+缓存、SmartArt缓存和旁路数据包；嵌入的Excel工作簿用 src.utils.xlsx_reader 流式读取单元格值。
+旧版二进制格式（.doc/.xls 的OLE复合文档）不解析。
+
+解析结果附加到嵌入对象节点:
+    "embedded_document": {"metadata", "sections", "images", "processing_info"}
+    "embedded_workbook": {"sheets": [{"name", "rows", "row_count"}], "truncated"?}
+超出时间预算时节点带 "embedded_skipped": "time_budget"，解析失败时带 "embedded_error"。
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+
+from src.utils.xlsx_reader import read_xlsx, DEFAULT_XLSX_MAX_CELLS
+
+logger = logging.getLogger(__name__)
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+DEFAULT_EMBEDDED_TIME_BUDGET = 30.0
+
+def embedded_payload_kind(part):
+    """嵌入部件的载荷类型："docx" / "xlsx"，其他返回None"""
+    content_type = getattr(part, 'content_type', '') or ''
+    part_name = str(getattr(part, 'partname', '')).lower()
+    if content_type == DOCX_CONTENT_TYPE or part_name.endswith('.docx'):
+        return "docx"
+    if content_type == XLSX_CONTENT_TYPE or part_name.endswith('.xlsx'):
+        return "xlsx"
+    return None
+
+class EmbeddedDocumentParser:
+    """
+    解析一个文档中嵌入的 .docx / .xlsx
+
+    max_depth: 剩余的嵌套层数（>=1），嵌入文档中再嵌入的文档以 max_depth-1 继续解析
+    deadline: time.monotonic() 截止时间，整个顶层文档内的嵌入文档共用；超时后不再开始新的解析，
+        正在解析的嵌入文档以剩余时间作为其内部嵌入文档的预算
+    parse_options: 传给 parse_docx 的共享参数（quick_mode、conversion_pool、metafile_cache、
+        smartart_cache、sidecar_pack 等）
+    """
+
+    def __init__(self, output_dir, max_depth, deadline, parse_options=None, max_cells=DEFAULT_XLSX_MAX_CELLS):
+        self.output_dir = output_dir
+        self.max_depth = max_depth
+        self.deadline = deadline
+        self.parse_options = parse_options or {}
+        self.max_cells = max_cells
+
+    def remaining_time(self):
+        return self.deadline - time.monotonic()
+
+    def parse(self, part, context=""):
+        """
+        解析嵌入部件
+
+        Returns:
+            dict: 需要合并到嵌入对象节点的字段；不支持的载荷返回空字典
+        """
+        kind = embedded_payload_kind(part)
+        if kind is None:
+            return {}
+        if self.remaining_time() <= 0:
+            logger.warning(f"嵌入文档解析超出时间预算，跳过 {context}")
+            return {"embedded_skipped": "time_budget"}
+        try:
+            if kind == "xlsx":
+                return {"embedded_workbook": read_xlsx(part.blob, self.max_cells, self.deadline)}
+            return self._parse_docx(part)
+        except Exception as e:
+            logger.warning(f"解析嵌入{kind}失败 {context}: {e}")
+            return {"embedded_error": str(e)}
+
+    def _parse_docx(self, part):
+        # 延迟导入，避免与 document_parser 循环导入
+        from src.parsers.document_parser import parse_docx
+        from src.extractors.image_materializer import IMAGE_MODE_EXTRACT
+
+        temp_dir = tempfile.mkdtemp(prefix="docx_embedded_")
+        try:
+            file_name = os.path.basename(str(getattr(part, 'partname', ''))) or "embedded.docx"
+            if not file_name.lower().endswith('.docx'):
+                file_name += '.docx'
+            docx_path = os.path.join(temp_dir, file_name)
+            with open(docx_path, 'wb') as f:
+                f.write(part.blob)
+            # 载荷只存在于临时文件中，图片总是写出到共用的 images/ 目录（不使用 virtual 模式）；
+            # 超大表格旁路文件按表格序号命名，与外层文档冲突，嵌入文档中不启用
+            options = dict(self.parse_options, image_mode=IMAGE_MODE_EXTRACT, table_spill_rows=None)
+            document_structure = parse_docx(
+                docx_path, self.output_dir,
+                embedded_max_depth=self.max_depth - 1,
+                embedded_time_budget=self.remaining_time(),
+                **options
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if not document_structure:
+            return {"embedded_error": "parse failed"}
+        document_structure.get("metadata", {}).pop("source_path", None)
+        return {"embedded_document": document_structure}
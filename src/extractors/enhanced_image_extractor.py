@@ -7,10 +7,11 @@ import zipfile
 import uuid
 import logging
 from pathlib import Path
+from src.utils.media_manifest import MediaManifest, MEDIA_PREFIX
 
 logger = logging.getLogger(__name__)
 
-def extract_all_images_from_docx(docx_path, images_dir):
+def extract_all_images_from_docx(docx_path, images_dir, media_manifest=None):
     """
     直接从DOCX文件的ZIP结构中提取所有图片
     这种方法可以确保提取到文档中的所有图片，无论它们在文档中的位置如何
@@ -18,6 +19,8 @@ def extract_all_images_from_docx(docx_path, images_dir):
     Args:
         docx_path: DOCX文件路径
         images_dir: 图片输出目录
+        media_manifest: 同一文档的媒体清单（MediaManifest），与 parse_docx 共用时
+            已读取、哈希过的媒体成员不会被再次读取
     
     Returns:
         list: 提取的图片信息列表
@@ -32,17 +35,15 @@ def extract_all_images_from_docx(docx_path, images_dir):
         # 确保输出目录存在
         os.makedirs(images_dir, exist_ok=True)
         
-        with zipfile.ZipFile(docx_path, 'r') as zip_file:
+        manifest = media_manifest or MediaManifest(docx_path)
+        try:
             # 获取所有媒体文件
-            media_files = [f for f in zip_file.namelist() if f.startswith('word/media/')]
+            media_files = manifest.media_members()
             
             logger.info(f"在文档中发现 {len(media_files)} 个媒体文件")
             
             for media_file in media_files:
                 try:
-                    # 读取图片数据
-                    image_data = zip_file.read(media_file)
-                    
                     # 获取原始文件名和扩展名
                     original_name = os.path.basename(media_file)
                     name_part, ext_part = os.path.splitext(original_name)
@@ -55,20 +56,9 @@ def extract_all_images_from_docx(docx_path, images_dir):
                     elif not ext_part:
                         ext_part = '.png'  # 默认PNG
                     
-                    # 用内容hash命名，避免重复
-                    import hashlib
-                    image_hash = hashlib.sha256(image_data).hexdigest()[:16]
-                    image_id = f"img_{image_hash}"
-                    img_filename = f"{image_id}{ext_part}"
-                    image_path = os.path.join(images_dir, img_filename)
-                    
-                    # 保存图片（如已存在则跳过）
-                    if not os.path.exists(image_path):
-                        with open(image_path, 'wb') as img_file:
-                            img_file.write(image_data)
-                    
-                    # 获取图片大小
-                    file_size = len(image_data)
+                    # 分块流式写出到临时文件，同时计算内容hash，完成后按hash重命名（已存在则丢弃）
+                    image_hash, file_size, img_filename = manifest.extract(media_file, images_dir, ext_part)
+                    image_id = f"img_{image_hash[:16]}"
                     
                     # 创建图片信息
                     image_info = {
@@ -80,7 +70,8 @@ def extract_all_images_from_docx(docx_path, images_dir):
                         "size_bytes": file_size,
                         "size_kb": f"{file_size/1024:.2f} KB",
                         "format": ext_part[1:].upper(),  # 去掉点号
-                        "source": media_file
+                        "source": media_file,
+                        "referenced_by": manifest.referencing_parts(media_file)
                     }
                     
                     extracted_images.append(image_info)
@@ -89,6 +80,9 @@ def extract_all_images_from_docx(docx_path, images_dir):
                 except Exception as e:
                     logger.error(f"提取图片 {media_file} 失败: {e}")
                     continue
+        finally:
+            if media_manifest is None:
+                manifest.close()
                     
         logger.info(f"成功提取 {len(extracted_images)} 张图片到 {images_dir}")
         
@@ -99,12 +93,13 @@ def extract_all_images_from_docx(docx_path, images_dir):
     
     return extracted_images
 
-def analyze_image_relationships(docx_path):
+def analyze_image_relationships(docx_path, media_manifest=None):
     """
     分析DOCX文件中的图片关系，用于调试
     
     Args:
         docx_path: DOCX文件路径
+        media_manifest: 同一文档的媒体清单（MediaManifest），未提供时临时构建
     
     Returns:
         dict: 分析结果
@@ -117,36 +112,26 @@ def analyze_image_relationships(docx_path):
     }
     
     try:
-        with zipfile.ZipFile(docx_path, 'r') as zip_file:
-            file_list = zip_file.namelist()
-            
+        manifest = media_manifest or MediaManifest(docx_path)
+        try:
             # 媒体文件
-            analysis["media_files"] = [f for f in file_list if f.startswith('word/media/')]
+            analysis["media_files"] = manifest.media_members()
             
             # 关系文件
-            analysis["relationship_files"] = [f for f in file_list if f.endswith('.rels')]
-            
-            # 分析主文档关系
-            if 'word/_rels/document.xml.rels' in file_list:
-                try:
-                    rels_content = zip_file.read('word/_rels/document.xml.rels').decode('utf-8')
-                    import re
-                    # 查找图片关系
-                    image_rels = re.findall(r'Target="media/([^"]+)".*?Type="[^"]*image[^"]*"', rels_content)
-                    analysis["document_relationships"] = image_rels
-                except Exception as e:
-                    logger.error(f"分析文档关系失败: {e}")
+            analysis["relationship_files"] = list(manifest.relationship_files)
             
-            # 分析页眉页脚关系
-            header_footer_rels = [f for f in file_list if f.startswith('word/_rels/header') or f.startswith('word/_rels/footer')]
-            for rel_file in header_footer_rels:
-                try:
-                    rels_content = zip_file.read(rel_file).decode('utf-8')
-                    import re
-                    image_rels = re.findall(r'Target="media/([^"]+)".*?Type="[^"]*image[^"]*"', rels_content)
-                    analysis["header_footer_relationships"].extend(image_rels)
-                except Exception as e:
-                    logger.error(f"分析页眉页脚关系失败: {e}")
+            # 主文档和页眉页脚中的图片关系（只统计图片类型的关系，按关系文件中的顺序）
+            for part, member in manifest.image_relationships:
+                if not member.startswith(MEDIA_PREFIX):
+                    continue
+                part_file = os.path.basename(part)
+                if part == 'word/document.xml':
+                    analysis["document_relationships"].append(os.path.basename(member))
+                elif part_file.startswith('header') or part_file.startswith('footer'):
+                    analysis["header_footer_relationships"].append(os.path.basename(member))
+        finally:
+            if media_manifest is None:
+                manifest.close()
     
     except Exception as e:
         logger.error(f"分析图片关系失败: {e}")
@@ -0,0 +1,159 @@
+"""
+提取器注册表 - 按元素标签和 a:graphicData/@uri 分发段落内容的提取
+
+每个提取器声明它处理的元素标签（如 a:blip、w:object）或 a:graphicData 的 uri（如SmartArt图表），
+extract 对每个 run 元素只遍历一次，把匹配的元素交给对应的提取器；不匹配任何提取器的内容只有
+一次字典查找的开销，没有匹配元素的提取器不会被调用。
+
+提取器的调用形式为 func(elements, **context) -> 节点列表，elements 为该 run 中按文档顺序匹配
+到的元素，context 为 extract 的关键字参数（doc_part、output_dir、images_dir、context 等，
+提取器只取自己需要的）。同一 run 的结果按提取器注册顺序拼接。
+
+用法:
+    registry = default_registry()
+    registry.register("chart", extract_charts, uris=["http://schemas.openxmlformats.org/drawingml/2006/chart"])
+    nodes = registry.extract(run._element, doc_part=para.part, output_dir=output_dir, ...)
+    registry.timings()   # {"picture": {"calls", "elements", "nodes", "seconds"}, ...}
+"""
+
+import time
+import logging
+
+from src.extractors.image_extractor import extract_images_from_blips
+from src.extractors.smartart_extractor import (extract_smartart_from_graphic_data,
+                                               extract_embedded_objects_from_elements, DIAGRAM_GRAPHIC_DATA_URI)
+
+logger = logging.getLogger(__name__)
+
+_A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+A_BLIP = f'{{{_A_NS}}}blip'
+A_GRAPHIC_DATA = f'{{{_A_NS}}}graphicData'
+W_OBJECT = f'{{{_W_NS}}}object'
+
+class ExtractorRegistry:
+    """按元素标签 / graphicData uri 分发的提取器集合"""
+
+    def __init__(self):
+        self.names = []  # 注册顺序
+        self._funcs = {}
+        self._by_tag = {}  # 标签 -> [提取器名]
+        self._by_uri = {}  # graphicData uri -> [提取器名]
+        self.stats = {}
+
+    def register(self, name, func, tags=(), uris=()):
+        """
+        注册提取器
+
+        Args:
+            name: 提取器名称（同名重复注册时替换原提取器）
+            func: func(elements, **context) -> 节点列表
+            tags: 处理的元素标签（Clark记法，如 "{ns}blip"）
+            uris: 处理的 a:graphicData/@uri
+        """
+        if name in self._funcs:
+            self.unregister(name)
+        self.names.append(name)
+        self._funcs[name] = func
+        for tag in tags:
+            self._by_tag.setdefault(tag, []).append(name)
+        for uri in uris:
+            self._by_uri.setdefault(uri, []).append(name)
+        self.stats[name] = {"calls": 0, "elements": 0, "nodes": 0, "seconds": 0.0}
+
+    def unregister(self, name):
+        if name not in self._funcs:
+            return
+        self.names.remove(name)
+        del self._funcs[name]
+        for index in (self._by_tag, self._by_uri):
+            for key in list(index):
+                if name in index[key]:
+                    index[key].remove(name)
+                if not index[key]:
+                    del index[key]
+        self.stats.pop(name, None)
+
+    def match(self, element):
+        """一次遍历 element 及其后代，返回 {提取器名: [匹配元素...]}"""
+        matches = {}
+        by_tag = self._by_tag
+        by_uri = self._by_uri
+        for elem in element.iter():
+            names = by_tag.get(elem.tag)
+            if names:
+                for name in names:
+                    matches.setdefault(name, []).append(elem)
+            if elem.tag == A_GRAPHIC_DATA and by_uri:
+                for name in by_uri.get(elem.get('uri'), ()):
+                    matches.setdefault(name, []).append(elem)
+        return matches
+
+    def extract(self, element, **context):
+        """
+        提取 element（通常是一个 w:r）中的全部内容
+
+        Returns:
+            list: 按提取器注册顺序拼接的节点列表
+        """
+        matches = self.match(element)
+        if not matches:
+            return []
+        nodes = []
+        for name in self.names:
+            elements = matches.get(name)
+            if not elements:
+                continue
+            stats = self.stats[name]
+            started = time.perf_counter()
+            try:
+                result = self._funcs[name](elements, **context) or []
+            except Exception as e:
+                logger.error(f"提取器 {name} 失败: {e}")
+                result = []
+            stats["seconds"] += time.perf_counter() - started
+            stats["calls"] += 1
+            stats["elements"] += len(elements)
+            stats["nodes"] += len(result)
+            nodes.extend(result)
+        return nodes
+
+    def timings(self, since=None):
+        """
+        各提取器的调用次数、匹配元素数、产出节点数和累计耗时（秒，保留6位小数）
+        since: 可选的先前 timings() 结果，提供时返回此后的增量（注册表在多个文档间共用时按文档统计）
+        """
+        result = {}
+        for name in self.names:
+            stats = dict(self.stats[name])
+            before = (since or {}).get(name)
+            if before:
+                for key in stats:
+                    stats[key] -= before.get(key, 0)
+            stats["seconds"] = round(stats["seconds"], 6)
+            result[name] = stats
+        return result
+
+def _extract_pictures(blips, doc_part, images_dir, image_references, context="", materializer=None, **_):
+    return extract_images_from_blips(blips, doc_part, images_dir, image_references, context, materializer)
+
+def _extract_diagrams(graphic_datas, doc_part, output_dir, context="", smartart_cache=None, sidecar_pack=None, **_):
+    return extract_smartart_from_graphic_data(graphic_datas, doc_part, output_dir, context, smartart_cache,
+                                              sidecar_pack)
+
+def _extract_ole_objects(objects, doc_part, output_dir, context="", quick_mode=True, conversion_pool=None,
+                         metafile_cache=None, sidecar_pack=None, embedded_parser=None, embedded_cache=None, **_):
+    return extract_embedded_objects_from_elements(
+        objects, doc_part, output_dir, context, quick_mode, conversion_pool=conversion_pool,
+        metafile_cache=metafile_cache, sidecar_pack=sidecar_pack, embedded_parser=embedded_parser,
+        embedded_cache=embedded_cache
+    )
+
+def default_registry():
+    """内置提取器：图片（a:blip）、SmartArt（diagram graphicData）、OLE嵌入对象（w:object）"""
+    registry = ExtractorRegistry()
+    registry.register("picture", _extract_pictures, tags=[A_BLIP])
+    registry.register("diagram", _extract_diagrams, uris=[DIAGRAM_GRAPHIC_DATA_URI])
+    registry.register("ole", _extract_ole_objects, tags=[W_OBJECT])
+    return registry
@@ -5,7 +5,7 @@
 import os
 import uuid
 import logging
-from src.utils.image_utils import get_image_dimensions
+from src.extractors.image_materializer import ImageMaterializer
 
 # 兼容性导入
 try:
@@ -18,9 +18,35 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-def extract_images_from_xml(xml_str, doc_part, images_dir, image_references, context="", quick_mode=True):
+_NAMESPACES = {
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+}
+
+# 预编译的元素级查询（python-docx 的元素均为 lxml 元素）
+_HAS_BLIP = etree.XPath('boolean(.//a:blip)', namespaces=_NAMESPACES)
+_HAS_DRAWING = etree.XPath('boolean(.//pic:pic | .//w:drawing)', namespaces=_NAMESPACES)
+_BLIP_EMBEDS = etree.XPath('.//a:blip/@r:embed', namespaces=_NAMESPACES)
+_BLIPS = etree.XPath('.//a:blip[@r:embed]', namespaces=_NAMESPACES)
+_R_EMBED = f"{{{_NAMESPACES['r']}}}embed"
+
+def _inside_any(node, root, containers):
+    """node 在 root 之下是否位于 containers 中的某个元素内"""
+    for ancestor in node.iterancestors():
+        if ancestor is root:
+            return False
+        if ancestor in containers:
+            return True
+    return False
+
+def extract_images_from_xml(xml_str, doc_part, images_dir, image_references, context="", quick_mode=True,
+                            materializer=None):
     """
     从XML字符串中提取图片并保存
+    materializer: 可选的 ImageMaterializer；提供时只生成引用 (部件名, rId) 的图片节点，
+        由调用方在遍历结束后统一物化；否则立即读取并保存图片
     返回: 图片节点列表
     """
     image_nodes = []
@@ -37,6 +63,9 @@ def extract_images_from_xml(xml_str, doc_part, images_dir, image_references, con
         
         root = etree.fromstring(xml_str)
         
+        # 未提供物化器时，在本次调用内立即物化
+        local_materializer = materializer or ImageMaterializer(images_dir, image_references)
+        
         # 查找所有图片元素
         for blip in root.findall('.//a:blip', namespaces):
             embed_id = blip.get(f'{{{namespaces["r"]}}}embed')
@@ -49,62 +78,95 @@ def extract_images_from_xml(xml_str, doc_part, images_dir, image_references, con
                 continue
                 
             image_part = doc_part.related_parts[embed_id]
-            image_data = image_part.blob
-            
-            # 确定图片格式
-            img_format = "png"  # 默认格式
-            if hasattr(image_part, 'content_type'):
-                content_type = image_part.content_type.lower()
-                if 'jpeg' in content_type:
-                    img_format = "jpg"
-                elif 'gif' in content_type:
-                    img_format = "gif"
-                elif 'bmp' in content_type:
-                    img_format = "bmp"
-                elif 'png' in content_type:
-                    img_format = "png"
-                elif 'svg' in content_type:
-                    img_format = "svg"
-                elif 'tiff' in content_type:
-                    img_format = "tiff"
-            
-            # 用内容hash命名，避免重复
-            import hashlib
-            image_hash = hashlib.sha256(image_data).hexdigest()[:16]
-            image_id = f"img_{image_hash}"
-            img_filename = f"{image_id}.{img_format}"
-            image_path = os.path.join(images_dir, img_filename)
-            
-            # 保存图片（如已存在则跳过）
-            if not os.path.exists(image_path):
-                with open(image_path, "wb") as img_file:
-                    img_file.write(image_data)
             
-            # 获取图片尺寸
-            width, height = get_image_dimensions(image_data)
-            
-            # 创建图片节点
-            image_node = {
-                "type": "image",
-                "url": f"images/{img_filename}",
-                "format": img_format,
-                "width": width,
-                "height": height,
-                "size": f"{len(image_data)/1024:.2f} KB",
-                "context": context
-            }
-            
-            # 记录图片信息
-            image_references[image_id] = image_node
-            image_nodes.append(image_node)
+            # 创建图片节点（物化后补全url、尺寸等信息）
+            image_nodes.append(local_materializer.defer(image_part, embed_id, context))
+        
+        if materializer is None:
+            local_materializer.materialize()
+            image_nodes = [node for node in image_nodes if "url" in node]
     
     except Exception as e:
         logger.error(f"从XML提取图片失败: {e}")
     
     return image_nodes
 
-def extract_table_images(cell, table_idx, row_idx, cell_idx, image_references, images_dir):
-    """提取表格单元格中的图片"""
+def extract_images_from_blips(blips, doc_part, images_dir, image_references, context="", materializer=None):
+    """
+    为已定位的 a:blip 元素创建图片节点（提取器注册表按元素分发时使用）
+    materializer: 见 extract_images_from_xml
+    返回: 图片节点列表
+    """
+    image_nodes = []
+    try:
+        local_materializer = materializer or ImageMaterializer(images_dir, image_references)
+        
+        for blip in blips:
+            embed_id = blip.get(_R_EMBED)
+            if not embed_id:
+                continue
+            if embed_id not in doc_part.related_parts:
+                logger.warning(f"图片关系 {embed_id} 在 {context} 中未找到")
+                continue
+            image_nodes.append(local_materializer.defer(doc_part.related_parts[embed_id], embed_id, context))
+        
+        if materializer is None:
+            local_materializer.materialize()
+            image_nodes = [node for node in image_nodes if "url" in node]
+    
+    except Exception as e:
+        logger.error(f"提取图片失败: {e}")
+    
+    return image_nodes
+
+def has_blip(element):
+    """元素（如整个 w:tbl）中是否存在 a:blip，用于跳过没有图片的表格"""
+    try:
+        return bool(_HAS_BLIP(element))
+    except Exception:
+        return True
+
+def extract_images_from_element(element, doc_part, images_dir, image_references, context="", materializer=None,
+                                exclude=None):
+    """
+    从已解析的XML元素中提取图片，与 extract_images_from_xml 结果相同，但不经过字符串往返
+    exclude: 可选的元素集合（如单独解析的嵌套表格 w:tbl），位于其中的图片不提取
+    返回: 图片节点列表
+    """
+    image_nodes = []
+    try:
+        if not _HAS_DRAWING(element):
+            return image_nodes
+        
+        local_materializer = materializer or ImageMaterializer(images_dir, image_references)
+        
+        if exclude:
+            embed_ids = [blip.get(_R_EMBED) for blip in _BLIPS(element) if not _inside_any(blip, element, exclude)]
+        else:
+            embed_ids = _BLIP_EMBEDS(element)
+        
+        for embed_id in embed_ids:
+            if embed_id not in doc_part.related_parts:
+                logger.warning(f"图片关系 {embed_id} 在 {context} 中未找到")
+                continue
+            image_part = doc_part.related_parts[embed_id]
+            image_nodes.append(local_materializer.defer(image_part, embed_id, context))
+        
+        if materializer is None:
+            local_materializer.materialize()
+            image_nodes = [node for node in image_nodes if "url" in node]
+    
+    except Exception as e:
+        logger.error(f"从XML元素提取图片失败: {e}")
+    
+    return image_nodes
+
+def extract_table_images(cell, table_idx, row_idx, cell_idx, image_references, images_dir, materializer=None,
+                         exclude=None):
+    """
+    提取表格单元格中的图片（直接在单元格元素上查询，不序列化为字符串）
+    exclude: 单独解析的嵌套表格元素集合，其中的图片归属嵌套表格的单元格
+    """
     image_nodes = []
     context = f"表格{table_idx}单元格[{row_idx},{cell_idx}]"
     
@@ -112,14 +174,14 @@ def extract_table_images(cell, table_idx, row_idx, cell_idx, image_references, i
         if not hasattr(cell, '_tc') or cell._tc is None:
             return image_nodes
             
-        cell_xml = etree.tostring(cell._tc, encoding='unicode')
-        image_nodes = extract_images_from_xml(
-            cell_xml, 
-            cell.part, 
-            images_dir, 
+        image_nodes = extract_images_from_element(
+            cell._tc,
+            cell.part,
+            images_dir,
             image_references,
             context,
-            quick_mode=True
+            materializer=materializer,
+            exclude=exclude
         )
     except Exception as e:
         logger.error(f"提取表格图片失败: {e}")
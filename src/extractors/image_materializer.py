@@ -0,0 +1,332 @@
+"""
+图片延迟物化
+
+解析阶段只生成引用 (部件名, rId) 的图片节点，遍历结束后统一物化:
+- 在整个文档范围内按图片部件去重，每个部件只读取、哈希一次
+- 一次性批量写出图片文件，可选并行；提供原始文档路径时通过媒体清单（MediaManifest）
+  从ZIP成员分块流式写出，每个成员只读取、哈希一次
+- 可按尺寸上限（ImageLimits）在写出后立即降采样，节点记录原始尺寸
+- 只需要文档结构（如做差异比较）的调用方可以完全跳过物化
+- 虚拟模式下不写出任何图片文件，节点只记录图片在原始DOCX中的字节范围
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.image_utils import get_image_dimensions, get_image_file_dimensions, get_image_stream_dimensions
+from src.utils.zip_media import member_name_from_partname
+from src.utils.media_manifest import MediaManifest
+from src.utils.image_resize import limit_image_file
+
+logger = logging.getLogger(__name__)
+
+# 表格单元格等精简图片节点只复制这些字段
+IMAGE_SUMMARY_FIELDS = ("url", "source", "sha256", "format", "width", "height", "size")
+
+# 图片输出模式
+IMAGE_MODE_EXTRACT = "extract"  # 写出到 images/ 目录
+IMAGE_MODE_VIRTUAL = "virtual"  # 只记录原始DOCX中的字节范围
+IMAGE_MODES = (IMAGE_MODE_EXTRACT, IMAGE_MODE_VIRTUAL)
+
+def image_format_from_content_type(image_part):
+    """根据图片部件的content_type确定文件扩展名"""
+    img_format = "png"  # 默认格式
+    if hasattr(image_part, 'content_type'):
+        content_type = image_part.content_type.lower()
+        if 'jpeg' in content_type:
+            img_format = "jpg"
+        elif 'gif' in content_type:
+            img_format = "gif"
+        elif 'bmp' in content_type:
+            img_format = "bmp"
+        elif 'png' in content_type:
+            img_format = "png"
+        elif 'svg' in content_type:
+            img_format = "svg"
+        elif 'tiff' in content_type:
+            img_format = "tiff"
+    return img_format
+
+class ImageMaterializer:
+    """
+    收集解析阶段的图片引用，并在遍历结束后统一物化
+
+    用法:
+        materializer = ImageMaterializer(images_dir, image_references)
+        node = materializer.defer(image_part, "rId5", context)   # 解析阶段
+        ...
+        materializer.materialize(max_workers=4)                  # 遍历结束后
+
+    media_manifest 为同一文档的 MediaManifest 时直接复用；未提供时在物化期间按 source_path 临时构建。
+
+    image_limits 为 ImageLimits 时，超出上限的图片在写出后缩小（虚拟模式下不生效）。
+
+    mode 为 IMAGE_MODE_VIRTUAL 时需要提供 source_path（原始DOCX路径），节点中的 url
+    替换为 source 字段（ZIP成员名、压缩方式、数据偏移和大小），可用
+    src.utils.zip_media.read_virtual_image 按需读回图片数据。
+    """
+
+    def __init__(self, images_dir, image_references, mode=IMAGE_MODE_EXTRACT, source_path=None, image_limits=None,
+                 media_manifest=None):
+        if mode not in IMAGE_MODES:
+            raise ValueError(f"不支持的图片输出模式: {mode}")
+        if mode == IMAGE_MODE_VIRTUAL and not source_path:
+            raise ValueError("虚拟图片模式需要提供原始文档路径")
+        self.images_dir = images_dir
+        self.image_references = image_references
+        self.mode = mode
+        self.source_path = source_path
+        self.image_limits = image_limits if image_limits is not None and image_limits.active else None
+        self.media_manifest = media_manifest  # 调用方提供的媒体清单（可与增强图片提取器共用）
+        self._manifest = None  # 本次物化使用的媒体清单
+        self._parts = {}  # 部件名 -> 图片部件
+        self._entries = []  # (节点, 部件名, 是否为完整节点)
+        self._written = set()  # 本次物化已写出的文件名（不同部件内容相同时只写一次）
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """尚未物化的节点数量"""
+        return len(self._entries)
+
+    @property
+    def unique_parts(self):
+        """引用到的不同图片部件数量"""
+        return len(self._parts)
+
+    def defer(self, image_part, r_id, context=""):
+        """
+        登记一个图片引用，返回只包含 (部件名, rId) 引用的图片节点
+
+        物化后节点会补全 url/format/width/height/size 字段，并移除部件引用字段
+        """
+        part_name = str(getattr(image_part, 'partname', '')) or f"{id(image_part)}"
+        self._parts.setdefault(part_name, image_part)
+        node = {
+            "type": "image",
+            "part_name": part_name,
+            "r_id": r_id,
+            "format": image_format_from_content_type(image_part),
+            "context": context
+        }
+        self._entries.append((node, part_name, True))
+        return node
+
+    def attach(self, node, source_node):
+        """
+        登记一个引用同一图片的精简节点（如表格单元格中的图片副本）
+
+        物化时只为其补全 IMAGE_SUMMARY_FIELDS 中的字段
+        """
+        part_name = source_node.get("part_name")
+        if part_name is None or part_name not in self._parts:
+            # 源节点已物化，直接复制
+            for key in IMAGE_SUMMARY_FIELDS:
+                if key in source_node:
+                    node[key] = source_node[key]
+            return node
+        node["part_name"] = part_name
+        node["r_id"] = source_node.get("r_id")
+        self._entries.append((node, part_name, False))
+        return node
+
+    def _stream_part(self, part_name, img_format):
+        """从原始文档的ZIP成员分块写出图片，边写边哈希，不读取完整的部件数据"""
+        content_hash, size_bytes, img_filename = self._manifest.extract(
+            member_name_from_partname(part_name), self.images_dir, f".{img_format}"
+        )
+        width, height = get_image_file_dimensions(os.path.join(self.images_dir, img_filename))
+        return f"img_{content_hash[:16]}", {
+            "url": f"images/{img_filename}",
+            "format": img_format,
+            "width": width,
+            "height": height,
+            "size": f"{size_bytes/1024:.2f} KB"
+        }
+
+    def _virtual_part(self, member, img_format):
+        """虚拟模式：哈希、大小、尺寸和字节范围都取自原始文档的ZIP成员，不读取部件数据"""
+        location = self._manifest.location(member)
+        if location is None:
+            raise KeyError(f"原始文档中找不到成员 {member}")
+        content_hash = self._manifest.content_hash(member)
+        with self._manifest.open(member) as stream:
+            width, height = get_image_stream_dimensions(stream)
+        return f"img_{content_hash[:16]}", {
+            "source": dict(location),
+            "sha256": content_hash,
+            "format": img_format,
+            "width": width,
+            "height": height,
+            "size": f"{self._manifest.size(member)/1024:.2f} KB"
+        }
+
+    def _materialize_part(self, part_name):
+        """读取、哈希并写出单个图片部件，返回需要写入节点的字段"""
+        image_part = self._parts[part_name]
+        img_format = image_format_from_content_type(image_part)
+        member = member_name_from_partname(part_name)
+        in_manifest = self._manifest is not None and member in self._manifest
+        if self.mode == IMAGE_MODE_VIRTUAL:
+            if not in_manifest:
+                raise KeyError(f"原始文档中找不到成员 {part_name}")
+            return self._virtual_part(member, img_format)
+        if in_manifest:
+            return self._stream_part(part_name, img_format)
+        image_data = image_part.blob
+
+        # 用内容hash命名，避免重复
+        content_hash = hashlib.sha256(image_data).hexdigest()
+        image_id = f"img_{content_hash[:16]}"
+        width, height = get_image_dimensions(image_data)
+        size = f"{len(image_data)/1024:.2f} KB"
+
+        img_filename = f"{image_id}.{img_format}"
+        image_path = os.path.join(self.images_dir, img_filename)
+
+        # 保存图片（如已存在则跳过）
+        with self._lock:
+            should_write = img_filename not in self._written
+            self._written.add(img_filename)
+        if should_write and not os.path.exists(image_path):
+            with open(image_path, "wb") as img_file:
+                img_file.write(image_data)
+
+        return image_id, {
+            "url": f"images/{img_filename}",
+            "format": img_format,
+            "width": width,
+            "height": height,
+            "size": size
+        }
+
+    def _limit_image(self, fields):
+        """按尺寸上限降采样已写出的图片，返回更新后的字段；无需处理时返回None"""
+        limits = self.image_limits
+        img_format = fields["format"]
+        image_path = os.path.join(self.images_dir, os.path.basename(fields["url"]))
+        size_bytes = os.path.getsize(image_path)
+        if not limits.needs_processing(img_format, fields["width"], fields["height"], size_bytes):
+            return None
+        out_format = limits.output_format(img_format)
+        dest_name = f"{os.path.splitext(os.path.basename(image_path))[0]}.{out_format}"
+        dest_path = os.path.join(self.images_dir, dest_name)
+        limited = limit_image_file(image_path, img_format, limits, dest_path)
+        if limited is None:
+            return None
+        if dest_path != image_path:
+            os.remove(image_path)
+        logger.debug(f"图片降采样: {os.path.basename(image_path)} "
+                     f"{limited['original_width']}x{limited['original_height']} -> "
+                     f"{limited['width']}x{limited['height']} {dest_name}")
+        return {
+            "url": f"images/{dest_name}",
+            "format": out_format,
+            "width": limited["width"],
+            "height": limited["height"],
+            "size": f"{limited['size_bytes']/1024:.2f} KB",
+            "original_width": limited["original_width"],
+            "original_height": limited["original_height"]
+        }
+
+    def _apply_limits(self, results, executor):
+        """对每个不同的图片文件执行一次降采样，并更新所有引用它的结果"""
+        by_url = {}
+        for result in results.values():
+            if result is not None:
+                by_url.setdefault(result[1]["url"], result[1])
+
+        def _run(fields):
+            try:
+                return self._limit_image(fields)
+            except Exception as e:
+                logger.warning(f"图片降采样失败，保留原图 {fields['url']}: {e}")
+                return None
+
+        urls = list(by_url)
+        mapper = executor.map if executor is not None else map
+        limited = dict(zip(urls, mapper(_run, [by_url[url] for url in urls])))
+        for part_name, result in results.items():
+            if result is None:
+                continue
+            new_fields = limited.get(result[1]["url"])
+            if new_fields is not None:
+                results[part_name] = (result[0], new_fields)
+
+    def materialize(self, max_workers=None):
+        """
+        物化所有登记的图片：每个部件只处理一次，结果写回全部引用节点
+
+        Args:
+            max_workers: 大于1时使用线程池并行读取、哈希、写出和降采样
+
+        Returns:
+            int: 物化的节点数量
+        """
+        if not self._entries:
+            return 0
+
+        part_names = list(dict.fromkeys(part_name for _, part_name, _ in self._entries))
+        if self.mode == IMAGE_MODE_EXTRACT:
+            os.makedirs(self.images_dir, exist_ok=True)
+        own_manifest = None
+        self._manifest = self.media_manifest
+        if self._manifest is None and self.source_path:
+            try:
+                own_manifest = self._manifest = MediaManifest(self.source_path)
+            except Exception as e:
+                logger.warning(f"读取原始文档媒体清单失败，改为从内存写出图片: {e}")
+                self._manifest = None
+
+        results = {}
+
+        def _run(part_name):
+            try:
+                return part_name, self._materialize_part(part_name)
+            except Exception as e:
+                logger.error(f"物化图片 {part_name} 失败: {e}")
+                return part_name, None
+
+        try:
+            if max_workers and max_workers > 1 and len(part_names) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    for part_name, result in executor.map(_run, part_names):
+                        results[part_name] = result
+                    if self.image_limits is not None and self.mode == IMAGE_MODE_EXTRACT:
+                        self._apply_limits(results, executor)
+            else:
+                for part_name in part_names:
+                    results[part_name] = _run(part_name)[1]
+                if self.image_limits is not None and self.mode == IMAGE_MODE_EXTRACT:
+                    self._apply_limits(results, None)
+        finally:
+            if own_manifest is not None:
+                own_manifest.close()
+            self._manifest = None
+
+        count = 0
+        for node, part_name, is_full in self._entries:
+            result = results.get(part_name)
+            if result is None:
+                continue
+            image_id, fields = result
+            # 重建节点，保持与直接提取时相同的字段顺序
+            node_type = node.get("type", "image")
+            context = node.get("context", "")
+            node.clear()
+            node["type"] = node_type
+            node.update(fields)
+            if is_full:
+                node["context"] = context
+                # 记录图片信息
+                self.image_references[image_id] = node
+            count += 1
+
+        logger.info(f"物化图片 {count} 个引用，{len(part_names)} 个图片部件")
+        self._entries = []
+        self._parts = {}
+        self._written = set()
+        return count
@@ -2,12 +2,17 @@
 SmartArt和嵌入对象提取器
 """
 
+import io
 import os
+import re
 import json
 import uuid
+import hashlib
 import logging
+import zipfile
 import traceback
-from src.utils.image_utils import extract_preview_image
+from src.utils.image_utils import extract_preview_image, get_image_dimensions
+from src.utils.zip_media import CHUNK_SIZE, member_name_from_partname
 
 # 兼容性导入
 try:
@@ -20,9 +25,160 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-def extract_smartart_from_xml(xml_str, doc_part, output_dir, context=""):
+class SmartArtCache:
+    """
+    SmartArt部件解析结果缓存
+
+    同一文档中多次引用同一个数据模型/布局部件时，按部件名直接复用解析结果；
+    布局分类结果另按布局定义内容的哈希缓存在 layout_types 中，可在整个批次的文档之间共享
+    （不同文档中相同的内置布局只分类一次）。
+
+    用法:
+        batch_cache = SmartArtCache()                                      # 批次级
+        doc_cache = SmartArtCache(layout_types=batch_cache.layout_types)   # 每个文档
+    """
+
+    def __init__(self, layout_types=None):
+        self.data = {}  # 数据模型部件名 -> (文本节点列表, 层次树, 内容哈希)
+        self.layouts = {}  # 布局部件名 -> 图表类型
+        self.layout_types = layout_types if layout_types is not None else {}  # 布局内容哈希 -> 图表类型
+
+_SMARTART_NAMESPACES = {
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'dgm': 'http://schemas.openxmlformats.org/drawingml/2006/diagram',
+    'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
+    'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+}
+
+_OLE_NAMESPACES = {
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'o': 'urn:schemas-microsoft-com:office:office',
+    'v': 'urn:schemas-microsoft-com:vml',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+}
+
+# SmartArt 的 a:graphicData/@uri
+DIAGRAM_GRAPHIC_DATA_URI = 'http://schemas.openxmlformats.org/drawingml/2006/diagram'
+
+class EmbeddedObjectCache:
+    """
+    嵌入对象的内容哈希缓存
+
+    嵌入对象的id由OLE载荷和预览图部件的内容哈希得出。部件对应的ZIP成员从 source_path 中分块流式
+    哈希，摘要按成员的 (CRC32, 压缩后大小, 原始大小) 缓存在 digests 中，可在整个批次的文档之间共享：
+    各文档中相同的载荷和预览图只哈希一次。part_digests 按部件名记录本文档已得到的摘要（部件名只在
+    文档内唯一）。objects 记录每个对象id在哪些文档中出现，同样在批次内共享，用于统计跨文档重复的嵌入对象。
+
+    用法:
+        batch_cache = EmbeddedObjectCache()                                  # 批次级
+        doc_cache = EmbeddedObjectCache(objects=batch_cache.objects,         # 每个文档
+                                        digests=batch_cache.digests, source_path=docx_path)
+        ...
+        doc_cache.close()
+    """
+
+    def __init__(self, objects=None, digests=None, source_path=None):
+        self.part_digests = {}  # 部件名 -> sha256 摘要
+        self.digests = digests if digests is not None else {}  # (CRC32, 压缩后大小, 原始大小) -> sha256 摘要
+        self.objects = objects if objects is not None else {}  # 对象id -> {"documents", "occurrences", "size"}
+        self.source_path = source_path
+        self._zip = None
+
+    def member_digest(self, part_name):
+        """
+        部件对应的ZIP成员的sha256摘要：批次内已哈希过相同成员时直接返回，否则分块流式计算
+
+        没有 source_path 或成员不在原始文档中时返回None
+        """
+        if not self.source_path or not part_name:
+            return None
+        if self._zip is None:
+            try:
+                self._zip = zipfile.ZipFile(self.source_path)
+            except Exception as e:
+                logger.warning(f"打开 {self.source_path} 计算嵌入对象哈希失败: {e}")
+                self.source_path = None
+                return None
+        info = self._zip.NameToInfo.get(member_name_from_partname(part_name))
+        if info is None:
+            return None
+        key = (info.CRC, info.compress_size, info.file_size)
+        digest = self.digests.get(key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with self._zip.open(info) as src:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+            digest = self.digests[key] = hasher.digest()
+        return digest
+
+    def close(self):
+        if self._zip is not None:
+            try:
+                self._zip.close()
+            except Exception:
+                pass
+            self._zip = None
+
+    def record(self, object_id, document, size=0):
+        entry = self.objects.get(object_id)
+        if entry is None:
+            entry = self.objects[object_id] = {"documents": set(), "occurrences": 0, "size": size}
+        entry["documents"].add(document)
+        entry["occurrences"] += 1
+
+    def report(self):
+        """批次内嵌入对象的去重统计"""
+        shared = [entry for entry in self.objects.values() if len(entry["documents"]) > 1]
+        return {
+            "unique_objects": len(self.objects),
+            "occurrences": sum(entry["occurrences"] for entry in self.objects.values()),
+            "cross_document_objects": len(shared),
+            "duplicate_payload_bytes": sum(entry["size"] * (entry["occurrences"] - 1)
+                                           for entry in self.objects.values())
+        }
+
+def _part_digest(part, embedded_cache=None):
+    """
+    部件内容的sha256摘要：优先从原始文档的ZIP成员流式计算（批次内相同成员只哈希一次，见
+    EmbeddedObjectCache.member_digest），不在原始文档中的部件直接哈希其字节
+    """
+    part_name = str(getattr(part, 'partname', ''))
+    if embedded_cache is not None and part_name in embedded_cache.part_digests:
+        return embedded_cache.part_digests[part_name]
+    result = embedded_cache.member_digest(part_name) if embedded_cache is not None else None
+    if result is None:
+        result = hashlib.sha256(part.blob).digest()
+    if embedded_cache is not None and part_name:
+        embedded_cache.part_digests[part_name] = result
+    return result
+
+def embedded_content_hash(payload_part, preview_part, embedded_cache=None):
+    """
+    嵌入对象的内容哈希（16位十六进制）：由OLE载荷和预览图的内容摘要组合而成，
+    与对象在文档中的位置和尺寸描述无关；两者都不存在时返回None
+    """
+    if payload_part is None and preview_part is None:
+        return None
+    combined = hashlib.sha256()
+    for label, part in ((b"payload", payload_part), (b"preview", preview_part)):
+        combined.update(label)
+        if part is not None:
+            combined.update(_part_digest(part, embedded_cache))
+    return combined.hexdigest()[:16]
+
+def extract_smartart_from_xml(xml_str, doc_part, output_dir, context="", smartart_cache=None, sidecar_pack=None):
     """
     从XML字符串中提取SmartArt图表信息
+    smartart_cache: 可选的 SmartArtCache，同一文档内的部件解析结果只计算一次
+    sidecar_pack: 可选的 SidecarPack（src.utils.sidecar_pack），提供时详细信息登记到文档级数据包，
+        不再单独写出 smartart/*.json 文件
     返回: SmartArt节点列表
     """
     smartart_nodes = []
@@ -30,39 +186,79 @@ def extract_smartart_from_xml(xml_str, doc_part, output_dir, context=""):
         if not xml_str or ('<a:graphic' not in xml_str and '<w:drawing>' not in xml_str):
             return smartart_nodes
         
-        namespaces = {
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-            'dgm': 'http://schemas.openxmlformats.org/drawingml/2006/diagram',
-            'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
-            'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006'
-        }
-        
         root = etree.fromstring(xml_str)
         
         # 查找所有graphic元素
-        graphics = root.findall('.//a:graphic', namespaces)
-        
-        for graphic in graphics:
-            graphic_data = graphic.find('.//a:graphicData', namespaces)
+        graphic_datas = []
+        for graphic in root.findall('.//a:graphic', _SMARTART_NAMESPACES):
+            graphic_data = graphic.find('.//a:graphicData', _SMARTART_NAMESPACES)
             if graphic_data is not None:
                 uri = graphic_data.get('uri')
                 if uri and 'diagram' in uri:
-                    logger.info(f"发现SmartArt图表在 {context}")
-                    smartart_data = extract_smartart_details(graphic_data, doc_part, output_dir, namespaces)
-                    if smartart_data:
-                        smartart_nodes.append(smartart_data)
+                    graphic_datas.append(graphic_data)
+        
+        smartart_nodes = extract_smartart_from_graphic_data(graphic_datas, doc_part, output_dir, context,
+                                                            smartart_cache, sidecar_pack)
     
     except Exception as e:
         logger.error(f"从XML提取SmartArt失败: {e}")
     
     return smartart_nodes
 
-def extract_smartart_details(graphic_data, doc_part, output_dir, namespaces):
+def extract_smartart_from_graphic_data(graphic_datas, doc_part, output_dir, context="", smartart_cache=None,
+                                       sidecar_pack=None):
+    """
+    从已定位的SmartArt a:graphicData 元素中提取SmartArt（参数见 extract_smartart_from_xml）
+    返回: SmartArt节点列表
+    """
+    smartart_nodes = []
+    try:
+        for graphic_data in graphic_datas:
+            logger.info(f"发现SmartArt图表在 {context}")
+            smartart_data = extract_smartart_details(graphic_data, doc_part, output_dir, _SMARTART_NAMESPACES,
+                                                     smartart_cache, sidecar_pack)
+            if smartart_data:
+                smartart_nodes.append(smartart_data)
+    
+    except Exception as e:
+        logger.error(f"提取SmartArt失败: {e}")
+    
+    return smartart_nodes
+
+def _parse_smartart_data(data_part, smartart_cache=None):
+    """解析数据模型部件（直接解析部件字节），返回 (文本节点列表, 层次树, 内容哈希)"""
+    part_name = str(getattr(data_part, 'partname', ''))
+    if smartart_cache is not None and part_name in smartart_cache.data:
+        return smartart_cache.data[part_name]
+    data_blob = data_part.blob
+    text_nodes, tree = extract_smartart_hierarchy(data_blob)
+    # 用内容hash命名，避免重复
+    smartart_hash = hashlib.sha256(data_blob).hexdigest()[:16] if data_blob else None
+    result = (text_nodes, tree, smartart_hash)
+    if smartart_cache is not None and part_name:
+        smartart_cache.data[part_name] = result
+    return result
+
+def _classify_layout(layout_part, smartart_cache=None):
+    """确定布局部件的图表类型，按部件名和布局内容哈希缓存"""
+    part_name = str(getattr(layout_part, 'partname', ''))
+    if smartart_cache is not None and part_name in smartart_cache.layouts:
+        return smartart_cache.layouts[part_name]
+    layout_blob = layout_part.blob
+    if smartart_cache is not None:
+        layout_key = hashlib.sha1(layout_blob).hexdigest()
+        diagram_type = smartart_cache.layout_types.get(layout_key)
+        if diagram_type is None:
+            diagram_type = smartart_cache.layout_types[layout_key] = extract_diagram_type(layout_blob)
+        if part_name:
+            smartart_cache.layouts[part_name] = diagram_type
+        return diagram_type
+    return extract_diagram_type(layout_blob)
+
+def extract_smartart_details(graphic_data, doc_part, output_dir, namespaces, smartart_cache=None, sidecar_pack=None):
     """
     提取SmartArt的详细信息和文本内容
+    sidecar_pack: 见 extract_smartart_from_xml
     """
     try:
         # 查找关系ID
@@ -83,48 +279,48 @@ def extract_smartart_details(graphic_data, doc_part, output_dir, namespaces):
             "type": "smartart",
             "text_content": [],
             "diagram_type": "unknown",
-            "nodes": []
+            "nodes": [],
+            "tree": None
         }
         
         # 提取数据模型中的文本内容
-        data_xml = ""  # 初始化变量
+        smartart_hash = None
         if dm_rel_id and dm_rel_id in doc_part.related_parts:
             logger.info(f"找到数据模型关系: {dm_rel_id}")
-            data_part = doc_part.related_parts[dm_rel_id]
-            data_xml = data_part.blob.decode('utf-8')
-            text_nodes = extract_smartart_text(data_xml)
-            smartart_data["text_content"] = text_nodes
+            text_nodes, tree, smartart_hash = _parse_smartart_data(doc_part.related_parts[dm_rel_id],
+                                                                   smartart_cache)
+            smartart_data["text_content"] = list(text_nodes)
             smartart_data["nodes"] = len(text_nodes)
+            # 层次树在同一文档的多次引用之间共享，只读使用
+            smartart_data["tree"] = tree
         else:
             logger.warning(f"未找到数据模型关系 {dm_rel_id} 或关系不存在")
         
         # 尝试确定图表类型
         if lo_rel_id and lo_rel_id in doc_part.related_parts:
-            layout_part = doc_part.related_parts[lo_rel_id]
-            layout_xml = layout_part.blob.decode('utf-8')
-            diagram_type = extract_diagram_type(layout_xml)
+            diagram_type = _classify_layout(doc_part.related_parts[lo_rel_id], smartart_cache)
             if diagram_type:
                 smartart_data["diagram_type"] = diagram_type
         
-        # 用内容hash命名，避免重复
-        import hashlib
-        if data_xml:  # 确保有数据才生成hash
-            smartart_hash = hashlib.sha256(data_xml.encode('utf-8')).hexdigest()[:16]
-        else:
+        if not smartart_hash:  # 没有数据时使用随机id
             smartart_hash = f"empty_{uuid.uuid4().hex[:8]}"
         smartart_id = f"smartart_{smartart_hash}"
         smartart_data["id"] = smartart_id
         
-        # 保存原始数据到文件（可选）
-        smartart_dir = os.path.join(output_dir, "smartart")
-        os.makedirs(smartart_dir, exist_ok=True)
-        
-        smartart_file = os.path.join(smartart_dir, f"{smartart_id}.json")
-        if not os.path.exists(smartart_file):
-            with open(smartart_file, 'w', encoding='utf-8') as f:
-                json.dump(smartart_data, f, ensure_ascii=False, indent=2)
+        # 保存原始数据：登记到文档级数据包，或写出单独的文件
+        file_path = f"smartart/{smartart_id}.json"
+        if sidecar_pack is not None:
+            sidecar_pack.add(file_path, smartart_data)
+        else:
+            smartart_dir = os.path.join(output_dir, "smartart")
+            os.makedirs(smartart_dir, exist_ok=True)
+            
+            smartart_file = os.path.join(smartart_dir, f"{smartart_id}.json")
+            if not os.path.exists(smartart_file):
+                with open(smartart_file, 'w', encoding='utf-8') as f:
+                    json.dump(smartart_data, f, ensure_ascii=False, indent=2)
         
-        smartart_data["file_path"] = f"smartart/{smartart_id}.json"
+        smartart_data["file_path"] = file_path
         
         logger.info(f"提取SmartArt成功，包含 {len(smartart_data['text_content'])} 个文本节点")
         return smartart_data
@@ -137,8 +333,60 @@ def extract_smartart_details(graphic_data, doc_part, output_dir, namespaces):
 def extract_smartart_text(data_xml):
     """
     从SmartArt数据模型XML中提取文本内容，保持层次结构
+    data_xml: 数据模型部件的字节内容（也接受字符串）
+    """
+    text_nodes, _ = extract_smartart_hierarchy(data_xml)
+    return text_nodes
+
+def _build_hierarchy(points, parent_child_map, root_id):
+    """
+    从根节点开始用显式栈做先序遍历，同时生成带缩进的文本列表和层次树
+
+    每个节点的子节点只按srcOrd排序一次（相同srcOrd保持连接出现的顺序），已访问的节点
+    不再进入，环状或重复的连接不会导致无限循环；层级很深时也不受递归深度限制
     """
     text_nodes = []
+    for children in parent_child_map.values():
+        children.sort(key=lambda x: x[1])
+    
+    tree = None
+    visited = set()
+    stack = [(root_id, 0, None)]
+    while stack:
+        node_id, level, parent_node = stack.pop()
+        if node_id not in points or node_id in visited:
+            continue
+        visited.add(node_id)
+        point = points[node_id]
+        
+        # 添加当前节点的文本（如果有的话）
+        if point['text']:
+            text_nodes.append(f"{'  ' * level}{point['text']}")
+        
+        tree_node = {"model_id": node_id, "text": point['text'], "children": []}
+        if parent_node is None:
+            tree = tree_node
+        else:
+            parent_node["children"].append(tree_node)
+        
+        # 逆序入栈，出栈顺序即srcOrd顺序
+        for child_id, _ in reversed(parent_child_map.get(node_id, ())):
+            if child_id not in visited:
+                stack.append((child_id, level + 1, tree_node))
+    
+    return text_nodes, tree
+
+def extract_smartart_hierarchy(data_xml):
+    """
+    解析SmartArt数据模型，一次遍历同时得到文本列表和层次树
+    data_xml: 数据模型部件的字节内容（也接受字符串）
+    返回: (文本节点列表, 层次树)，层次树为 {"model_id", "text", "children"} 嵌套结构，
+        以 type="doc" 的点为根；无法构建层次结构时为None
+    """
+    if isinstance(data_xml, str):
+        data_xml = data_xml.encode('utf-8')
+    text_nodes = []
+    tree = None
     try:
         # 定义命名空间
         namespaces = {
@@ -146,7 +394,7 @@ def extract_smartart_text(data_xml):
             'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'
         }
         
-        root = etree.fromstring(data_xml.encode('utf-8'))
+        root = etree.fromstring(data_xml)
         
         # 1. 解析所有数据点
         points = {}
@@ -166,8 +414,7 @@ def extract_smartart_text(data_xml):
             combined_text = ' '.join(text_parts) if text_parts else ''
             points[model_id] = {
                 'text': combined_text,
-                'type': point_type,
-                'children': []
+                'type': point_type
             }
         
         # 2. 解析连接关系构建层次结构
@@ -196,24 +443,8 @@ def extract_smartart_text(data_xml):
                 break
         
         # 4. 构建层次结构并提取文本
-        def extract_hierarchy_text(node_id, level=0):
-            if node_id not in points:
-                return
-            
-            point = points[node_id]
-            
-            # 添加当前节点的文本（如果有的话）
-            if point['text']:
-                text_nodes.append(f"{'  ' * level}{point['text']}")
-            
-            # 处理子节点，按srcOrd排序
-            if node_id in parent_child_map:
-                children = sorted(parent_child_map[node_id], key=lambda x: x[1])
-                for child_id, _ in children:
-                    extract_hierarchy_text(child_id, level + 1)
-        
         if root_id:
-            extract_hierarchy_text(root_id)
+            text_nodes, tree = _build_hierarchy(points, parent_child_map, root_id)
         
         # 如果层次结构提取失败，回退到简单文本提取
         if not text_nodes:
@@ -225,9 +456,10 @@ def extract_smartart_text(data_xml):
     
     except Exception as e:
         logger.error(f"提取SmartArt文本失败: {e}")
+        tree = None
         # 回退到原始方法
         try:
-            root = etree.fromstring(data_xml.encode('utf-8'))
+            root = etree.fromstring(data_xml)
             texts = []
             # 使用兼容的方法查找文本元素
             text_elements = []
@@ -247,29 +479,121 @@ def extract_smartart_text(data_xml):
         except:
             pass
     
-    return text_nodes
+    return text_nodes, tree
+
+# Office内置布局（uniqueId 最后一段，如 urn:microsoft.com/office/officeart/2005/8/layout/hierarchy1）
+# 对应的图表类型；矩阵类布局与关键词回退保持一致，归入 relationship
+_BUILTIN_LAYOUTS = {
+    'list': ['default', 'vList2', 'vList3', 'vList4', 'vList5', 'vList6', 'hList1', 'hList2', 'hList3',
+             'hList6', 'hList7', 'hList9', 'lProcess2', 'list1', 'pList1', 'pList2', 'bList2', 'chevron2',
+             'target3'],
+    'process': ['process1', 'process2', 'process3', 'process4', 'process5', 'hProcess3', 'hProcess4',
+                'hProcess6', 'hProcess7', 'hProcess9', 'hProcess10', 'hProcess11', 'chevron1', 'lProcess1',
+                'lProcess3', 'arrow2', 'funnel1', 'StepUpProcess', 'StepDownProcess'],
+    'cycle': ['cycle1', 'cycle2', 'cycle3', 'cycle4', 'cycle5', 'cycle6', 'cycle7', 'cycle8', 'radial1',
+              'radial2', 'radial3', 'radial4', 'radial5', 'radial6'],
+    'hierarchy': ['hierarchy1', 'hierarchy2', 'hierarchy3', 'hierarchy4', 'hierarchy5', 'hierarchy6',
+                  'orgChart1', 'NameandTitleOrganizationalChart', 'HalfCircleOrganizationChart',
+                  'CirclePictureHierarchy'],
+    'relationship': ['venn1', 'venn2', 'venn3', 'balance1', 'equation1', 'equation2', 'gear1', 'target1',
+                     'target2', 'arrow1', 'arrow3', 'arrow4', 'arrow5', 'arrow6', 'matrix1', 'matrix2',
+                     'matrix3'],
+    'pyramid': ['pyramid1', 'pyramid2', 'pyramid3', 'pyramid4']
+}
+_BUILTIN_LAYOUT_TYPES = {
+    name.lower(): diagram_type for diagram_type, names in _BUILTIN_LAYOUTS.items() for name in names
+}
+
+# dgm:catLst 中的分类（dgm:cat/@type）对应的图表类型
+_LAYOUT_CATEGORY_TYPES = {
+    'list': 'list',
+    'process': 'process',
+    'cycle': 'cycle',
+    'hierarchy': 'hierarchy',
+    'relationship': 'relationship',
+    'matrix': 'relationship',
+    'pyramid': 'pyramid'
+}
+
+_DGM_NS = 'http://schemas.openxmlformats.org/drawingml/2006/diagram'
+_DGM_CAT = f'{{{_DGM_NS}}}cat'
+_DGM_CAT_LST = f'{{{_DGM_NS}}}catLst'
+_DGM_LAYOUT_NODE = f'{{{_DGM_NS}}}layoutNode'
+
+# 常见的SmartArt布局类型（按优先级）及其关键词，直接在布局部件字节上不区分大小写查找
+_LAYOUT_PATTERNS = [
+    ('list', ['list', 'bullet', 'sequence']),
+    ('process', ['process', 'flow', 'step']),
+    ('cycle', ['cycle', 'circular']),
+    ('hierarchy', ['hierarchy', 'org', 'tree']),
+    ('relationship', ['relationship', 'venn', 'matrix']),
+    ('pyramid', ['pyramid', 'funnel'])
+]
+_LAYOUT_PATTERN_RES = [
+    (diagram_type, re.compile(b'|'.join(p.encode('ascii') for p in patterns), re.IGNORECASE))
+    for diagram_type, patterns in _LAYOUT_PATTERNS
+]
+
+def _read_layout_header(layout_xml):
+    """
+    增量解析布局定义的开头部分，返回 (uniqueId, 分类列表)
+    分类列表为 [(pri, type)]；读到 catLst 结束或第一个 layoutNode 即停止，不解析整个布局
+    """
+    unique_id = None
+    categories = []
+    for event, elem in etree.iterparse(io.BytesIO(layout_xml), events=('start', 'end')):
+        if event == 'start':
+            if unique_id is None:
+                unique_id = elem.get('uniqueId', '')
+            elif elem.tag == _DGM_CAT:
+                try:
+                    pri = int(elem.get('pri', 0))
+                except ValueError:
+                    pri = 0
+                categories.append((pri, elem.get('type', '')))
+            elif elem.tag == _DGM_LAYOUT_NODE:
+                break
+        elif elem.tag == _DGM_CAT_LST:
+            break
+    return unique_id or '', categories
+
+def classify_layout_definition(layout_xml):
+    """
+    按布局定义的 uniqueId 查内置布局表，其次按 catLst 中优先级最高（pri最小）的已知分类确定图表类型
+    返回: 图表类型；两者都无法确定时返回None
+    """
+    unique_id, categories = _read_layout_header(layout_xml)
+    name = unique_id.rstrip('/').rsplit('/', 1)[-1].lower()
+    if name in _BUILTIN_LAYOUT_TYPES:
+        return _BUILTIN_LAYOUT_TYPES[name]
+    for _, category in sorted(categories):
+        diagram_type = _LAYOUT_CATEGORY_TYPES.get(category.lower())
+        if diagram_type:
+            return diagram_type
+    return None
 
 def extract_diagram_type(layout_xml):
     """
     从布局XML中确定图表类型
+    layout_xml: 布局部件的字节内容（也接受字符串）
+
+    先按 uniqueId / catLst 分类确定（见 classify_layout_definition）；自定义布局无法确定时，
+    回退到在布局内容中查找关键词（"list" 等词几乎出现在所有布局中，只作为最后手段）
     """
     try:
-        # 常见的SmartArt布局类型
-        layout_patterns = {
-            'list': ['list', 'bullet', 'sequence'],
-            'process': ['process', 'flow', 'step'],
-            'cycle': ['cycle', 'circular'],
-            'hierarchy': ['hierarchy', 'org', 'tree'],
-            'relationship': ['relationship', 'venn', 'matrix'],
-            'pyramid': ['pyramid', 'funnel']
-        }
+        if isinstance(layout_xml, str):
+            layout_xml = layout_xml.encode('utf-8')
         
-        layout_xml_lower = layout_xml.lower()
+        try:
+            diagram_type = classify_layout_definition(layout_xml)
+            if diagram_type:
+                return diagram_type
+        except Exception as e:
+            logger.debug(f"解析布局定义失败，使用关键词判断: {e}")
         
-        for diagram_type, patterns in layout_patterns.items():
-            for pattern in patterns:
-                if pattern in layout_xml_lower:
-                    return diagram_type
+        for diagram_type, pattern_re in _LAYOUT_PATTERN_RES:
+            if pattern_re.search(layout_xml):
+                return diagram_type
         
         return "unknown"
     
@@ -277,9 +601,18 @@ def extract_diagram_type(layout_xml):
         logger.error(f"确定图表类型失败: {e}")
         return "unknown"
 
-def extract_embedded_objects_from_xml(xml_str, doc_part, output_dir, context="", quick_mode=True):
+def extract_embedded_objects_from_xml(xml_str, doc_part, output_dir, context="", quick_mode=True, conversion_pool=None,
+                                      metafile_cache=None, sidecar_pack=None, embedded_parser=None,
+                                      embedded_cache=None):
     """
     从XML字符串中提取嵌入对象（如Visio图表、Excel表格等）
+    conversion_pool: 可选的EMF/WMF转换进程池，转换完成后预览图路径会写回节点
+    metafile_cache: 可选的EMF/WMF转换持久化缓存
+    sidecar_pack: 可选的 SidecarPack，提供时对象信息登记到文档级数据包（登记的是节点本身，
+        异步转换更新的预览图路径随数据包一起写出），不再单独写出 embedded_objects/*.json 文件
+    embedded_parser: 可选的 EmbeddedDocumentParser（src.extractors.embedded_parser），提供时解析
+        .docx/.xlsx 载荷，结果以 embedded_document / embedded_workbook 字段附加到节点
+    embedded_cache: 可选的 EmbeddedObjectCache，载荷/预览部件的内容哈希只计算一次，并登记对象出现的文档
     返回: 嵌入对象节点列表
     """
     embedded_objects = []
@@ -287,17 +620,32 @@ def extract_embedded_objects_from_xml(xml_str, doc_part, output_dir, context="",
         if not xml_str or '<w:object' not in xml_str:
             return embedded_objects
         
-        namespaces = {
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-            'o': 'urn:schemas-microsoft-com:office:office',
-            'v': 'urn:schemas-microsoft-com:vml',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-        }
-        
         root = etree.fromstring(xml_str)
         
         # 查找所有object元素
-        objects = root.findall('.//w:object', namespaces)
+        objects = root.findall('.//w:object', _OLE_NAMESPACES)
+        
+        embedded_objects = extract_embedded_objects_from_elements(
+            objects, doc_part, output_dir, context, quick_mode, conversion_pool=conversion_pool,
+            metafile_cache=metafile_cache, sidecar_pack=sidecar_pack, embedded_parser=embedded_parser,
+            embedded_cache=embedded_cache
+        )
+    
+    except Exception as e:
+        logger.error(f"从XML提取嵌入对象失败: {e}")
+    
+    return embedded_objects
+
+def extract_embedded_objects_from_elements(objects, doc_part, output_dir, context="", quick_mode=True,
+                                           conversion_pool=None, metafile_cache=None, sidecar_pack=None,
+                                           embedded_parser=None, embedded_cache=None):
+    """
+    从已定位的 w:object 元素中提取嵌入对象（参数见 extract_embedded_objects_from_xml）
+    返回: 嵌入对象节点列表
+    """
+    embedded_objects = []
+    try:
+        namespaces = _OLE_NAMESPACES
         
         for obj_idx, obj in enumerate(objects):
             logger.info(f"发现嵌入对象在 {context}")
@@ -352,6 +700,7 @@ def extract_embedded_objects_from_xml(xml_str, doc_part, output_dir, context="",
                 
                 # 尝试获取嵌入文件信息
                 embedded_file_info = None
+                embedded_part = None
                 if r_id and r_id in doc_part.related_parts:
                     embedded_part = doc_part.related_parts[r_id]
                     embedded_file_info = {
@@ -373,42 +722,81 @@ def extract_embedded_objects_from_xml(xml_str, doc_part, output_dir, context="",
                 if embedded_file_info:
                     stable_obj["file_info"] = embedded_file_info
                 
-                # 生成基于稳定内容的哈希ID，用于文件命名（不包含变化的context）
-                import hashlib
-                stable_obj_str = json.dumps(stable_obj, sort_keys=True)
-                content_hash = hashlib.sha256(stable_obj_str.encode('utf-8')).hexdigest()[:16]
+                # 预览图像部件
+                preview_part = None
+                if preview_image_r_id and preview_image_r_id in doc_part.related_parts:
+                    preview_part = doc_part.related_parts[preview_image_r_id]
+                
+                # 生成基于载荷和预览图内容的哈希ID，用于文件命名（相同内容在不同文档中id相同）；
+                # 两者都不存在（如链接对象）时退回到描述信息的哈希
+                content_hash = embedded_content_hash(embedded_part, preview_part, embedded_cache)
+                if content_hash is None:
+                    stable_obj_str = json.dumps(stable_obj, sort_keys=True)
+                    content_hash = hashlib.sha256(stable_obj_str.encode('utf-8')).hexdigest()[:16]
                 object_id = f"embedded_obj_{content_hash}"
+                if embedded_cache is not None:
+                    embedded_cache.record(object_id, output_dir,
+                                          embedded_file_info["size"] if embedded_file_info else 0)
                 
                 # 创建完整的嵌入对象节点（包含context和id）
                 embedded_obj = stable_obj.copy()
                 embedded_obj["context"] = context
                 embedded_obj["id"] = object_id
                 
+                # 解析嵌入的Word/Excel载荷（不影响对象id）
+                if embedded_parser is not None and embedded_part is not None:
+                    embedded_obj.update(embedded_parser.parse(embedded_part, context))
+                
+                # 保存对象信息的文件路径
+                objects_dir = os.path.join(output_dir, "embedded_objects")
+                object_file = os.path.join(objects_dir, f"object_{content_hash}.json")
+                
+                # 异步转换完成后，更新节点和对象文件中的预览图路径
+                def _on_preview_converted(path, node=embedded_obj, node_file=object_file):
+                    node["preview_image"] = path
+                    if sidecar_pack is not None:
+                        return
+                    try:
+                        saved = {k: v for k, v in node.items() if k != "file_path"}
+                        with open(node_file, 'w', encoding='utf-8') as f:
+                            json.dump(saved, f, ensure_ascii=False, indent=2)
+                    except Exception as e:
+                        logger.warning(f"更新嵌入对象文件失败: {e}")
+                
                 # 提取并保存预览图像
                 preview_image_path = None
-                if preview_image_r_id and preview_image_r_id in doc_part.related_parts:
-                    image_part = doc_part.related_parts[preview_image_r_id]
-                    preview_image_path = extract_preview_image(image_part, output_dir, object_id, quick_mode)
+                if preview_part is not None:
+                    image_part = preview_part
+                    preview_image_path = extract_preview_image(
+                        image_part, output_dir, object_id, quick_mode,
+                        conversion_pool=conversion_pool, on_converted=_on_preview_converted,
+                        metafile_cache=metafile_cache
+                    )
                     if preview_image_path:
                         logger.info(f"成功提取预览图像: {preview_image_path}")
                         embedded_obj["preview_image"] = preview_image_path
+                        # 预览图尺寸（EMF/WMF取自文件头边界）
+                        preview_width, preview_height = get_image_dimensions(image_part.blob)
+                        if preview_width and preview_height:
+                            embedded_obj["preview_width"] = preview_width
+                            embedded_obj["preview_height"] = preview_height
                 
-                # 保存对象信息到文件
-                objects_dir = os.path.join(output_dir, "embedded_objects")
-                os.makedirs(objects_dir, exist_ok=True)
+                # 保存对象信息（使用已生成的content_hash命名）：登记到文档级数据包，或写出单独的文件
+                file_path = f"embedded_objects/object_{content_hash}.json"
+                if sidecar_pack is not None:
+                    sidecar_pack.add(file_path, embedded_obj)
+                else:
+                    os.makedirs(objects_dir, exist_ok=True)
+                    if not os.path.exists(object_file):
+                        with open(object_file, 'w', encoding='utf-8') as f:
+                            json.dump(embedded_obj, f, ensure_ascii=False, indent=2)
                 
-                # 使用已生成的content_hash命名文件
-                object_file = os.path.join(objects_dir, f"object_{content_hash}.json")
-                if not os.path.exists(object_file):
-                    with open(object_file, 'w', encoding='utf-8') as f:
-                        json.dump(embedded_obj, f, ensure_ascii=False, indent=2)
-                
-                embedded_obj["file_path"] = f"embedded_objects/object_{content_hash}.json"
+                embedded_obj["file_path"] = file_path
                 
                 embedded_objects.append(embedded_obj)
                 logger.info(f"提取嵌入对象成功: {object_description} ({width} x {height})")
     
     except Exception as e:
-        logger.error(f"从XML提取嵌入对象失败: {e}")
+        logger.error(f"提取嵌入对象失败: {e}")
     
     return embedded_objects
@@ -8,12 +8,266 @@ import logging
 import traceback
 from datetime import datetime
 from src.parsers.document_parser import parse_docx
-from src.processors.text_processor import process_document_to_text
+from src.processors.text_processor import render_document_to_stream
 from src.utils.text_utils import safe_filename, add_error_to_failed_files
+from src.utils.metafile_pool import MetafileConversionPool
+from src.utils.metafile_cache import MetafileCache
+from src.utils.image_transcoder import ImageTranscoder, iter_image_refs
+from src.utils.image_dedup import find_near_duplicates, numpy_available
+from src.utils.image_utils import get_image_file_dimensions
+from src.utils.boilerplate import BoilerplateIndex, BOILERPLATE_SHARED_FILE, apply_boilerplate
+from src.utils.table_sidecar import iter_sidecar_tables, iter_sidecar_rows, rewrite_sidecar_rows
+from src.extractors.image_materializer import IMAGE_MODE_EXTRACT
+from src.extractors.smartart_extractor import SmartArtCache, EmbeddedObjectCache
+from src.utils.sidecar_pack import SidecarPack
+from src.extractors.embedded_parser import DEFAULT_EMBEDDED_TIME_BUDGET
 
 logger = logging.getLogger(__name__)
 
-def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
+def _save_document_outputs(filename, safe_name, output_dir, document_structure, failed_files, all_documents,
+                           image_transcoder=None, sidecar_pack=None):
+    """
+    保存单个文档的JSON和标准化文本输出，并登记到汇总列表
+    sidecar_pack: 文档的SmartArt/嵌入对象数据包，在图片转码改写路径之后写出
+    
+    Returns:
+        bool: 是否保存成功（JSON保存失败视为处理失败）
+    """
+    # 转码图片，并更新文档结构中的引用
+    if image_transcoder is not None:
+        try:
+            image_transcoder.transcode_document(document_structure, output_dir)
+        except Exception as e:
+            logger.warning(f"文件 {filename} 图片转码失败，保留原图: {e}")
+    
+    # 写出SmartArt和嵌入对象的数据包
+    if sidecar_pack is not None:
+        try:
+            sidecar_pack.write(output_dir)
+        except Exception as e:
+            logger.warning(f"文件 {filename} 写出旁路数据包失败: {e}")
+            document_structure.get("processing_info", {}).setdefault("errors", []).append(
+                f"Sidecar pack write failed: {e}")
+    
+    # 保存为JSON文件
+    json_path = os.path.join(output_dir, "document.json")
+    try:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(document_structure, f, ensure_ascii=False, indent=2)
+    except (OSError, IOError) as e:
+        logger.error(f"保存JSON文件失败: {e}")
+        # 即使JSON保存失败，也算作处理失败
+        add_error_to_failed_files(failed_files, filename, f"JSON save failed: {e}")
+        return False
+    
+    # 处理为标准化文本格式，边生成边写入文件
+    text_stats = None
+    try:
+        # 从文件名提取文档名称
+        doc_name = safe_name
+        text_path = os.path.join(output_dir, "processed_text.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            text_stats = render_document_to_stream(document_structure, doc_name, f, output_dir)
+    
+        logger.info(f"文件 {filename} 的标准化文本已保存 - 字符: {text_stats['chars']}, "
+                    f"缓冲峰值: {text_stats['peak_buffered_chars']}")
+    
+    except Exception as e:
+        logger.error(f"文件 {filename} 文本处理失败: {e}")
+        # 文本处理失败不影响整体处理状态
+    
+    # 添加到汇总列表
+    all_documents.append({
+        "file": filename,
+        "path": json_path,
+        "status": "success",
+        "images_found": len(document_structure.get("images", {})),
+        "warnings": len(document_structure.get("processing_info", {}).get("warnings", [])),
+        "errors": len(document_structure.get("processing_info", {}).get("errors", [])),
+        "text_output": text_stats
+    })
+    
+    # 统计图片数量
+    total_images = len(document_structure.get("images", {}))
+    hf_images = len(document_structure.get("header_footer_images", []))
+    processing_info = document_structure.get("processing_info", {})
+    
+    logger.info(f"文件 {filename} 处理完成 - 图片: {total_images}, 页眉页脚图片: {hf_images}, 警告: {len(processing_info.get('warnings', []))}")
+    
+    return True
+
+def _flush_document_outputs(conversion_pool, pending_outputs, failed_files, all_documents, image_transcoder=None):
+    """等待文档的EMF/WMF转换全部写回节点后，保存其输出"""
+    filename, safe_name, output_dir, document_structure, sidecar_pack = pending_outputs
+    try:
+        conversion_pool.wait(group=output_dir)
+        return _save_document_outputs(filename, safe_name, output_dir, document_structure, failed_files, all_documents,
+                                      image_transcoder, sidecar_pack)
+    except Exception as e:
+        logger.error(f"保存文件 {filename} 的输出时发生错误: {e}")
+        add_error_to_failed_files(failed_files, filename, f"Unexpected error: {e}")
+        return False
+
+def _iter_document_image_refs(document_structure, output_dir):
+    """文档结构及其表格旁路文件中的图片引用（旁路文件逐行读取）"""
+    yield from iter_image_refs(document_structure)
+    for table_node in iter_sidecar_tables(document_structure):
+        for row in iter_sidecar_rows(output_dir, table_node):
+            yield from iter_image_refs(row)
+
+def _collect_local_image_paths(document_structure, output_dir):
+    """收集文档引用的本地栅格图片文件（绝对路径）"""
+    paths = set()
+    for node, key in _iter_document_image_refs(document_structure, output_dir):
+        if key != "url" or os.path.isabs(node[key]):
+            continue
+        ext = os.path.splitext(node[key])[1].lower().lstrip('.')
+        if ext in ("png", "jpg", "jpeg", "gif", "bmp", "tiff", "tif", "webp"):
+            path = os.path.abspath(os.path.join(output_dir, node[key]))
+            if os.path.exists(path):
+                paths.add(path)
+    return paths
+
+def _collapse_near_duplicate_images(all_documents, threshold, method):
+    """
+    批次级近似重复图片合并：引用改写为规范图片的相对路径，删除重复文件，
+    并重新保存受影响文档的JSON和标准化文本
+    
+    Returns:
+        dict: 统计信息
+    """
+    stats = {"method": method, "threshold": threshold, "files_hashed": 0, "duplicates_collapsed": 0, "bytes_saved": 0}
+    json_paths = [doc["path"] for doc in all_documents if doc.get("status") == "success"]
+    
+    # 第一遍：只收集图片路径，不在内存中保留文档结构
+    doc_paths = {}
+    for json_path in json_paths:
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                document_structure = json.load(f)
+            doc_paths[json_path] = _collect_local_image_paths(document_structure, os.path.dirname(json_path))
+        except Exception as e:
+            logger.warning(f"读取 {json_path} 失败，跳过近似重复检测: {e}")
+    all_paths = sorted(set().union(*doc_paths.values())) if doc_paths else []
+    stats["files_hashed"] = len(all_paths)
+    
+    mapping = find_near_duplicates(all_paths, threshold=threshold, method=method)
+    if not mapping:
+        return stats
+    
+    # 第二遍：改写引用了重复图片的文档
+    canonical_info = {}
+    for json_path, paths in doc_paths.items():
+        if not paths.intersection(mapping):
+            continue
+        output_dir = os.path.dirname(json_path)
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                document_structure = json.load(f)
+            
+            def _rewrite_refs(node):
+                for image_node, key in iter_image_refs(node):
+                    if key != "url" or os.path.isabs(image_node[key]):
+                        continue
+                    canonical = mapping.get(os.path.abspath(os.path.join(output_dir, image_node[key])))
+                    if canonical is None:
+                        continue
+                    if canonical not in canonical_info:
+                        width, height = get_image_file_dimensions(canonical)
+                        canonical_info[canonical] = {
+                            "format": os.path.splitext(canonical)[1].lower().lstrip('.'),
+                            "width": width,
+                            "height": height,
+                            "size": f"{os.path.getsize(canonical)/1024:.2f} KB"
+                        }
+                    image_node[key] = os.path.relpath(canonical, output_dir).replace(os.sep, "/")
+                    image_node.update(canonical_info[canonical])
+                return node
+            
+            _rewrite_refs(document_structure)
+            for table_node in iter_sidecar_tables(document_structure):
+                rewrite_sidecar_rows(output_dir, table_node, lambda row_idx, row: _rewrite_refs(row))
+            
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(document_structure, f, ensure_ascii=False, indent=2)
+            with open(os.path.join(output_dir, "processed_text.txt"), "w", encoding="utf-8") as f:
+                render_document_to_stream(document_structure, os.path.basename(output_dir), f, output_dir)
+        except Exception as e:
+            logger.warning(f"改写 {json_path} 中的近似重复图片引用失败: {e}")
+            # 未能改写引用的文档仍指向原文件，不能删除
+            for path in paths:
+                mapping.pop(path, None)
+    
+    for duplicate in mapping:
+        try:
+            size = os.path.getsize(duplicate)
+            os.remove(duplicate)
+            stats["duplicates_collapsed"] += 1
+            stats["bytes_saved"] += size
+        except OSError as e:
+            logger.warning(f"删除近似重复图片失败: {e}")
+    return stats
+
+def _dedupe_boilerplate_blocks(all_documents, output_base_dir, min_documents, replace):
+    """
+    批次级模板内容检测：出现在不少于 min_documents 个文档中的段落/表格在 document.json 中
+    标记指纹，或替换为指向 boilerplate.json 中共享副本的引用；报告写入 boilerplate_report.json
+    
+    processed_text.txt 在此之前已由完整内容生成；替换后重新渲染 document.json 时
+    DocumentProcessor 会从 boilerplate.json 还原引用，输出与 processed_text.txt 相同
+    
+    Returns:
+        dict: 报告汇总（不含逐块明细）
+    """
+    index = BoilerplateIndex(min_documents=min_documents)
+    json_paths = [doc["path"] for doc in all_documents if doc.get("status") == "success"]
+    
+    # 第一遍：只统计指纹，不在内存中保留文档结构
+    doc_fingerprints = {}
+    for json_path in json_paths:
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                document_structure = json.load(f)
+            doc_fingerprints[json_path] = index.add_document(json_path, document_structure)
+        except Exception as e:
+            logger.warning(f"读取 {json_path} 失败，跳过模板内容检测: {e}")
+    fingerprints = index.boilerplate()
+    
+    # 第二遍：标记或替换包含模板内容的文档
+    shared = {}
+    blocks_applied = 0
+    for json_path, doc_fps in doc_fingerprints.items():
+        if not doc_fps.intersection(fingerprints):
+            continue
+        output_dir = os.path.dirname(json_path)
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                document_structure = json.load(f)
+            blocks_applied += apply_boilerplate(
+                document_structure, fingerprints, replace=replace, min_chars=index.min_chars, shared=shared,
+                shared_dir=output_base_dir, output_dir=output_dir
+            )
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(document_structure, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"改写 {json_path} 中的模板内容失败: {e}")
+    
+    if replace and shared:
+        with open(os.path.join(output_base_dir, BOILERPLATE_SHARED_FILE), "w", encoding="utf-8") as f:
+            json.dump(shared, f, ensure_ascii=False, indent=2)
+    
+    report = index.report(replaced=replace)
+    report["blocks_applied"] = blocks_applied
+    with open(os.path.join(output_base_dir, "boilerplate_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return {key: value for key, value in report.items() if key != "blocks"}
+
+def process_docx_folder(input_folder, output_base_dir, quick_mode=True, metafile_cache_dir=None,
+                        image_mode=IMAGE_MODE_EXTRACT, image_limits=None, image_workers=None,
+                        transcode_format=None, transcode_quality=80,
+                        near_duplicate_threshold=None, near_duplicate_method="dhash", table_spill_rows=None,
+                        columnar_table_rows=None, boilerplate_min_documents=None, boilerplate_replace=False, embedded_max_depth=0,
+                        embedded_time_budget=DEFAULT_EMBEDDED_TIME_BUDGET):
     """
     批量处理文件夹中的所有DOCX文件，增强错误处理和进度跟踪
     
@@ -21,6 +275,24 @@ def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
         input_folder: 输入文件夹路径
         output_base_dir: 输出基础目录
         quick_mode: 快速模式，跳过耗时的EMF/WMF转换（默认True）
+        metafile_cache_dir: EMF/WMF转换持久化缓存目录，跨运行复用转换结果（默认不启用）
+        image_mode: 图片输出模式，"virtual" 时不写出图片文件，只记录其在原始DOCX中的位置
+        image_limits: 图片尺寸上限（ImageLimits），超出上限的图片在提取时降采样
+        image_workers: 每个文档图片物化（写出、降采样）的并行线程数
+        transcode_format: 提取后将PNG/BMP/TIFF图片转码为 "webp" 或 "avif"（默认不转码），
+            转码结果不比原图小时保留原图
+        transcode_quality: 转码质量（0-100）
+        near_duplicate_threshold: 批次处理完成后合并感知哈希汉明距离不超过该阈值的近似重复图片
+            （需要NumPy，默认不启用），引用改写为规范图片的相对路径
+        near_duplicate_method: 感知哈希方法，"dhash" 或 "phash"
+        table_spill_rows: 行数超过该值的表格写入 tables/ 下的JSONL旁路文件（默认不启用）
+        columnar_table_rows: 行数超过该值（且未写入旁路文件）的表格以列式表示保存（默认不启用）
+        boilerplate_min_documents: 批次处理完成后，把出现在不少于该数量文档中的段落、列表项和表格
+            标记为模板内容（默认不启用），报告写入 boilerplate_report.json
+        boilerplate_replace: 为True时把模板内容块替换为指向 boilerplate.json 中共享副本的引用
+        embedded_max_depth: 嵌入对象中 .docx/.xlsx 载荷的解析深度（默认0，不解析），
+            嵌入文档共用批次的转换进程池、EMF/WMF缓存和SmartArt缓存
+        embedded_time_budget: 每个文档解析嵌入文档的总时间预算（秒）
     """
     try:
         # 确保输出目录存在
@@ -62,6 +334,32 @@ def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
     failed_files = []
     skipped_files = []
     
+    # 非快速模式：整个批次共享一个EMF/WMF转换进程池
+    conversion_pool = None if quick_mode else MetafileConversionPool()
+    pending_outputs = None
+    
+    # EMF/WMF转换持久化缓存
+    metafile_cache = None
+    if metafile_cache_dir:
+        try:
+            metafile_cache = MetafileCache(metafile_cache_dir)
+        except Exception as e:
+            logger.warning(f"打开EMF/WMF转换缓存失败，不使用缓存: {e}")
+    
+    # 图片转码（整个批次共享一个进程池）
+    image_transcoder = None
+    if transcode_format:
+        try:
+            image_transcoder = ImageTranscoder(transcode_format, quality=transcode_quality)
+        except Exception as e:
+            logger.warning(f"创建图片转码器失败，不进行转码: {e}")
+    
+    # SmartArt布局分类结果在整个批次内共享
+    smartart_cache = SmartArtCache()
+    
+    # 嵌入对象按内容哈希标识，批次内统计跨文档重复
+    embedded_cache = EmbeddedObjectCache()
+    
     for idx, filename in enumerate(docx_files, 1):
         docx_path = os.path.join(input_folder, filename)
         logger.info(f"处理文件 ({idx}/{len(docx_files)}): {filename}")
@@ -87,8 +385,15 @@ def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
                 add_error_to_failed_files(failed_files, filename, f"File not readable: {e}")
                 continue
             
-            # 解析文档
-            document_structure = parse_docx(docx_path, output_dir, quick_mode)
+            # 解析文档（数据包在转换完成、图片转码后随输出一起写出）
+            sidecar_pack = SidecarPack()
+            document_structure = parse_docx(
+                docx_path, output_dir, quick_mode, conversion_pool, metafile_cache, image_mode=image_mode,
+                image_workers=image_workers, image_limits=image_limits, table_spill_rows=table_spill_rows,
+                columnar_table_rows=columnar_table_rows,
+                smartart_cache=smartart_cache, sidecar_pack=sidecar_pack, embedded_max_depth=embedded_max_depth,
+                embedded_time_budget=embedded_time_budget, embedded_cache=embedded_cache
+            )
             
             if not document_structure:
                 logger.error(f"跳过 {filename}，解析失败")
@@ -99,53 +404,17 @@ def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
             if document_structure.get("processing_info", {}).get("errors"):
                 logger.warning(f"文件 {filename} 解析时有错误，但继续处理")
             
-            processed_count += 1
-            
-            # 保存为JSON文件
-            json_path = os.path.join(output_dir, "document.json")
-            try:
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(document_structure, f, ensure_ascii=False, indent=2)
-            except (OSError, IOError) as e:
-                logger.error(f"保存JSON文件失败: {e}")
-                # 即使JSON保存失败，也算作处理失败
-                processed_count -= 1
-                add_error_to_failed_files(failed_files, filename, f"JSON save failed: {e}")
-                continue
-            
-            # 处理为标准化文本格式
-            try:
-                # 从文件名提取文档名称
-                doc_name = safe_name
-                processed_text = process_document_to_text(document_structure, doc_name, output_dir)
-                
-                # 保存处理后的文本
-                text_path = os.path.join(output_dir, "processed_text.txt")
-                with open(text_path, "w", encoding="utf-8") as f:
-                    f.write(processed_text)
-                
-                logger.info(f"文件 {filename} 的标准化文本已保存")
-                
-            except Exception as e:
-                logger.error(f"文件 {filename} 文本处理失败: {e}")
-                # 文本处理失败不影响整体处理状态
-            
-            # 添加到汇总列表
-            all_documents.append({
-                "file": filename,
-                "path": json_path,
-                "status": "success",
-                "images_found": len(document_structure.get("images", {})),
-                "warnings": len(document_structure.get("processing_info", {}).get("warnings", [])),
-                "errors": len(document_structure.get("processing_info", {}).get("errors", []))
-            })
-            
-            # 统计图片数量
-            total_images = len(document_structure.get("images", {}))
-            hf_images = len(document_structure.get("header_footer_images", []))
-            processing_info = document_structure.get("processing_info", {})
-            
-            logger.info(f"文件 {filename} 处理完成 - 图片: {total_images}, 页眉页脚图片: {hf_images}, 警告: {len(processing_info.get('warnings', []))}")
+            # 非快速模式下，上一个文档的输出推迟到当前文档解析完成后保存，
+            # 使其EMF/WMF转换与当前文档的解析重叠进行
+            if conversion_pool is not None:
+                if pending_outputs:
+                    if _flush_document_outputs(conversion_pool, pending_outputs, failed_files, all_documents,
+                                               image_transcoder):
+                        processed_count += 1
+                pending_outputs = (filename, safe_name, output_dir, document_structure, sidecar_pack)
+            elif _save_document_outputs(filename, safe_name, output_dir, document_structure, failed_files, all_documents,
+                                        image_transcoder, sidecar_pack):
+                processed_count += 1
             
         except Exception as e:
             logger.error(f"处理文件 {filename} 时发生未知错误: {e}")
@@ -153,6 +422,51 @@ def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
             add_error_to_failed_files(failed_files, filename, f"Unexpected error: {e}")
             continue
     
+    # 保存最后一个推迟的文档输出并关闭转换进程池
+    if conversion_pool is not None:
+        try:
+            if pending_outputs:
+                if _flush_document_outputs(conversion_pool, pending_outputs, failed_files, all_documents,
+                                           image_transcoder):
+                    processed_count += 1
+            pending_outputs = None
+        finally:
+            conversion_pool.shutdown()
+        logger.info(f"EMF/WMF转换统计: {conversion_pool.stats}")
+    if metafile_cache is not None:
+        metafile_cache.close()
+    if image_transcoder is not None:
+        image_transcoder.shutdown()
+        files_per_sec, mb_per_sec = image_transcoder.throughput()
+        logger.info(f"图片转码统计: 节省 {image_transcoder.stats['bytes_saved']/1024/1024:.2f} MB，"
+                    f"{files_per_sec:.1f} 个/秒，{mb_per_sec:.2f} MB/秒")
+    
+    # 批次级近似重复图片合并
+    near_duplicate_stats = None
+    if near_duplicate_threshold is not None:
+        if not numpy_available():
+            logger.warning("未安装NumPy，跳过近似重复图片合并")
+        else:
+            try:
+                near_duplicate_stats = _collapse_near_duplicate_images(
+                    all_documents, near_duplicate_threshold, near_duplicate_method
+                )
+                logger.info(f"近似重复图片合并: {near_duplicate_stats}")
+            except Exception as e:
+                logger.error(f"近似重复图片合并失败: {e}")
+    
+    # 批次级模板内容检测
+    boilerplate_stats = None
+    if boilerplate_min_documents:
+        try:
+            boilerplate_stats = _dedupe_boilerplate_blocks(
+                all_documents, output_base_dir, boilerplate_min_documents, boilerplate_replace
+            )
+            logger.info(f"模板内容检测: {boilerplate_stats['boilerplate_blocks']} 个块，"
+                        f"预计节省 {boilerplate_stats['estimated_bytes_saved']/1024:.1f} KB")
+        except Exception as e:
+            logger.error(f"模板内容检测失败: {e}")
+    
     # 保存汇总信息
     try:
         summary_path = os.path.join(output_base_dir, "summary.json")
@@ -168,6 +482,13 @@ def process_docx_folder(input_folder, output_base_dir, quick_mode=True):
             "documents": all_documents,
             "success_rate": f"{processed_count/len(docx_files)*100:.1f}%" if docx_files else "0%"
         }
+        if image_transcoder is not None:
+            summary_data["image_transcoding"] = image_transcoder.summary()
+        if near_duplicate_stats is not None:
+            summary_data["near_duplicate_images"] = near_duplicate_stats
+        if boilerplate_stats is not None:
+            summary_data["boilerplate"] = boilerplate_stats
+        summary_data["embedded_objects"] = embedded_cache.report()
         
         with open(summary_path, "w", encoding="utf-8") as f:
             json.dump(summary_data, f, ensure_ascii=False, indent=2)
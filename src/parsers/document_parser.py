@@ -16,6 +16,7 @@
 
 import os
 import json
+import time
 import logging
 import tempfile
 import shutil
@@ -33,8 +34,16 @@ from docx.table import Table
 from src.utils.text_utils import clean_text, get_heading_level, is_list_item, get_list_info, safe_filename
 from src.utils.document_utils import iter_block_items
 from src.extractors.content_extractor import extract_paragraph_content
+from src.extractors.extractor_registry import default_registry
 from src.extractors.image_extractor import extract_header_footer_images
-from src.parsers.table_parser import parse_table
+from src.parsers.table_parser import parse_table, DEFAULT_MAX_TABLE_DEPTH, DEFAULT_MAX_NESTED_CELLS
+from src.extractors.image_materializer import ImageMaterializer, IMAGE_MODE_EXTRACT, IMAGE_MODE_VIRTUAL
+from src.extractors.smartart_extractor import SmartArtCache, EmbeddedObjectCache
+from src.utils.metafile_pool import MetafileConversionPool
+from src.utils.table_sidecar import TableSidecarWriter
+from src.utils.table_columnar import ColumnarTableBuilder
+from src.utils.sidecar_pack import SidecarPack
+from src.extractors.embedded_parser import EmbeddedDocumentParser, DEFAULT_EMBEDDED_TIME_BUDGET
 
 logger = logging.getLogger(__name__)
 
@@ -72,7 +81,12 @@ def extract_metadata(doc: DocumentType, docx_path: str) -> Dict[str, Any]:
             "file_size": f"{os.path.getsize(docx_path)/1024:.2f} KB" if os.path.exists(docx_path) else "N/A"
         }
 
-def parse_docx(docx_path, output_dir, quick_mode=True):
+def parse_docx(docx_path, output_dir, quick_mode=True, conversion_pool=None, metafile_cache=None,
+               materialize_images=True, image_workers=None, image_mode=IMAGE_MODE_EXTRACT,
+               image_limits=None, media_manifest=None, table_spill_rows=None, columnar_table_rows=None,
+               max_table_depth=DEFAULT_MAX_TABLE_DEPTH, max_nested_table_cells=DEFAULT_MAX_NESTED_CELLS,
+               smartart_cache=None, sidecar_pack=None, embedded_max_depth=0,
+               embedded_time_budget=DEFAULT_EMBEDDED_TIME_BUDGET, extractor_registry=None, embedded_cache=None):
     """
     解析单个DOCX文档并提取内容，增强错误处理和健壮性
     返回结构化JSON数据
@@ -81,8 +95,44 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
         docx_path: DOCX文件路径
         output_dir: 输出目录
         quick_mode: 快速模式，跳过耗时的EMF/WMF转换（默认True）
+        conversion_pool: 非快速模式下使用的EMF/WMF转换进程池（MetafileConversionPool）。
+            由调用方提供时，转换在后台进行，调用方需在序列化结果前调用
+            conversion_pool.wait(group=output_dir)；未提供时本函数自行创建并在返回前等待完成
+        metafile_cache: EMF/WMF转换结果的持久化缓存（MetafileCache），跨运行复用转换结果
+        materialize_images: 遍历结束后是否物化图片（读取、去重、写出）。为False时图片节点只包含
+            part_name/r_id 引用，不写出任何图片文件，适用于只需要文档结构的场景（如差异比较）
+        image_workers: 图片物化的并行线程数，默认串行
+        image_mode: 图片输出模式。"extract"（默认）写出到 images/ 目录；"virtual" 不写出图片，
+            节点以 source 字段记录图片在原始DOCX中的ZIP成员名、压缩方式、偏移和大小，
+            可用 src.utils.zip_media.read_virtual_image 按需读回
+        image_limits: 图片尺寸上限（src.utils.image_resize.ImageLimits），超出上限的图片在写出时
+            降采样（最长边、文件大小、目标格式），图片节点记录 original_width/original_height
+        media_manifest: 同一文档的媒体清单（src.utils.media_manifest.MediaManifest）。与
+            extract_all_images_from_docx 共用时，每个媒体成员只读取、哈希一次；未提供时物化期间临时构建
+        table_spill_rows: 表格行数阈值。行数超过该值的表格在解析时逐行写入 tables/ 下的JSONL旁路文件，
+            表格节点只保留旁路文件路径、行列数和表头行（见 src.utils.table_sidecar）；默认不启用
+        columnar_table_rows: 表格行数阈值。行数超过该值（且未写入旁路文件）的表格以列式表示保存
+            （columnar 字段，见 src.utils.table_columnar），生成标准化文本时按列批量渲染；默认不启用
+        max_table_depth: 单元格中嵌套表格的最大解析深度，更深的嵌套表格只保留展平文本
+        max_nested_table_cells: 单个表格内嵌套表格的单元格总数预算，超出后的嵌套表格只保留展平文本
+        smartart_cache: 批次共享的 SmartArtCache（src.extractors.smartart_extractor）。文档内的SmartArt部件
+            解析结果总是按部件名缓存；提供时布局分类结果在批次内的文档之间共享
+        sidecar_pack: SmartArt和嵌入对象详细信息的文档级数据包（src.utils.sidecar_pack.SidecarPack）。
+            由调用方提供时，调用方需在异步转换完成后调用 sidecar_pack.write(output_dir)；未提供时本函数
+            自行创建并在返回前写出 sidecars.jsonl 和 sidecars.index.json
+        embedded_max_depth: 嵌入对象中 .docx/.xlsx 载荷的解析深度，默认0（不解析）。嵌入的DOCX用本函数
+            递归解析（共用输出目录、转换进程池和各类缓存），嵌入的XLSX流式读取单元格值
+            （见 src.extractors.embedded_parser）
+        embedded_time_budget: 解析嵌入文档的总时间预算（秒），超时后不再开始新的嵌入文档解析
+        extractor_registry: 段落内容提取器注册表（src.extractors.extractor_registry.ExtractorRegistry），
+            默认为内置的图片、SmartArt和OLE嵌入对象提取器。各提取器在本文档中的调用次数和耗时记录在
+            processing_info["extractor_timings"] 中
+        embedded_cache: 批次共享的 EmbeddedObjectCache（src.extractors.smartart_extractor）。嵌入对象的id由
+            OLE载荷和预览图的内容哈希得出，相同的ZIP成员在批次内只哈希一次；提供时登记各对象出现的文档，用于批次统计
     """
     temp_dir = None
+    own_pool = None
+    document_embedded_cache = None
     try:
         # 首先检查输入文件
         if not os.path.exists(docx_path):
@@ -166,6 +216,63 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
         # 图片引用字典
         image_references = {}
         
+        # 图片在遍历过程中只登记引用，遍历结束后统一物化
+        materializer = ImageMaterializer(
+            images_dir, image_references, mode=image_mode, source_path=os.path.abspath(docx_path),
+            image_limits=image_limits, media_manifest=media_manifest
+        )
+        if image_mode == IMAGE_MODE_VIRTUAL:
+            document_structure["processing_info"]["image_mode"] = IMAGE_MODE_VIRTUAL
+        
+        # SmartArt部件解析结果按部件名缓存，布局分类可在批次内共享
+        document_smartart_cache = SmartArtCache(
+            layout_types=smartart_cache.layout_types if smartart_cache is not None else None
+        )
+        
+        # 嵌入对象部件的内容哈希从原始文档流式计算，摘要和对象出现记录可在批次内共享
+        document_embedded_cache = EmbeddedObjectCache(
+            objects=embedded_cache.objects if embedded_cache is not None else None,
+            digests=embedded_cache.digests if embedded_cache is not None else None,
+            source_path=docx_path
+        )
+        
+        # SmartArt和嵌入对象的详细信息汇总到一个数据包中，不再逐个写出JSON文件
+        own_pack = sidecar_pack is None
+        if own_pack:
+            sidecar_pack = SidecarPack()
+        
+        # 非快速模式：EMF/WMF转换提交到进程池，遍历过程不等待转换结果
+        if not quick_mode and conversion_pool is None:
+            own_pool = MetafileConversionPool()
+            conversion_pool = own_pool
+        
+        # 段落内容提取器：每个 run 只遍历一次，按元素标签 / graphicData uri 分发
+        if extractor_registry is None:
+            extractor_registry = default_registry()
+        extractor_timings_before = extractor_registry.timings()
+        
+        # 嵌入的 .docx/.xlsx 载荷（可选）：与本文档共用输出目录、进程池和缓存
+        embedded_parser = None
+        if embedded_max_depth and embedded_max_depth > 0:
+            embedded_parser = EmbeddedDocumentParser(
+                output_dir, embedded_max_depth, time.monotonic() + embedded_time_budget,
+                parse_options={
+                    "quick_mode": quick_mode,
+                    "conversion_pool": conversion_pool,
+                    "metafile_cache": metafile_cache,
+                    "materialize_images": materialize_images,
+                    "image_workers": image_workers,
+                    "image_limits": image_limits,
+                    "columnar_table_rows": columnar_table_rows,
+                    "max_table_depth": max_table_depth,
+                    "max_nested_table_cells": max_nested_table_cells,
+                    "smartart_cache": document_smartart_cache,
+                    "sidecar_pack": sidecar_pack,
+                    "extractor_registry": extractor_registry,
+                    "embedded_cache": document_embedded_cache
+                }
+            )
+        
         # 图片现在会在内容遍历过程中提取，不需要单独的批量提取
         
         # 创建根节点
@@ -184,6 +291,7 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
         in_toc = False  # 是否在目录部分
         list_counter = defaultdict(int)  # 多级列表计数器
         table_counter = 0  # 表格计数器
+        table_sidecars = []  # 写入旁路文件的超大表格
         block_counter = 0  # 处理的块计数器
         
         # 遍历文档块（增强错误处理）
@@ -248,7 +356,12 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
                                 list_level, prefix = get_list_info(block, list_counter)
                                 
                                 # 提取列表项中的内容（图片和SmartArt）
-                                content_nodes = extract_paragraph_content(block, output_dir, image_references, quick_mode)
+                                content_nodes = extract_paragraph_content(
+                                    block, output_dir, image_references, quick_mode, conversion_pool, metafile_cache,
+                                    materializer=materializer, smartart_cache=document_smartart_cache,
+                                    sidecar_pack=sidecar_pack, embedded_parser=embedded_parser,
+                                    extractor_registry=extractor_registry, embedded_cache=document_embedded_cache
+                                )
                                 
                                 # 创建列表项节点
                                 list_item = {
@@ -274,7 +387,12 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
                         if text or (hasattr(block, 'runs') and block.runs):
                             try:
                                 # 提取段落中的内容（图片和SmartArt）
-                                content_nodes = extract_paragraph_content(block, output_dir, image_references, quick_mode)
+                                content_nodes = extract_paragraph_content(
+                                    block, output_dir, image_references, quick_mode, conversion_pool, metafile_cache,
+                                    materializer=materializer, smartart_cache=document_smartart_cache,
+                                    sidecar_pack=sidecar_pack, embedded_parser=embedded_parser,
+                                    extractor_registry=extractor_registry, embedded_cache=document_embedded_cache
+                                )
                                 
                                 # 添加文本段落
                                 if text:
@@ -311,12 +429,36 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
                     # 表格处理
                     elif isinstance(block, Table):
                         try:
-                            table_data = parse_table(block, table_counter, image_references, images_dir)
-                            table_item = {
-                                "type": "table",
-                                "index": table_counter,
-                                "rows": table_data
-                            }
+                            row_count = len(block._tbl.tr_lst)
+                            if table_spill_rows and row_count > table_spill_rows:
+                                # 超大表格：逐行写入旁路文件
+                                sidecar = TableSidecarWriter(output_dir, table_counter)
+                                try:
+                                    parse_table(block, table_counter, image_references, images_dir, materializer,
+                                                row_writer=sidecar, max_depth=max_table_depth,
+                                                max_nested_cells=max_nested_table_cells)
+                                finally:
+                                    sidecar.close()
+                                table_sidecars.append(sidecar)
+                                table_item = {"type": "table", "index": table_counter}
+                                table_item.update(sidecar.table_node())
+                            elif columnar_table_rows is not None and row_count > columnar_table_rows:
+                                # 大表格：列式表示
+                                builder = ColumnarTableBuilder()
+                                parse_table(block, table_counter, image_references, images_dir, materializer,
+                                            row_writer=builder, max_depth=max_table_depth,
+                                            max_nested_cells=max_nested_table_cells)
+                                table_item = {"type": "table", "index": table_counter}
+                                table_item.update(builder.table_node())
+                            else:
+                                table_data = parse_table(block, table_counter, image_references, images_dir, materializer,
+                                                         max_depth=max_table_depth,
+                                                         max_nested_cells=max_nested_table_cells)
+                                table_item = {
+                                    "type": "table",
+                                    "index": table_counter,
+                                    "rows": table_data
+                                }
                             table_counter += 1
                             
                             # 添加到当前章节
@@ -336,6 +478,27 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
             logger.error(f"遍历文档块时出现严重错误: {e}")
             document_structure["processing_info"]["errors"].append(f"Document traversal failed: {e}")
         
+        # 物化图片：每个图片部件只读取、哈希和写出一次
+        referenced_images = materializer.unique_parts
+        if materialize_images:
+            try:
+                materializer.materialize(max_workers=image_workers)
+            except Exception as e:
+                logger.error(f"物化图片失败: {e}")
+                document_structure["processing_info"]["errors"].append(f"Image materialization failed: {e}")
+        else:
+            document_structure["processing_info"]["images_materialized"] = False
+        
+        # 超大表格：用物化后的图片字段回写旁路文件中含图片的行
+        for sidecar in table_sidecars:
+            try:
+                sidecar.finalize()
+            except Exception as e:
+                logger.warning(f"回写表格旁路文件 {sidecar.rel_path} 失败: {e}")
+                document_structure["processing_info"]["warnings"].append(f"Table sidecar {sidecar.rel_path} finalize failed: {e}")
+        if table_sidecars:
+            document_structure["processing_info"]["tables_spilled"] = len(table_sidecars)
+        
         # 添加图片引用
         if image_references:
             document_structure["images"] = image_references
@@ -343,10 +506,30 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
         else:
             logger.info(f"文档 {os.path.basename(docx_path)} 中没有检测到图片")
         
+        document_embedded_cache.close()
+        document_embedded_cache = None
+        
+        # 等待自建进程池中的转换完成，结果已通过回调写回节点
+        if own_pool is not None:
+            own_pool.shutdown()
+            document_structure["processing_info"]["metafile_conversions"] = own_pool.stats
+            own_pool = None
+        
+        # 写出自建的旁路数据包（此时预览图转换结果已写回节点）
+        if own_pack:
+            try:
+                sidecar_pack.write(output_dir)
+            except Exception as e:
+                logger.error(f"写出旁路数据包失败: {e}")
+                document_structure["processing_info"]["errors"].append(f"Sidecar pack write failed: {e}")
+        
         # 添加处理统计信息
         document_structure["processing_info"]["blocks_processed"] = block_counter
         document_structure["processing_info"]["tables_found"] = table_counter
-        document_structure["processing_info"]["images_found"] = len(image_references)
+        document_structure["processing_info"]["images_found"] = len(image_references) if materialize_images else referenced_images
+        document_structure["processing_info"]["extractor_timings"] = extractor_registry.timings(
+            since=extractor_timings_before
+        )
         
         # 清理临时目录
         try:
@@ -368,5 +551,14 @@ def parse_docx(docx_path, output_dir, quick_mode=True):
                 shutil.rmtree(temp_dir, ignore_errors=True)
         except:
             pass
+        
+        if own_pool is not None:
+            try:
+                own_pool.shutdown()
+            except Exception:
+                pass
+        
+        if document_embedded_cache is not None:
+            document_embedded_cache.close()
             
         return None
@@ -3,25 +3,64 @@
 """
 
 import logging
-from src.utils.document_utils import identify_merged_cells
-from src.extractors.image_extractor import extract_table_images
+from docx.table import Table, _Cell
+from docx.oxml.ns import qn
+from src.utils.document_utils import identify_merged_cells, iter_row_grid_cells
+from src.extractors.image_extractor import extract_table_images, has_blip
 from src.utils.text_utils import clean_text
 
 logger = logging.getLogger(__name__)
 
-def parse_table(table, table_idx, image_references, images_dir):
-    """解析表格并处理合并单元格"""
-    # 识别所有合并单元格
-    merged_cells = identify_merged_cells(table)
-    
-    table_data = []
-    for row_idx, row in enumerate(table.rows):
+_W_P = qn('w:p')
+_W_TBL = qn('w:tbl')
+_W_TR = qn('w:tr')
+_W_TC = qn('w:tc')
+
+# 嵌套表格的默认上限：最大嵌套深度（顶层表格为0）和单个顶层表格内嵌套表格的单元格总数
+DEFAULT_MAX_TABLE_DEPTH = 5
+DEFAULT_MAX_NESTED_CELLS = 20000
+
+def _cell_text(tc):
+    """单元格文本，与 python-docx 的 cell.text 相同（各段落文本以换行连接），不创建段落对象"""
+    return "\n".join(p.text for p in tc.iterchildren(_W_P))
+
+def _count_cells(tbl):
+    return sum(1 for tr in tbl.iterchildren(_W_TR) for _ in tr.iterchildren(_W_TC))
+
+def _truncated_table_node(tbl, depth, reason):
+    """超出深度或单元格预算的嵌套表格：不再解析结构，只保留展平后的文本"""
+    return {
+        "type": "table",
+        "depth": depth,
+        "truncated": reason,
+        "text": clean_text("\n".join(p.text for p in tbl.iter(_W_P)))
+    }
+
+def parse_table(table, table_idx, image_references, images_dir, materializer=None, row_writer=None,
+                max_depth=DEFAULT_MAX_TABLE_DEPTH, max_nested_cells=DEFAULT_MAX_NESTED_CELLS):
+    """
+    解析表格并处理合并单元格
+    materializer: 可选的 ImageMaterializer，提供时单元格图片延迟到遍历结束后物化
+    row_writer: 可选的行接收器（TableSidecarWriter 旁路文件 / ColumnarTableBuilder 列式表示），
+        提供时每解析完一行即交给其 write_row，不在内存中累积，返回空列表
+    max_depth / max_nested_cells: 嵌套表格的最大深度和单元格总数预算
+
+    直接遍历 w:tbl/w:tr/w:tc（见 iter_row_grid_cells），不使用 python-docx 的 row.cells，
+    耗时与单元格数量成线性关系；整个表格没有 a:blip 时跳过逐单元格的图片查找
+
+    单元格中的嵌套表格作为子 table 节点（带 depth 字段）追加到单元格 content 末尾，
+    其中的图片归属嵌套表格的单元格。嵌套表格用显式栈逐个解析，不递归；超过深度或
+    单元格预算的嵌套表格只保留展平文本（truncated 字段记录原因），其图片仍归属外层单元格
+    """
+    budget = {"cells": max_nested_cells}
+
+    def parse_row(tbl_table, row_idx, row_tcs, merged_cells, table_has_images, depth, stack):
         row_nodes = []
-        for cell_idx, cell in enumerate(row.cells):
+        for cell_idx, tc in enumerate(row_tcs):
             # 如果是被合并的单元格，跳过
             if (row_idx, cell_idx) in merged_cells:
                 continue
-                
+
             # 创建单元格节点
             cell_node = {
                 "type": "table_cell",
@@ -29,29 +68,84 @@ def parse_table(table, table_idx, image_references, images_dir):
                 "col": cell_idx,
                 "content": []
             }
-            
+
             # 添加文本内容
-            cell_text = clean_text(cell.text)
+            cell_text = clean_text(_cell_text(tc))
             if cell_text:
                 cell_node["content"].append({
                     "type": "text",
                     "text": cell_text
                 })
-                
-            # 提取单元格中的图片
-            image_nodes = extract_table_images(cell, table_idx, row_idx, cell_idx, image_references, images_dir)
+
+            # 嵌套表格：在预算内的入栈单独解析，其余只保留展平文本
+            nested_nodes = []
+            nested_tbls = set()
+            for nested_tbl in tc.iterchildren(_W_TBL):
+                if depth + 1 > max_depth:
+                    nested_nodes.append(_truncated_table_node(nested_tbl, depth + 1, "max_depth"))
+                    continue
+                cells = _count_cells(nested_tbl)
+                if cells > budget["cells"]:
+                    nested_nodes.append(_truncated_table_node(nested_tbl, depth + 1, "cell_budget"))
+                    continue
+                budget["cells"] -= cells
+                nested_node = {"type": "table", "depth": depth + 1, "rows": []}
+                nested_nodes.append(nested_node)
+                nested_tbls.add(nested_tbl)
+                stack.append((nested_tbl, nested_node, depth + 1))
+
+            # 提取单元格中的图片（表格中没有图片时不逐单元格查找）
+            image_nodes = []
+            if table_has_images:
+                image_nodes = extract_table_images(_Cell(tc, tbl_table), table_idx, row_idx, cell_idx, image_references,
+                                                   images_dir, materializer, exclude=nested_tbls)
             if image_nodes:
                 for img in image_nodes:
-                    cell_node["content"].append({
-                        "type": "image",
-                        "url": img["url"],
-                        "format": img["format"],
-                        "width": img["width"],
-                        "height": img["height"],
-                        "size": img["size"]
-                    })
-            
+                    if materializer is not None:
+                        cell_node["content"].append(materializer.attach({"type": "image"}, img))
+                    else:
+                        cell_node["content"].append({
+                            "type": "image",
+                            "url": img["url"],
+                            "format": img["format"],
+                            "width": img["width"],
+                            "height": img["height"],
+                            "size": img["size"]
+                        })
+
+            cell_node["content"].extend(nested_nodes)
             row_nodes.append(cell_node)
-        table_data.append(row_nodes)
-    
+        return row_nodes
+
+    def parse_nested(stack):
+        while stack:
+            nested_tbl, nested_node, depth = stack.pop()
+            try:
+                nested_table = Table(nested_tbl, table)
+                merged_cells = identify_merged_cells(nested_table)
+                nested_has_images = has_blip(nested_tbl)
+                for row_idx, row_tcs in enumerate(iter_row_grid_cells(nested_tbl)):
+                    nested_node["rows"].append(
+                        parse_row(nested_table, row_idx, row_tcs, merged_cells, nested_has_images, depth, stack)
+                    )
+            except Exception as e:
+                logger.warning(f"表格{table_idx}中深度 {depth} 的嵌套表格解析失败: {e}")
+                nested_node.clear()
+                nested_node.update(_truncated_table_node(nested_tbl, depth, "error"))
+
+    # 识别所有合并单元格
+    merged_cells = identify_merged_cells(table)
+    table_has_images = has_blip(table._tbl)
+
+    table_data = []
+    for row_idx, row_tcs in enumerate(iter_row_grid_cells(table._tbl)):
+        stack = []
+        row_nodes = parse_row(table, row_idx, row_tcs, merged_cells, table_has_images, 0, stack)
+        # 写出该行之前解析完其中的嵌套表格
+        parse_nested(stack)
+        if row_writer is not None:
+            row_writer.write_row(row_nodes)
+        else:
+            table_data.append(row_nodes)
+
     return table_data
@@ -7,170 +7,178 @@ import os
 import json
 import logging
 import re
-from typing import Dict, List, Any, Optional, Iterable
+import tracemalloc
+from typing import Dict, List, Any, Optional, Iterable, Iterator, TextIO
+from src.utils.table_sidecar import iter_sidecar_rows
+from src.utils.table_columnar import run_starts
+from src.utils.boilerplate import has_boilerplate_refs, load_shared_boilerplate, with_resolved_boilerplate
 
 logger = logging.getLogger(__name__)
 
+# 一级章节之间的分隔：真实双换行 + 字面分隔符 + 真实双换行
+_SECTION_SEPARATOR = "\n\n\\n\\n\n\n"
+
+DEFAULT_STREAM_BUFFER_CHARS = 1 << 16
+
+def _table_has_rows(table_item: Dict[str, Any]) -> bool:
+    """表格是否有行（超大表格的行在旁路文件中，见 src.utils.table_sidecar）"""
+    return bool(table_item.get("rows") or table_item.get("row_count"))
+
+def _cell_text_parts(cell: Dict[str, Any]) -> List[str]:
+    """单元格中的文本片段：文本项，以及嵌套表格的展平文本"""
+    parts = []
+    for item in cell.get("content", []):
+        if not isinstance(item, dict):
+            continue
+        if item.get("type") == "text":
+            parts.append(item.get("text", "").strip())
+        elif item.get("type") == "table":
+            parts.append(_nested_table_text(item))
+    return parts
+
+def _cell_text(cell: Dict[str, Any]) -> str:
+    """单元格文本：非空的文本片段（含嵌套表格的展平文本）以空格连接，按行和列式表示的表格共用"""
+    return " ".join(t for t in _cell_text_parts(cell) if t)
+
+def _nested_table_text(table_item: Dict[str, Any]) -> str:
+    """嵌套表格的展平文本：按行依次连接各单元格文本；超出深度或预算的嵌套表格只有 text 字段"""
+    if "rows" not in table_item:
+        return (table_item.get("text") or "").strip()
+    texts = []
+    for row in table_item.get("rows", []):
+        if not isinstance(row, list):
+            continue
+        for cell in row:
+            if isinstance(cell, dict):
+                text = _cell_text(cell)
+                if text:
+                    texts.append(text)
+    return " ".join(texts)
+
+def _table_first_row(table_item: Dict[str, Any]) -> Any:
+    """表格第一行；旁路文件表格使用节点中保存的表头行"""
+    rows = table_item.get("rows")
+    if rows:
+        return rows[0]
+    return table_item.get("header_row") or None
+
+class _StreamSink:
+    """
+    render_document 的写出端：缓冲文本片段，超过 buffer_chars 时写出到流
+
+    与 process_document 的 strip/rstrip 等价：尾部空白先暂存，后面出现非空白内容时才写出，
+    结束时丢弃（全文 rstrip）；begin_section 之后丢弃章节开头的空白，end_section 丢弃章节
+    末尾的空白（章节 strip）。
+    """
+
+    def __init__(self, stream: TextIO, buffer_chars: int = DEFAULT_STREAM_BUFFER_CHARS):
+        self.stream = stream
+        self.buffer_chars = buffer_chars
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._held = ""  # 暂存的尾部空白
+        self._leading = False  # 是否丢弃章节开头的空白
+        self._section_content = False
+        self.chars_written = 0
+        self.peak_buffered_chars = 0
+        self.largest_fragment_chars = 0
+
+    def write(self, text: str):
+        if len(text) > self.largest_fragment_chars:
+            self.largest_fragment_chars = len(text)
+        if self._leading:
+            text = text.lstrip()
+            if not text:
+                return
+            self._leading = False
+        body = text.rstrip()
+        if not body:
+            self._held += text
+            return
+        self._section_content = True
+        if self._held:
+            self._emit(self._held)
+        self._emit(body)
+        self._held = text[len(body):]
+
+    def begin_section(self):
+        self._leading = True
+        self._section_content = False
+
+    def end_section(self) -> bool:
+        """结束章节，返回章节是否有非空白内容"""
+        self._leading = False
+        if self._section_content:
+            self._held = ""
+        return self._section_content
+
+    def finish(self, rstrip: bool = True):
+        if not rstrip and self._held:
+            self._emit(self._held)
+        self._held = ""
+        self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write("".join(self._buffer))
+            self.chars_written += self._buffered
+            self._buffer = []
+            self._buffered = 0
+
+    def _emit(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered > self.peak_buffered_chars:
+            self.peak_buffered_chars = self._buffered
+        if self._buffered >= self.buffer_chars:
+            self.flush()
+
 class DocumentProcessor:
     """
     文档内容处理器
     按照需求规格说明书3.1-3.10节的规则处理文档内容
+
+    文档含有批次模板内容引用（boilerplate_ref，见 src.utils.boilerplate）时先用共享副本还原:
+    boilerplate 为 boilerplate.json 的内容，boilerplate_dir 为其所在的批次输出目录；
+    未提供时从 output_dir 的上级目录读取 boilerplate.json
     """
     
-    def __init__(self):
+    def __init__(self, boilerplate: Optional[Dict[str, Any]] = None, boilerplate_dir: Optional[str] = None):
         self.processed_sections = []
         self.image_counter = 0
         self.output_dir = ""  # 添加输出目录属性
+        self.source_path = ""  # 原始DOCX路径，用于虚拟图片引用
+        self.boilerplate = boilerplate
+        self.boilerplate_dir = boilerplate_dir
         
     def process_document(self, document_structure: Dict[str, Any], document_name: str, output_dir: str = "") -> str:
         """
         处理完整文档，返回最终的文本格式
-        
+
         Args:
             document_structure: 解析得到的JSON结构
             document_name: 文档名称
             output_dir: 输出目录路径，用于生成绝对路径
-            
+
         Returns:
             str: 处理后的标准化文本
         """
         try:
-            self.processed_sections = []
-            self.image_counter = 0
-            self.output_dir = output_dir  # 设置输出目录
-            
-            # 获取文档的sections
-            sections = document_structure.get("sections", [])
-            if not sections:
-                logger.warning("文档中没有找到sections")
-                return ""
-            
-            # 查找根节点
-            root_section = None
-            for section in sections:
-                if section.get("type") == "section" and section.get("level", 0) == 0:
-                    root_section = section
-                    break
-            
-            if not root_section:
-                logger.warning("文档中没有找到根节点")
+            document_structure = self._resolve_boilerplate(document_structure, output_dir)
+            self._reset(document_structure, output_dir)
+            plan = self._plan_document(document_structure)
+            if plan is None:
                 return ""
-            
-            # 获取根节点下的内容
-            root_content = root_section.get("content", [])
-            
-            # 查找顶级章节（level=1的章节）
-            top_level_sections = []
-            other_content = []
-            for item in root_content:
-                if item.get("type") == "section" and item.get("level", 0) == 1:
-                    top_level_sections.append(item)
-                else:
-                    other_content.append(item)
+            toc_text, real_sections, other_content = plan
 
-            # 3.1 首页删除：根级别过滤首页封面表格与版本历史表格
-            def _is_front_page_table(tbl: Dict[str, Any]) -> bool:
-                if tbl.get("type") != "table":
-                    return False
-                if tbl.get("index", -1) == 0:
-                    return True
-                if tbl.get("index", -1) == 1:
-                    rows = tbl.get("rows", [])
-                    if rows and isinstance(rows[0], list) and rows[0]:
-                        first_cell = rows[0][0]
-                        if isinstance(first_cell, dict):
-                            head_text = "".join(
-                                itm.get("text", "") for itm in first_cell.get("content", []) if isinstance(itm, dict)
-                            ).strip()
-                            if head_text == "序号":
-                                return True
-                return False
-            other_content = [c for c in other_content if not _is_front_page_table(c)]
-            
-            if not top_level_sections:
-                logger.warning("文档中没有找到有效的一级章节")
-                # 如果没有一级章节，处理其他内容
-                if other_content:
-                    content_parts = []
-                    for item in other_content:
-                        part = self._process_content_item(item)
-                        if part:
-                            content_parts.append(part)
-                    return " ".join(content_parts)
-                return ""
+            if other_content is not None:
+                content_parts = []
+                for item in other_content:
+                    part = self._process_content_item(item)
+                    if part:
+                        content_parts.append(part)
+                return " ".join(content_parts)
 
-            # 提取TOC：空内容的一级章节（content 为空或仅包含空白段落）视为目录项
-            toc_sections = []
-            real_sections = []
-            for s in top_level_sections:
-                if self._is_toc_candidate(s):
-                    toc_sections.append(s)
-                else:
-                    real_sections.append(s)
-
-            toc_text = ""
-            if toc_sections:
-                toc_lines = []
-                for ts in toc_sections:
-                    raw_title = ts.get("title", "").strip()
-                    clean = re.sub(r"\s+\d+\s*$", "", raw_title)  # 去尾部页码
-                    # 一级标题
-                    m1 = re.match(r"^(\d+)\s+(.*)$", clean)
-                    if m1:
-                        toc_lines.append(f"# {m1.group(1)} {m1.group(2)}")
-                    else:
-                        toc_lines.append(f"# {clean}")
-                    # 收集其子section（用于二级 TOC）
-                    for sub in ts.get("content", []):
-                        if sub.get("type") == "section":
-                            stitle = re.sub(r"\s+\d+\s*$", "", sub.get("title", "").strip())
-                            m2 = re.match(r"^(\d+\.\d+)\s+(.*)$", stitle)
-                            if m2:
-                                toc_lines.append(f"## {m2.group(1)} {m2.group(2)}")
-                            else:
-                                m3 = re.match(r"^(\d+\.\d+\.\d+)\s+(.*)$", stitle)
-                                if m3:
-                                    toc_lines.append(f"### {m3.group(1)} {m3.group(2)}")
-                                else:
-                                    toc_lines.append(f"## {stitle}")
-                if toc_lines:
-                    toc_text = "\n".join(toc_lines) + "\n\n\\n\\n\n\n"
-            else:
-                real_sections = top_level_sections
-            if not real_sections:
-                real_sections = top_level_sections
-
-            # 按占位目录章节顺序重排正文章节，使编号与TOC一致
-            if toc_sections and real_sections:
-                def _norm_title(t: str) -> str:
-                    t = re.sub(r"\s+\d+\s*$", "", t.strip())  # 去尾部页码
-                    t = re.sub(r"^\d+(?:\.\d+)*\s+", "", t)  # 去前缀编号
-                    return t.strip()
-
-                # 取有实际内容的 real_sections 作为候选
-                content_candidates = list(real_sections)
-                used_ids = set()
-                ordered_real: List[Dict[str, Any]] = []
-
-                # 对 toc_sections 中的一级编号章节按数字序维持原出现顺序
-                for placeholder in toc_sections:
-                    p_norm = _norm_title(placeholder.get("title", ""))
-                    match_idx = -1
-                    for idx, sec in enumerate(content_candidates):
-                        if idx in used_ids:
-                            continue
-                        if _norm_title(sec.get("title", "")) == p_norm:
-                            match_idx = idx
-                            break
-                    if match_idx >= 0:
-                        ordered_real.append(content_candidates[match_idx])
-                        used_ids.add(match_idx)
-                # 追加未匹配的剩余章节（保持原顺序）
-                for idx, sec in enumerate(content_candidates):
-                    if idx not in used_ids:
-                        ordered_real.append(sec)
-                real_sections = ordered_real
-            
             # 处理每个顶级章节
             final_text_parts = []
 
@@ -178,67 +186,301 @@ class DocumentProcessor:
                 section_text = self._process_top_level_section(section, document_name, i + 1)
                 if section_text.strip():
                     # 在每个一级章节末尾追加：真实双换行 + 字面分隔符 + 真实双换行
-                    final_text_parts.append(section_text.strip() + "\n\n\\n\\n\n\n")
+                    final_text_parts.append(section_text.strip() + _SECTION_SEPARATOR)
 
             # 组合 TOC 与章节
             final_text = (toc_text + "".join(final_text_parts)).rstrip()
 
             return final_text
-            
+
         except Exception as e:
             logger.error(f"处理文档时发生错误: {e}")
             return ""
+
+    def render_document(self, document_structure: Dict[str, Any], document_name: str, stream: TextIO,
+                        output_dir: str = "", buffer_chars: int = DEFAULT_STREAM_BUFFER_CHARS,
+                        measure_memory: bool = False) -> Dict[str, Any]:
+        """
+        流式处理完整文档，把标准化文本逐段写入 stream，输出与 process_document 逐字节相同
+
+        每个一级章节处理完成后，把章节标题、二级章节和表格的各行以及其他内容项逐个写入缓冲区，
+        缓冲区超过 buffer_chars 个字符时写出到 stream；章节首尾和全文末尾的空白去除只需暂存尚未
+        确定的空白。内存占用为缓冲区加上单个一级章节的文本，与文档总长度无关。
+        章节、二级章节或表格处理出错时记录日志并整体丢弃，与 process_document 相同。
+
+        Args:
+            document_structure: 解析得到的JSON结构
+            document_name: 文档名称
+            stream: 文本流（open(..., "w")、gzip.open(..., "wt")、io.StringIO 等带 write 方法的对象）
+            output_dir: 输出目录路径，用于生成绝对路径
+            buffer_chars: 写出前缓冲的字符数
+            measure_memory: 为True时用 tracemalloc 统计渲染期间的峰值内存（有额外开销）
+
+        Returns:
+            dict: {"chars": 写出的字符数, "peak_buffered_chars": 缓冲区峰值字符数,
+                   "largest_fragment_chars": 单个文本片段的最大字符数, "peak_memory_bytes"?: 峰值内存字节数}
+        """
+        sink = _StreamSink(stream, buffer_chars)
+        own_tracing = measure_memory and not tracemalloc.is_tracing()
+        if own_tracing:
+            tracemalloc.start()
+        if measure_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        rstrip = True
+        try:
+            document_structure = self._resolve_boilerplate(document_structure, output_dir)
+            self._reset(document_structure, output_dir)
+            plan = self._plan_document(document_structure)
+            if plan is not None:
+                toc_text, real_sections, other_content = plan
+                if other_content is not None:
+                    # 没有一级章节时各内容项以空格连接，末尾空白不去除
+                    rstrip = False
+                    first = True
+                    for item in other_content:
+                        for k, fragment in enumerate(self._iter_content_item(item)):
+                            if k == 0 and not first:
+                                sink.write(" ")
+                            sink.write(fragment)
+                            first = False
+                else:
+                    sink.write(toc_text)
+                    for i, section in enumerate(real_sections):
+                        fragments = self._top_level_fragments(section, document_name, i + 1)
+                        sink.begin_section()
+                        for fragment in fragments:
+                            sink.write(fragment)
+                        if sink.end_section():
+                            sink.write(_SECTION_SEPARATOR)
+        except Exception as e:
+            logger.error(f"处理文档时发生错误: {e}")
+        finally:
+            sink.finish(rstrip)
+            if measure_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                if own_tracing:
+                    tracemalloc.stop()
+        stats = {
+            "chars": sink.chars_written,
+            "peak_buffered_chars": sink.peak_buffered_chars,
+            "largest_fragment_chars": sink.largest_fragment_chars
+        }
+        if measure_memory:
+            stats["peak_memory_bytes"] = max(peak - baseline, 0)
+        return stats
+
+    def _resolve_boilerplate(self, document_structure: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+        """还原模板内容引用（不修改传入的文档），没有引用时原样返回"""
+        if not has_boilerplate_refs(document_structure):
+            return document_structure
+        shared, shared_dir = self.boilerplate, self.boilerplate_dir
+        if shared is None and output_dir:
+            shared_dir = os.path.dirname(os.path.abspath(output_dir))
+            shared = load_shared_boilerplate(shared_dir)
+        if not shared:
+            logger.warning("文档含有模板内容引用，但未找到共享副本（boilerplate.json），这些块不输出")
+            return document_structure
+        return with_resolved_boilerplate(document_structure, shared, shared_dir, output_dir or None)
+
+    def _reset(self, document_structure: Dict[str, Any], output_dir: str):
+        self.processed_sections = []
+        self.image_counter = 0
+        self.output_dir = output_dir  # 设置输出目录
+        self.source_path = document_structure.get("metadata", {}).get("source_path", "")
+
+    def _plan_document(self, document_structure: Dict[str, Any]) -> Optional[tuple]:
+        """
+        确定输出的目录文本和一级章节（3.1首页删除、目录提取、按目录重排章节）
+
+        Returns:
+            (toc_text, real_sections, None)；没有一级章节时为 ("", [], 根节点下的其他内容)；
+            没有可输出的内容时为 None
+        """
+        # 获取文档的sections
+        sections = document_structure.get("sections", [])
+        if not sections:
+            logger.warning("文档中没有找到sections")
+            return None
+        
+        # 查找根节点
+        root_section = None
+        for section in sections:
+            if section.get("type") == "section" and section.get("level", 0) == 0:
+                root_section = section
+                break
+        
+        if not root_section:
+            logger.warning("文档中没有找到根节点")
+            return None
+        
+        # 获取根节点下的内容
+        root_content = root_section.get("content", [])
+        
+        # 查找顶级章节（level=1的章节）
+        top_level_sections = []
+        other_content = []
+        for item in root_content:
+            if item.get("type") == "section" and item.get("level", 0) == 1:
+                top_level_sections.append(item)
+            else:
+                other_content.append(item)
+
+        # 3.1 首页删除：根级别过滤首页封面表格与版本历史表格
+        def _is_front_page_table(tbl: Dict[str, Any]) -> bool:
+            if tbl.get("type") != "table":
+                return False
+            if tbl.get("index", -1) == 0:
+                return True
+            if tbl.get("index", -1) == 1:
+                first_row = _table_first_row(tbl)
+                if first_row and isinstance(first_row, list):
+                    first_cell = first_row[0]
+                    if isinstance(first_cell, dict):
+                        head_text = "".join(
+                            itm.get("text", "") for itm in first_cell.get("content", []) if isinstance(itm, dict)
+                        ).strip()
+                        if head_text == "序号":
+                            return True
+            return False
+        other_content = [c for c in other_content if not _is_front_page_table(c)]
+        
+        if not top_level_sections:
+            logger.warning("文档中没有找到有效的一级章节")
+            # 如果没有一级章节，处理其他内容
+            if other_content:
+                return "", [], other_content
+            return None
+
+        # 提取TOC：空内容的一级章节（content 为空或仅包含空白段落）视为目录项
+        toc_sections = []
+        real_sections = []
+        for s in top_level_sections:
+            if self._is_toc_candidate(s):
+                toc_sections.append(s)
+            else:
+                real_sections.append(s)
+
+        toc_text = ""
+        if toc_sections:
+            toc_lines = []
+            for ts in toc_sections:
+                raw_title = ts.get("title", "").strip()
+                clean = re.sub(r"\s+\d+\s*$", "", raw_title)  # 去尾部页码
+                # 一级标题
+                m1 = re.match(r"^(\d+)\s+(.*)$", clean)
+                if m1:
+                    toc_lines.append(f"# {m1.group(1)} {m1.group(2)}")
+                else:
+                    toc_lines.append(f"# {clean}")
+                # 收集其子section（用于二级 TOC）
+                for sub in ts.get("content", []):
+                    if sub.get("type") == "section":
+                        stitle = re.sub(r"\s+\d+\s*$", "", sub.get("title", "").strip())
+                        m2 = re.match(r"^(\d+\.\d+)\s+(.*)$", stitle)
+                        if m2:
+                            toc_lines.append(f"## {m2.group(1)} {m2.group(2)}")
+                        else:
+                            m3 = re.match(r"^(\d+\.\d+\.\d+)\s+(.*)$", stitle)
+                            if m3:
+                                toc_lines.append(f"### {m3.group(1)} {m3.group(2)}")
+                            else:
+                                toc_lines.append(f"## {stitle}")
+            if toc_lines:
+                toc_text = "\n".join(toc_lines) + _SECTION_SEPARATOR
+        else:
+            real_sections = top_level_sections
+        if not real_sections:
+            real_sections = top_level_sections
+
+        # 按占位目录章节顺序重排正文章节，使编号与TOC一致
+        if toc_sections and real_sections:
+            def _norm_title(t: str) -> str:
+                t = re.sub(r"\s+\d+\s*$", "", t.strip())  # 去尾部页码
+                t = re.sub(r"^\d+(?:\.\d+)*\s+", "", t)  # 去前缀编号
+                return t.strip()
+
+            # 取有实际内容的 real_sections 作为候选
+            content_candidates = list(real_sections)
+            used_ids = set()
+            ordered_real: List[Dict[str, Any]] = []
+
+            # 对 toc_sections 中的一级编号章节按数字序维持原出现顺序
+            for placeholder in toc_sections:
+                p_norm = _norm_title(placeholder.get("title", ""))
+                match_idx = -1
+                for idx, sec in enumerate(content_candidates):
+                    if idx in used_ids:
+                        continue
+                    if _norm_title(sec.get("title", "")) == p_norm:
+                        match_idx = idx
+                        break
+                if match_idx >= 0:
+                    ordered_real.append(content_candidates[match_idx])
+                    used_ids.add(match_idx)
+            # 追加未匹配的剩余章节（保持原顺序）
+            for idx, sec in enumerate(content_candidates):
+                if idx not in used_ids:
+                    ordered_real.append(sec)
+            real_sections = ordered_real
+        
+        return toc_text, real_sections, None
     
     def _process_top_level_section(self, section: Dict[str, Any], document_name: str, section_index: int) -> str:
         """
         处理顶级章节（一级章节）
-        
+
         Args:
             section: 章节数据
             document_name: 文档名称
             section_index: 章节序号
-            
+
         Returns:
             str: 处理后的章节文本
         """
+        return "".join(self._top_level_fragments(section, document_name, section_index))
+
+    def _top_level_fragments(self, section: Dict[str, Any], document_name: str, section_index: int) -> List[str]:
+        """顶级章节的全部文本片段；出错时记录日志并丢弃整个章节"""
         try:
-            title = section.get("title", "").strip()
-            content = section.get("content", [])
-            
-            if not title:
-                logger.warning(f"章节 {section_index} 没有标题")
-                return ""
-            
-            # 清理标题：移除末尾页码数字，并去除开头重复编号避免与section_index重复
-            import re
-            clean_title = re.sub(r'\s+\d+\s*$', '', title)
-            title_no_prefix = re.sub(r'^\d+(?:\.\d+)*\s+', '', clean_title).strip() or clean_title
-            title_lower = clean_title.lower()
-            
-            # 3.1 删除首页 - 跳过处理
-            if self._should_skip_first_page(section, section_index):
-                logger.info(f"跳过首页章节: {title}")
-                return ""
-            
-            # 3.2 目录页处理
-            if self._is_toc_section(clean_title):
-                toc_md = self._process_toc_section(content)
-                return toc_md if toc_md else ""
-            
-            # 3.3 流程示意图处理
-            if self._is_flow_diagram_section(clean_title):
-                return self._process_flow_diagram_section(title_no_prefix, content, document_name, section_index)
-            
-            # 3.4 流程模板处理
-            if self._is_template_section(clean_title):
-                return self._process_template_section(title_no_prefix, content, document_name, section_index)
-            
-            # 3.5 流程节点功能描述处理 / 3.9 接口处理 / 3.10 其他内容处理
-            return self._process_general_section(title_no_prefix, content, document_name, section_index)
-            
+            return list(self._iter_top_level_section(section, document_name, section_index))
         except Exception as e:
             logger.error(f"处理顶级章节时发生错误: {e}")
-            return ""
+            return []
+
+    def _iter_top_level_section(self, section: Dict[str, Any], document_name: str,
+                                section_index: int) -> Iterator[str]:
+        """按顺序生成顶级章节的文本片段，拼接后即 _process_top_level_section 的结果"""
+        title = section.get("title", "").strip()
+        content = section.get("content", [])
+
+        if not title:
+            logger.warning(f"章节 {section_index} 没有标题")
+            return
+
+        # 清理标题：移除末尾页码数字，并去除开头重复编号避免与section_index重复
+        clean_title = re.sub(r'\s+\d+\s*$', '', title)
+        title_no_prefix = re.sub(r'^\d+(?:\.\d+)*\s+', '', clean_title).strip() or clean_title
+
+        # 3.1 删除首页 - 跳过处理
+        if self._should_skip_first_page(section, section_index):
+            logger.info(f"跳过首页章节: {title}")
+            return
+
+        # 3.2 目录页处理
+        if self._is_toc_section(clean_title):
+            toc_md = self._process_toc_section(content)
+            if toc_md:
+                yield toc_md
+            return
+
+        # 3.3 流程示意图处理 / 3.4 流程模板处理
+        if self._is_flow_diagram_section(clean_title) or self._is_template_section(clean_title):
+            yield from self._iter_titled_content(f"{document_name}-{section_index} {title_no_prefix}：", content)
+            return
+
+        # 3.5 流程节点功能描述处理 / 3.9 接口处理 / 3.10 其他内容处理
+        yield from self._iter_general_section(title_no_prefix, content, document_name, section_index)
     
     def _should_skip_first_page(self, section: Dict[str, Any], section_index: int) -> bool:
         """
@@ -254,9 +496,8 @@ class DocumentProcessor:
             # 检查是否是版本历史表格
             if (first_item.get("type") == "table" and 
                 first_item.get("index", 0) == 1):
-                rows = first_item.get("rows", [])
-                if rows and len(rows) > 0:
-                    first_row = rows[0]
+                first_row = _table_first_row(first_item)
+                if first_row is not None:
                     if (isinstance(first_row, list) and len(first_row) > 0 and
                         isinstance(first_row[0], dict) and 
                         first_row[0].get("content", {}).get("text", "") == "序号"):
@@ -347,100 +588,45 @@ class DocumentProcessor:
         """判断是否是页码"""
         return bool(re.match(r'^\d+$', text.strip()))
     
-    def _process_flow_diagram_section(self, title: str, content: List[Dict[str, Any]], 
-                                    document_name: str, section_index: int) -> str:
+    def _iter_titled_content(self, section_title: str, content: List[Dict[str, Any]]) -> Iterator[str]:
         """
-        处理流程示意图章节（3.3节规则）
+        流程示意图章节（3.3节规则）、流程模板章节（3.4节规则）和不含二级章节的一般章节：
+        标题行之后每个内容项一行
         """
-        try:
-            section_title = f"{document_name}-{section_index} {title}："
-            content_parts = []
-            
-            for part in self._iterate_merged_content(content):
-                if part:
-                    content_parts.append(part.strip())
-            
-            if content_parts:
-                return section_title + "\n" + "\n".join(content_parts)
-            else:
-                return section_title
-                
-        except Exception as e:
-            logger.error(f"处理流程示意图章节时发生错误: {e}")
-            return ""
-    
-    def _process_template_section(self, title: str, content: List[Dict[str, Any]], 
-                                document_name: str, section_index: int) -> str:
-        """
-        处理流程模板章节（3.4节规则）
-        """
-        try:
-            section_title = f"{document_name}-{section_index} {title}："
-            content_parts = []
-            
-            for part in self._iterate_merged_content(content):
-                if part:
-                    content_parts.append(part.strip())
-            
-            if content_parts:
-                return section_title + "\n" + "\n".join(content_parts)
-            else:
-                return section_title
-                
-        except Exception as e:
-            logger.error(f"处理流程模板章节时发生错误: {e}")
-            return ""
-    
-    def _process_general_section(self, title: str, content: List[Dict[str, Any]], 
-                               document_name: str, section_index: int) -> str:
+        yield section_title
+        for lines in self._iterate_merged_content(content):
+            # 表格和图片需要换行分隔，段落内容保持单行形式
+            for line in lines:
+                yield "\n" + line
+
+    def _iter_general_section(self, title: str, content: List[Dict[str, Any]],
+                              document_name: str, section_index: int) -> Iterator[str]:
         """
         处理一般章节（3.5、3.9、3.10节规则）
         包含二级章节的用SECTION标签包裹
         """
-        try:
-            normalized_title = "接口" if self._is_interface_section(title) else title
-            section_title = f"{document_name}-{section_index} {normalized_title}："
-            
-            # 检查是否包含二级章节
-            subsections = [item for item in content if item.get("type") == "section"]
-            
-            if subsections:
-                # 包含二级章节，使用SECTION标签格式
-                section_parts = []
-                
-                flat_subsections = self._flatten_subsections(subsections)
-                for idx, (sub_obj, numbering) in enumerate(flat_subsections, 1):
-                    subsection_block = self._process_subsection(
-                        sub_obj, document_name, section_index, numbering, title
-                    )
-                    if subsection_block:
-                        section_parts.append(subsection_block)
-                
-                if section_parts:
-                    return section_title + "\n" + "\n".join(section_parts)
-                else:
-                    return section_title
-            else:
-                # 没有二级章节，直接处理内容
-                content_parts = []
-                for part in self._iterate_merged_content(content):
-                    if part:
-                        # 表格和图片需要换行分隔，段落内容保持单行形式
-                        content_parts.append(part.strip())
-                
-                if content_parts:
-                    return section_title + "\n" + "\n".join(content_parts)
-                else:
-                    return section_title
-                    
-        except Exception as e:
-            logger.error(f"处理一般章节时发生错误: {e}")
-            return ""
+        normalized_title = "接口" if self._is_interface_section(title) else title
+        section_title = f"{document_name}-{section_index} {normalized_title}："
+
+        # 检查是否包含二级章节
+        subsections = [item for item in content if item.get("type") == "section"]
+
+        if not subsections:
+            # 没有二级章节，直接处理内容
+            yield from self._iter_titled_content(section_title, content)
+            return
+
+        # 包含二级章节，使用SECTION标签格式
+        yield section_title
+        for sub_obj, numbering in self._flatten_subsections(subsections):
+            yield from self._process_subsection(sub_obj, document_name, section_index, numbering, title)
     
-    def _process_subsection(self, subsection: Dict[str, Any], document_name: str, 
-                          section_index: int, subsection_number: str, top_level_title: str) -> str:
+    def _process_subsection(self, subsection: Dict[str, Any], document_name: str,
+                            section_index: int, subsection_number: str, top_level_title: str) -> List[str]:
         """
-        处理二级章节（3.6节规则）
+        处理二级章节（3.6节规则），返回 SECTION 块的各行，每行一个以换行开头的片段
+
+        出错时记录日志并返回空列表
         """
         try:
             subsection_title = subsection.get("title", "").strip()
@@ -457,28 +643,34 @@ class DocumentProcessor:
             # 构建二级/三级章节标题
             full_title = f"{document_name}-{section_index} {top_level_title}-{display_title}："
 
-            # 收集内容行（逐行，不再拼成单行，便于缩进）
-            lines: List[str] = []
-            for part in self._iterate_merged_content(subsection_content):
-                if part:
-                    # _iterate_merged_content 可能返回多行（如表格），直接拆分
-                    part = part.strip()
-                    for ln in part.splitlines():
+            # 构造 SECTION 块（带缩进），内容逐行输出，不再拼成单行
+            block_lines = ["\n<|SECTION|>", f"\n    {full_title}"]
+            for lines in self._iterate_merged_content(subsection_content):
+                for line in lines:
+                    # 单元格文本等片段内部可能含有换行，直接拆分
+                    for ln in line.splitlines():
                         if ln.strip():
-                            lines.append(ln.rstrip())
-
-            # 构造 SECTION 块（带缩进）
-            block_lines = ["<|SECTION|>"]
-            block_lines.append(f"    {full_title}")
-            for ln in lines:
-                block_lines.append("    " + ln)
-            block_lines.append("</|SECTION|>")
-            return "\n".join(block_lines)
+                            block_lines.append("\n    " + ln.rstrip())
+            block_lines.append("\n</|SECTION|>")
+            return block_lines
                 
         except Exception as e:
             logger.error(f"处理二级章节时发生错误: {e}")
-            return ""
+            return []
     
+    def _iter_content_item(self, item: Dict[str, Any]) -> Iterator[str]:
+        """生成内容项的文本片段，拼接后即 _process_content_item 的结果：表格逐行生成，其他内容项只有一个片段"""
+        if isinstance(item, dict) and item.get("type") == "table":
+            lines = self._table_lines(item)
+            for line in lines:
+                yield "\n" + line
+            if lines:
+                yield "\n"
+            return
+        part = self._process_content_item(item)
+        if part:
+            yield part
+
     def _process_content_item(self, item: Dict[str, Any]) -> str:
         """
         处理具体内容项（3.7节规则）
@@ -510,47 +702,71 @@ class DocumentProcessor:
             logger.error(f"处理内容项时发生错误: {e}")
             return ""
     
+    def _iter_table_rows(self, table_item: Dict[str, Any]) -> Iterable[Any]:
+        """表格行；超大表格从旁路文件逐行读取，不整体载入内存"""
+        if table_item.get("sidecar"):
+            return iter_sidecar_rows(self.output_dir, table_item)
+        return iter(table_item.get("rows", []))
+
     def _process_table(self, table_item: Dict[str, Any]) -> str:
         """
         处理表格（3.8节规则）
         """
+        return "\n".join(self._table_lines(table_item))
+
+    def _table_lines(self, table_item: Dict[str, Any]) -> List[str]:
+        """
+        表格文本的各行（3.8节规则），以换行连接即 _process_table 的结果；没有数据行的表格返回空列表
+
+        出错时记录日志并返回空列表
+        """
+        if table_item.get("columnar"):
+            return self._columnar_table_lines(table_item)
         try:
-            rows = table_item.get("rows", [])
-            if not rows:
-                return ""
-            
-            # row_entries: (first_col_value, row_markup)
-            row_entries: List[tuple] = []
+            rows = self._iter_table_rows(table_item)
+            first_row = next(rows, None)
+            if first_row is None:
+                return []
             
             # 获取表头（通常是第一行）
             headers = []
-            if rows:
-                first_row = rows[0]
-                if isinstance(first_row, list):
-                    for cell in first_row:
-                        if isinstance(cell, dict):
-                            # 提取单元格内容
-                            content = cell.get("content", [])
-                            text_parts = []
-                            for item in content:
-                                if isinstance(item, dict) and item.get("type") == "text":
-                                    text_parts.append(item.get("text", "").strip())
-                            text = " ".join(text_parts).strip()
-                            headers.append(text)
-                        else:
-                            headers.append(str(cell).strip())
+            if isinstance(first_row, list):
+                for cell in first_row:
+                    if isinstance(cell, dict):
+                        # 提取单元格内容（嵌套表格以展平文本并入单元格）
+                        headers.append(_cell_text(cell))
+                    else:
+                        headers.append(str(cell).strip())
+            
+            # 基于首列值连续相同分组 -> RSPAN，并应用层级缩进：
+            # <|TABLE|>
+            #     <|RSPAN|>
+            #         <|ROW|>...
+            #     </|RSPAN|>
+            # </|TABLE|>
+            # 数据行逐行处理，只保留当前分组
+            table_lines: List[str] = ["<|TABLE|>"]
+            group: List[str] = []
+            group_val = ""
+            
+            def _group_lines(group):
+                if len(group) > 1:
+                    yield "    <|RSPAN|>"
+                    for gr in group:
+                        yield "        " + gr
+                    yield "    </|RSPAN|>"
+                elif group:
+                    yield "    " + group[0]
             
             # 处理数据行（跳过表头）
-            for i, row in enumerate(rows[1:], 1):
+            for row in rows:
                 if not isinstance(row, list):
                     continue
                 row_data = []
                 first_col_val = ""
                 for j, cell in enumerate(row):
                     if isinstance(cell, dict):
-                        content = cell.get("content", [])
-                        text_parts = [itm.get("text", "").strip() for itm in content if isinstance(itm, dict) and itm.get("type") == "text"]
-                        text = " ".join(t for t in text_parts if t).strip()
+                        text = _cell_text(cell)
                     else:
                         text = str(cell).strip()
                     if j == 0:
@@ -560,40 +776,73 @@ class DocumentProcessor:
                     else:
                         formatted_cell = f"列{j+1}:{text}"
                     row_data.append(formatted_cell)
-                if row_data:
-                    row_markup = f"<|ROW|>|{'|'.join(row_data)}|</|ROW|>"
-                    row_entries.append((first_col_val, row_markup))
+                if not row_data:
+                    continue
+                row_markup = f"<|ROW|>|{'|'.join(row_data)}|</|ROW|>"
+                if group and group_val and first_col_val == group_val:
+                    group.append(row_markup)
+                    continue
+                table_lines.extend(_group_lines(group))
+                group = [row_markup]
+                group_val = first_col_val
+            table_lines.extend(_group_lines(group))
 
-            # 基于首列值连续相同分组 -> RSPAN，并应用层级缩进：
-            # <|TABLE|>
-            #     <|RSPAN|>
-            #         <|ROW|>...
-            #     </|RSPAN|>
-            # </|TABLE|>
+            table_lines.append("</|TABLE|>")
+            return table_lines if len(table_lines) > 2 else []
+                
+        except Exception as e:
+            logger.error(f"处理表格时发生错误: {e}")
+            return []
+    
+    def _columnar_table_lines(self, table_item: Dict[str, Any]) -> List[str]:
+        """
+        列式表示的表格文本的各行（3.8节规则），输出与按行保存的表格相同
+
+        按列批量生成 "表头:文本" 单元格，再按每行单元格数拼接；首列分组由 run_starts 向量化计算
+        """
+        try:
+            columnar = table_item["columnar"]
+            row_lengths = columnar.get("row_lengths", [])
+            if not row_lengths:
+                return []
+            texts = [[t.strip() for t in column] for column in columnar.get("texts", [])]
+            # 非文本内容中的文本和嵌套表格并入单元格，与按行处理相同（见 _cell_text）
+            for key, others in columnar.get("extras", {}).items():
+                r, pos = (int(v) for v in key.split(","))
+                texts[pos][r] = _cell_text({"content": [{"type": "text", "text": texts[pos][r]}] + others})
+            
+            # 表头（第一行）
+            headers = [texts[j][0] for j in range(row_lengths[0])]
+            
+            # 数据行（跳过表头和没有单元格的行）
+            data_rows = [r for r in range(1, len(row_lengths)) if row_lengths[r] > 0]
+            if not data_rows:
+                return []
+            formatted = []
+            for j, column in enumerate(texts):
+                prefix = f"{headers[j]}:" if j < len(headers) and headers[j] else f"列{j+1}:"
+                formatted.append([prefix + column[r] for r in data_rows])
+            row_markups = [
+                f"<|ROW|>|{'|'.join(cells[:row_lengths[r]])}|</|ROW|>"
+                for r, cells in zip(data_rows, zip(*formatted))
+            ]
+            first_col = [texts[0][r] for r in data_rows]
+            
             table_lines: List[str] = ["<|TABLE|>"]
-            idx = 0
-            while idx < len(row_entries):
-                cur_val, cur_row = row_entries[idx]
-                group = [cur_row]
-                j = idx + 1
-                while j < len(row_entries) and row_entries[j][0] == cur_val and cur_val:
-                    group.append(row_entries[j][1])
-                    j += 1
-                if len(group) > 1:
+            starts = run_starts(first_col)
+            for start, end in zip(starts, starts[1:] + [len(row_markups)]):
+                if end - start > 1:
                     table_lines.append("    <|RSPAN|>")
-                    for gr in group:
-                        table_lines.append("        " + gr)
+                    table_lines.extend("        " + gr for gr in row_markups[start:end])
                     table_lines.append("    </|RSPAN|>")
                 else:
-                    table_lines.append("    " + group[0])
-                idx = j
-
+                    table_lines.append("    " + row_markups[start])
             table_lines.append("</|TABLE|>")
-            return "\n".join(table_lines) if len(table_lines) > 2 else ""
-                
+            return table_lines
+        
         except Exception as e:
             logger.error(f"处理表格时发生错误: {e}")
-            return ""
+            return []
     
     def _process_image(self, image_item: Dict[str, Any]) -> str:
         """
@@ -627,6 +876,10 @@ class DocumentProcessor:
                     else:
                         abs_path = os.path.abspath(image_path)
                 image_info = f"![image]({abs_path})"
+            elif isinstance(image_item.get("source"), dict) and image_item["source"].get("member"):
+                # 虚拟图片：引用原始DOCX中的ZIP成员
+                abs_path = os.path.abspath(self.source_path) if self.source_path else ""
+                image_info = f"![image]({abs_path}#{image_item['source']['member']})"
             else:
                 self.image_counter += 1
                 # 生成默认图片的绝对路径
@@ -644,8 +897,12 @@ class DocumentProcessor:
             return ""
 
     # ----------------- 新增辅助方法 -----------------
-    def _iterate_merged_content(self, content: List[Dict[str, Any]]) -> Iterable[str]:
-        """遍历内容并合并连续 paragraph 为单个 PARAGRAPH 标签 (3.7 合并规则)。"""
+    def _iterate_merged_content(self, content: List[Dict[str, Any]]) -> Iterable[Iterable[str]]:
+        """
+        遍历内容并合并连续 paragraph 为单个 PARAGRAPH 标签 (3.7 合并规则)。
+
+        每个内容项生成其文本（去除首尾空白）的各行：表格逐行生成，其他内容项只有一行
+        """
         buffer: List[str] = []
         for item in content:
             if item.get("type") == "paragraph":
@@ -655,12 +912,16 @@ class DocumentProcessor:
                 continue
             # 遇到非 paragraph，先输出累积的段落
             if buffer:
-                yield f"<|PARAGRAPH|>{' '.join(buffer)}</|PARAGRAPH|>"
+                yield [f"<|PARAGRAPH|>{' '.join(buffer)}</|PARAGRAPH|>"]
                 buffer = []
             # 处理当前项目
-            yield self._process_content_item(item)
+            if item.get("type") == "table":
+                yield self._table_lines(item)
+            else:
+                part = self._process_content_item(item).strip()
+                yield [part] if part else []
         if buffer:
-            yield f"<|PARAGRAPH|>{' '.join(buffer)}</|PARAGRAPH|>"
+            yield [f"<|PARAGRAPH|>{' '.join(buffer)}</|PARAGRAPH|>"]
 
     def _flatten_subsections(self, subsections: List[Dict[str, Any]]) -> List[tuple]:
         r"""将多级 subsection 展平为 (subsection_obj, 编号) 列表。
@@ -687,7 +948,7 @@ class DocumentProcessor:
                 return True
             if t in {"list_item", "table", "image"}:
                 # table 需有行; image 直接算内容
-                if t == "table" and item.get("rows"):
+                if t == "table" and _table_has_rows(item):
                     return True
                 if t in {"list_item", "image"}:
                     return True
@@ -706,7 +967,7 @@ class DocumentProcessor:
             (itm.get("type") != "section" and (
                 (itm.get("type") == "paragraph" and itm.get("text", "").strip()) or
                 itm.get("type") in {"list_item", "image"} or
-                (itm.get("type") == "table" and itm.get("rows"))
+                (itm.get("type") == "table" and _table_has_rows(itm))
             ))
             for itm in content
         )
@@ -719,7 +980,9 @@ class DocumentProcessor:
         return False
 
 
-def process_document_to_text(document_structure: Dict[str, Any], document_name: str, output_dir: str = "") -> str:
+def process_document_to_text(document_structure: Dict[str, Any], document_name: str, output_dir: str = "",
+                             boilerplate: Optional[Dict[str, Any]] = None,
+                             boilerplate_dir: Optional[str] = None) -> str:
     """
     将解析得到的文档结构转换为标准化文本格式
     
@@ -727,9 +990,34 @@ def process_document_to_text(document_structure: Dict[str, Any], document_name:
         document_structure: 解析得到的JSON结构
         document_name: 文档名称（不包含扩展名）
         output_dir: 输出目录路径，用于生成绝对路径
+        boilerplate / boilerplate_dir: 模板内容共享副本及其所在目录，见 DocumentProcessor
         
     Returns:
         str: 处理后的标准化文本
     """
-    processor = DocumentProcessor()
+    processor = DocumentProcessor(boilerplate, boilerplate_dir)
     return processor.process_document(document_structure, document_name, output_dir)
+
+
+def render_document_to_stream(document_structure: Dict[str, Any], document_name: str, stream: TextIO,
+                              output_dir: str = "", buffer_chars: int = DEFAULT_STREAM_BUFFER_CHARS,
+                              measure_memory: bool = False, boilerplate: Optional[Dict[str, Any]] = None,
+                              boilerplate_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    将解析得到的文档结构流式转换为标准化文本，写入 stream，输出与 process_document_to_text 相同
+    
+    Args:
+        document_structure: 解析得到的JSON结构
+        document_name: 文档名称（不包含扩展名）
+        stream: 文本流（文件、gzip文本流等）
+        output_dir: 输出目录路径，用于生成绝对路径
+        buffer_chars: 写出前缓冲的字符数
+        measure_memory: 为True时统计渲染期间的峰值内存
+        boilerplate / boilerplate_dir: 模板内容共享副本及其所在目录，见 DocumentProcessor
+        
+    Returns:
+        dict: 写出的字符数、缓冲区峰值等统计，见 DocumentProcessor.render_document
+    """
+    processor = DocumentProcessor(boilerplate, boilerplate_dir)
+    return processor.render_document(document_structure, document_name, stream, output_dir,
+                                     buffer_chars=buffer_chars, measure_memory=measure_memory)
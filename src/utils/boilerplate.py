@@ -0,0 +1,325 @@
+"""
+批次级模板内容（boilerplate）指纹索引
+
+同一批文档通常重复包含相同的封面表格、修订记录表格和法律声明段落。本模块为段落、
+列表项和表格计算规范化内容指纹，统计每个指纹出现在多少个文档中；出现在不少于
+min_documents 个文档中的块视为模板内容:
+- 在 document.json 中为其标记 "boilerplate" 指纹
+- 可选地替换为指向共享副本的引用节点 {"type": "boilerplate_ref", "block_type", "fingerprint"}，
+  共享副本统一保存在批次输出目录的 boilerplate.json 中（可用 resolve_boilerplate_refs 还原；
+  DocumentProcessor 渲染含引用的文档时自动还原，输出与替换前相同）
+
+指纹只依赖规范化后的文本（空白折叠）和单元格图片的文件名（按内容哈希命名），
+与块在文档中的位置和表格序号无关。
+"""
+
+import os
+import re
+import json
+import copy
+import hashlib
+import logging
+
+from src.utils.image_transcoder import iter_image_refs
+
+logger = logging.getLogger(__name__)
+
+BOILERPLATE_BLOCK_TYPES = ("paragraph", "list_item", "table")
+BOILERPLATE_REF_TYPE = "boilerplate_ref"
+BOILERPLATE_SHARED_FILE = "boilerplate.json"
+DEFAULT_MIN_DOCUMENTS = 3
+DEFAULT_MIN_CHARS = 20
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """折叠空白，用于指纹计算"""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+def _cell_key(cell):
+    if not isinstance(cell, dict):
+        return normalize_text(str(cell))
+    parts = []
+    for item in cell.get("content", []):
+        if not isinstance(item, dict):
+            continue
+        if item.get("type") == "text":
+            parts.append(normalize_text(item.get("text", "")))
+        elif item.get("type") == "image":
+            parts.append(f"<img:{os.path.basename(str(item.get('url', '')))}>")
+    return " ".join(p for p in parts if p)
+
+def _iter_table_rows(node):
+    """表格的行结构；列式表格（见 src.utils.table_columnar）逐行还原，指纹与按行保存时相同"""
+    columnar = node.get("columnar")
+    if not columnar:
+        yield from node.get("rows", [])
+        return
+    texts = columnar.get("texts", [])
+    extras = columnar.get("extras", {})
+    for row_idx, length in enumerate(columnar.get("row_lengths", [])):
+        row = []
+        for pos in range(length):
+            text = texts[pos][row_idx]
+            content = [{"type": "text", "text": text}] if text else []
+            content.extend(extras.get(f"{row_idx},{pos}", []))
+            row.append({"content": content})
+        yield row
+
+def block_text(node):
+    """块的规范化文本（表格为各单元格文本），用于指纹和处理量估算"""
+    if node.get("type") == "table":
+        return "\n".join(
+            "\t".join(_cell_key(cell) for cell in row)
+            for row in _iter_table_rows(node) if isinstance(row, list)
+        )
+    return normalize_text(node.get("text", ""))
+
+def fingerprint_block(node, min_chars=DEFAULT_MIN_CHARS):
+    """
+    计算块的内容指纹
+
+    Returns:
+        str | None: 指纹；块类型不支持、内容过短或表格在旁路文件中时返回None
+    """
+    block_type = node.get("type")
+    if block_type not in BOILERPLATE_BLOCK_TYPES or node.get("sidecar"):
+        return None
+    text = block_text(node)
+    if len(text) < min_chars:
+        return None
+    return hashlib.sha1(f"{block_type}\x00{text}".encode("utf-8")).hexdigest()[:20]
+
+def iter_content_blocks(document_structure):
+    """遍历各章节 content 中的块，产出 (所在列表, 下标, 块)"""
+    stack = [section.get("content", []) for section in document_structure.get("sections", [])
+             if isinstance(section, dict)]
+    while stack:
+        content = stack.pop()
+        for idx, item in enumerate(content):
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") == "section":
+                stack.append(item.get("content", []))
+            elif item.get("type") in BOILERPLATE_BLOCK_TYPES:
+                yield content, idx, item
+
+def _node_bytes(node):
+    return len(json.dumps(node, ensure_ascii=False, indent=2).encode("utf-8"))
+
+class BoilerplateIndex:
+    """
+    批次级块指纹索引
+
+    用法:
+        index = BoilerplateIndex(min_documents=3)
+        for doc_id, document_structure in documents:
+            index.add_document(doc_id, document_structure)
+        fingerprints = index.boilerplate()
+        report = index.report()
+    """
+
+    def __init__(self, min_documents=DEFAULT_MIN_DOCUMENTS, min_chars=DEFAULT_MIN_CHARS):
+        self.min_documents = max(2, int(min_documents))
+        self.min_chars = min_chars
+        self.entries = {}  # 指纹 -> {block_type, documents, occurrences, bytes, chars, preview}
+        self.documents = 0
+
+    def add_document(self, doc_id, document_structure):
+        """登记一个文档中的全部块，返回该文档中的块指纹集合"""
+        self.documents += 1
+        fingerprints = set()
+        for _, _, node in iter_content_blocks(document_structure):
+            fp = fingerprint_block(node, self.min_chars)
+            if fp is None:
+                continue
+            entry = self.entries.get(fp)
+            if entry is None:
+                text = block_text(node)
+                entry = self.entries[fp] = {
+                    "block_type": node.get("type"),
+                    "documents": set(),
+                    "occurrences": 0,
+                    "bytes": _node_bytes(node),
+                    "chars": len(text),
+                    "preview": text[:80]
+                }
+            entry["documents"].add(doc_id)
+            entry["occurrences"] += 1
+            fingerprints.add(fp)
+        return fingerprints
+
+    def boilerplate(self):
+        """出现在不少于 min_documents 个文档中的指纹集合"""
+        return {fp for fp, entry in self.entries.items() if len(entry["documents"]) >= self.min_documents}
+
+    def report(self, replaced=False):
+        """
+        模板内容报告：每个指纹的出现次数，以及去重后预计节省的输出字节数和下游处理字符数
+
+        只保留一份副本时，其余 occurrences-1 份块可被引用代替，下游处理也只需处理一次
+        """
+        ref_bytes = _node_bytes({"type": BOILERPLATE_REF_TYPE, "block_type": "paragraph", "fingerprint": "0" * 20})
+        blocks = []
+        for fp in self.boilerplate():
+            entry = self.entries[fp]
+            duplicates = entry["occurrences"] - 1
+            blocks.append({
+                "fingerprint": fp,
+                "block_type": entry["block_type"],
+                "documents": len(entry["documents"]),
+                "occurrences": entry["occurrences"],
+                "bytes_per_copy": entry["bytes"],
+                "estimated_bytes_saved": max(0, duplicates * entry["bytes"] - entry["occurrences"] * ref_bytes),
+                "chars_skippable": duplicates * entry["chars"],
+                "preview": entry["preview"]
+            })
+        blocks.sort(key=lambda b: b["estimated_bytes_saved"], reverse=True)
+        return {
+            "min_documents": self.min_documents,
+            "min_chars": self.min_chars,
+            "documents_indexed": self.documents,
+            "unique_blocks": len(self.entries),
+            "boilerplate_blocks": len(blocks),
+            "boilerplate_occurrences": sum(b["occurrences"] for b in blocks),
+            "replaced": replaced,
+            "estimated_bytes_saved": sum(b["estimated_bytes_saved"] for b in blocks),
+            "chars_skippable": sum(b["chars_skippable"] for b in blocks),
+            "blocks": blocks
+        }
+
+def apply_boilerplate(document_structure, fingerprints, replace=False, min_chars=DEFAULT_MIN_CHARS, shared=None,
+                      shared_dir=None, output_dir=None):
+    """
+    标记（或替换）文档中的模板内容块
+
+    替换时只有能由共享副本原样还原的块才替换为引用；指纹相同但内容不完全相同的块
+    （如空白不同、图片在各自文档的目录中）只标记，保证还原后渲染的文本不变
+
+    Args:
+        fingerprints: 视为模板内容的指纹集合
+        replace: 为True时把块替换为 boilerplate_ref 引用节点
+        shared: 指纹 -> 共享副本，替换时首次遇到的块复制到其中
+        shared_dir / output_dir: 共享副本保存目录（批次输出目录）和文档输出目录，
+            同时提供时共享副本中的图片路径改写为相对 shared_dir
+
+    Returns:
+        int: 标记或替换的块数量
+    """
+    count = 0
+    for content, idx, node in list(iter_content_blocks(document_structure)):
+        fp = fingerprint_block(node, min_chars)
+        if fp is None or fp not in fingerprints:
+            continue
+        count += 1
+        if not replace:
+            node["boilerplate"] = fp
+            continue
+        ref = {"type": BOILERPLATE_REF_TYPE, "block_type": node.get("type"), "fingerprint": fp}
+        if "index" in node:
+            ref["index"] = node["index"]
+        if shared is not None:
+            if fp not in shared:
+                shared_copy = copy.deepcopy(node)
+                if shared_dir is not None and output_dir is not None:
+                    rebase_image_refs(shared_copy, output_dir, shared_dir)
+                shared[fp] = shared_copy
+            if _restore_block(shared[fp], ref, shared_dir, output_dir) != node:
+                node["boilerplate"] = fp
+                continue
+        content[idx] = ref
+    return count
+
+def rebase_image_refs(node, from_dir, to_dir):
+    """把节点中相对 from_dir 的图片路径改写为相对 to_dir"""
+    for image_node, key in iter_image_refs(node):
+        path = image_node[key]
+        if not os.path.isabs(path):
+            image_node[key] = os.path.relpath(os.path.join(from_dir, path), to_dir).replace(os.sep, "/")
+
+def _restore_block(shared_copy, ref, shared_dir=None, output_dir=None):
+    """由共享副本和引用节点还原块（表格序号取自引用节点）"""
+    node = copy.deepcopy(shared_copy)
+    if shared_dir is not None and output_dir is not None:
+        rebase_image_refs(node, shared_dir, output_dir)
+    if "index" in ref:
+        node["index"] = ref["index"]
+    else:
+        node.pop("index", None)
+    return node
+
+def resolve_boilerplate_refs(document_structure, shared, shared_dir=None, output_dir=None):
+    """
+    用共享副本还原文档中的 boilerplate_ref 引用节点（原地修改）
+
+    Args:
+        shared: boilerplate.json 中的 指纹 -> 共享副本
+        shared_dir / output_dir: 共享副本中图片路径相对的目录（批次输出目录）和文档输出目录，
+            同时提供时把图片路径改写为相对文档输出目录
+
+    Returns:
+        int: 还原的数量
+    """
+    count = 0
+    stack = [section.get("content", []) for section in document_structure.get("sections", [])
+             if isinstance(section, dict)]
+    while stack:
+        content = stack.pop()
+        for idx, item in enumerate(content):
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") == "section":
+                stack.append(item.get("content", []))
+            elif item.get("type") == BOILERPLATE_REF_TYPE and item.get("fingerprint") in shared:
+                content[idx] = _restore_block(shared[item["fingerprint"]], item, shared_dir, output_dir)
+                count += 1
+    return count
+
+def has_boilerplate_refs(document_structure):
+    """文档中是否含有 boilerplate_ref 引用节点"""
+    stack = [section.get("content", []) for section in document_structure.get("sections", [])
+             if isinstance(section, dict)]
+    while stack:
+        for item in stack.pop():
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") == BOILERPLATE_REF_TYPE:
+                return True
+            if item.get("type") == "section":
+                stack.append(item.get("content", []))
+    return False
+
+def _copy_section_skeleton(section):
+    """浅复制章节及其 content 列表（子章节递归复制），块本身共享"""
+    if not isinstance(section, dict):
+        return section
+    copied = dict(section)
+    if isinstance(section.get("content"), list):
+        copied["content"] = [
+            _copy_section_skeleton(item) if isinstance(item, dict) and item.get("type") == "section" else item
+            for item in section["content"]
+        ]
+    return copied
+
+def with_resolved_boilerplate(document_structure, shared, shared_dir=None, output_dir=None):
+    """
+    返回还原了 boilerplate_ref 引用的文档结构，不修改传入的文档
+
+    只复制章节骨架，未被替换的块与原文档共享；参数同 resolve_boilerplate_refs
+    """
+    resolved = dict(document_structure)
+    resolved["sections"] = [_copy_section_skeleton(section) for section in document_structure.get("sections", [])]
+    resolve_boilerplate_refs(resolved, shared, shared_dir, output_dir)
+    return resolved
+
+def load_shared_boilerplate(batch_dir):
+    """读取批次输出目录下的 boilerplate.json，不存在或无法读取时返回None"""
+    path = os.path.join(batch_dir, BOILERPLATE_SHARED_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"读取 {path} 失败: {e}")
+        return None
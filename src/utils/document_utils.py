@@ -7,10 +7,20 @@ from docx.oxml.table import CT_Tbl
 from docx.oxml.text.paragraph import CT_P
 from docx.table import Table
 from docx.text.paragraph import Paragraph
+from docx.oxml.ns import qn
 import logging
 
 logger = logging.getLogger(__name__)
 
+_W_TR = qn('w:tr')
+_W_TC = qn('w:tc')
+_W_TR_PR = qn('w:trPr')
+_W_TC_PR = qn('w:tcPr')
+_W_GRID_BEFORE = qn('w:gridBefore')
+_W_GRID_SPAN = qn('w:gridSpan')
+_W_V_MERGE = qn('w:vMerge')
+_W_VAL = qn('w:val')
+
 def iter_block_items(parent):
     """
     按文档顺序生成段落和表格，增强异常处理
@@ -42,10 +52,77 @@ def iter_block_items(parent):
         logger.error(f"遍历文档块失败: {e}")
         return
 
+def _grid_span_of(tc):
+    """w:tcPr/w:gridSpan 的值，默认1"""
+    tcPr = tc.find(_W_TC_PR)
+    if tcPr is None:
+        return 1
+    grid_span = tcPr.find(_W_GRID_SPAN)
+    return 1 if grid_span is None else int(grid_span.get(_W_VAL))
+
+def _v_merge_of(tcPr):
+    """w:tcPr/w:vMerge 的值；元素不存在时返回None，省略val时为 continue"""
+    if tcPr is None:
+        return None
+    v_merge = tcPr.find(_W_V_MERGE)
+    if v_merge is None:
+        return None
+    return v_merge.get(_W_VAL, "continue")
+
+def _grid_before_of(tr):
+    trPr = tr.find(_W_TR_PR)
+    if trPr is None:
+        return 0
+    grid_before = trPr.find(_W_GRID_BEFORE)
+    return 0 if grid_before is None else int(grid_before.get(_W_VAL))
+
+def iter_row_grid_cells(tbl):
+    """
+    单次遍历 w:tbl/w:tr/w:tc，按行生成布局网格单元格，与 python-docx 的 row.cells 一致:
+    - 跨列（gridSpan）的单元格按跨越的列数重复出现
+    - 纵向合并的延续单元格（vMerge="continue"）解析为其所在纵向合并的首个单元格
+    - 只包含实际存在的单元格（不补齐 gridBefore/gridAfter）
+
+    每行只访问一次，纵向合并通过记录上一行各网格偏移处的首个单元格解析，整体为线性复杂度。
+
+    Yields:
+        list: 每行的单元格元素列表（w:tc，延续单元格已替换为首个单元格）
+
+    Raises:
+        ValueError: 延续单元格上方没有对应单元格（与 python-docx 行为一致）
+    """
+    roots_above = None  # 上一行: 网格偏移 -> 首个单元格
+    for tr in tbl.iterchildren(_W_TR):
+        offset = _grid_before_of(tr)
+        roots = {}
+        cells = []
+        for tc in tr.iterchildren(_W_TC):
+            span = _grid_span_of(tc)
+            root = tc
+            if _v_merge_of(tc.find(_W_TC_PR)) == "continue":
+                if roots_above is None:
+                    raise ValueError("no tr above topmost tr in w:tbl")
+                if offset not in roots_above:
+                    raise ValueError(f"no `tc` element at grid_offset={offset}")
+                root = roots_above[offset]
+            roots.setdefault(offset, root)
+            cells.extend([root] * _grid_span_of(root))
+            offset += span
+        roots_above = roots
+        yield cells
+
 def identify_merged_cells(table):
     """
     识别合并的单元格
     返回: 被合并单元格的位置集合{(row_idx, col_idx)}
+
+    直接单次遍历表格XML（见 iter_row_grid_cells），不使用 python-docx 的 row.cells，
+    结果与逐行读取 row.cells 的实现一致，包括其两个特性:
+    - 只标记跨列: 纵向合并的延续单元格已解析为首个单元格，下方不再是 vMerge="continue"，
+      因此跨行数始终为1
+    - 按位置标记: 跨列单元格在 row.cells 中重复出现，每次出现都会标记其后 gridSpan-1 个位置。
+      例如4列表格第0行 (0,1)-(0,2) 合并时，(0,2) 和 (0,3) 都被标记，真实单元格 (0,3) 不输出
+    单元格缺少 w:tcPr 或延续单元格上方没有对应单元格（畸形表格）时停止识别，返回已标记的位置。
     """
     merged_cells = set()
     try:
@@ -76,43 +153,17 @@ def identify_merged_cells(table):
         if not cols:
             return merged_cells
         
-        # 创建单元格网格
-        rows = table.rows
-        if not rows:
-            return merged_cells
-        
-        # 标记所有被合并的单元格
-        for row_idx, row in enumerate(rows):
-            for cell_idx, cell in enumerate(row.cells):
-                tc = cell._tc
-                tcPr = tc.tcPr
-                
-                # 检测跨列
-                grid_span = 1
-                if tcPr.gridSpan is not None:
-                    grid_span = int(tcPr.gridSpan.val)
-                
-                # 检测跨行
-                row_span = 1
-                v_merge = tcPr.vMerge
-                if v_merge is not None and v_merge.val == "restart":
-                    # 计算实际行跨度
-                    for i in range(row_idx + 1, len(table.rows)):
-                        if cell_idx >= len(table.rows[i].cells):
-                            break
-                        next_cell = table.rows[i].cells[cell_idx]
-                        next_tcPr = next_cell._tc.tcPr
-                        if next_tcPr.vMerge is None or next_tcPr.vMerge.val != "continue":
-                            break
-                        row_span += 1
-                
-                # 标记被合并的单元格
-                if grid_span > 1 or row_span > 1:
-                    for r in range(row_idx, row_idx + row_span):
-                        for c in range(cell_idx, cell_idx + grid_span):
-                            if r != row_idx or c != cell_idx:
-                                merged_cells.add((r, c))
-                                
+        for row_idx, row_cells in enumerate(iter_row_grid_cells(table._tbl)):
+            for cell_idx, tc in enumerate(row_cells):
+                if tc.find(_W_TC_PR) is None:
+                    # 原实现读取 tcPr.gridSpan 时在此处中止，保留已识别的结果
+                    logger.warning(f"表格第{row_idx}行第{cell_idx}个单元格缺少 w:tcPr，停止识别合并单元格")
+                    return merged_cells
+
+                # 按位置标记跨列覆盖的单元格（纵向合并的跨行数始终为1，见函数说明）
+                for c in range(cell_idx + 1, cell_idx + _grid_span_of(tc)):
+                    merged_cells.add((row_idx, c))
+
     except Exception as e:
         logger.error(f"识别合并单元格失败: {e}")
     
@@ -0,0 +1,261 @@
+"""
+批次级感知哈希近似重复图片合并
+
+内容哈希命名只能合并字节完全相同的图片。同一个公司Logo在不同模板中以不同压缩率保存时，
+会产生大量内容几乎相同的文件。本模块:
+- 用NumPy对整批图片向量化计算感知哈希（dHash / pHash，64位）
+- 用多索引哈希（把64位哈希切成 threshold+1 段，汉明距离不超过阈值的两张图片至少有一段完全相同）
+  查找候选，只在同一分段桶内比较，不做全量两两比较
+- 以出现最多的哈希为规范哈希做领头者聚类，只合并与规范哈希足够接近的图片，近似关系不沿链传递
+
+NumPy为可选依赖，未安装时调用方应跳过此阶段。
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HASH_METHODS = ("dhash", "phash")
+DEFAULT_HAMMING_THRESHOLD = 4
+
+# 小于该尺寸的图片感知哈希不可靠，不参与合并
+MIN_HASH_DIMENSION = 16
+
+# 宽高比量化步长（对数空间，约10%），宽高比相差超过一个步长的图片不合并
+_ASPECT_STEP = 0.1
+
+# 单个分段桶的条目数上限，超过时该桶不用于查找候选（纯色、空白图片的分段值大量相同）
+_MAX_BUCKET_SIZE = 4096
+
+# 每批读取并哈希的图片数量，限制像素矩阵的内存占用
+_HASH_BATCH_SIZE = 4096
+
+def numpy_available():
+    return np is not None
+
+def _load_gray(path, size):
+    """读取图片并缩小为灰度矩阵，返回 (像素, 宽, 高)；无法读取时返回None"""
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            if min(width, height) < MIN_HASH_DIMENSION:
+                return None
+            if img.format == "JPEG":
+                img.draft("L", (size[0] * 4, size[1] * 4))
+            gray = img.convert("L").resize(size, Image.BILINEAR)
+            return np.asarray(gray, dtype=np.float32), width, height
+    except Exception as e:
+        logger.debug(f"读取图片 {path} 失败: {e}")
+        return None
+
+def _bits_to_uint64(bits):
+    """(N, 64) 布尔矩阵 -> (N,) uint64"""
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return packed.view('>u8').reshape(-1).astype(np.uint64)
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+def _dhash(pixels):
+    """pixels: (N, 8, 9) -> 水平梯度哈希"""
+    return _bits_to_uint64((pixels[:, :, 1:] > pixels[:, :, :-1]).reshape(len(pixels), 64))
+
+def _phash(pixels):
+    """pixels: (N, 32, 32) -> DCT低频系数与中位数比较的哈希"""
+    dct = _dct_matrix(pixels.shape[1])
+    coeffs = dct @ pixels @ dct.T
+    low = coeffs[:, :8, :8].reshape(len(pixels), 64)
+    median = np.median(low[:, 1:], axis=1)
+    return _bits_to_uint64(low > median[:, None])
+
+def compute_perceptual_hashes(paths, method="dhash", max_workers=None):
+    """
+    批量计算感知哈希
+
+    Returns:
+        tuple: (hashes: uint64数组, widths, heights, valid: 布尔数组)，长度均与 paths 相同
+    """
+    if np is None:
+        raise ImportError("感知哈希需要NumPy")
+    if method not in HASH_METHODS:
+        raise ValueError(f"不支持的感知哈希方法: {method}")
+    size = (9, 8) if method == "dhash" else (32, 32)
+    hash_func = _dhash if method == "dhash" else _phash
+
+    count = len(paths)
+    hashes = np.zeros(count, dtype=np.uint64)
+    widths = np.zeros(count, dtype=np.int64)
+    heights = np.zeros(count, dtype=np.int64)
+    valid = np.zeros(count, dtype=bool)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers and max_workers > 1 else None
+    try:
+        for batch_start in range(0, count, _HASH_BATCH_SIZE):
+            batch_paths = paths[batch_start:batch_start + _HASH_BATCH_SIZE]
+            if executor is not None:
+                loaded = list(executor.map(lambda p: _load_gray(p, size), batch_paths))
+            else:
+                loaded = [_load_gray(p, size) for p in batch_paths]
+            positions = [batch_start + i for i, item in enumerate(loaded) if item is not None]
+            if not positions:
+                continue
+            items = [item for item in loaded if item is not None]
+            hashes[positions] = hash_func(np.stack([item[0] for item in items]))
+            widths[positions] = [item[1] for item in items]
+            heights[positions] = [item[2] for item in items]
+            valid[positions] = True
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return hashes, widths, heights, valid
+
+_POPCOUNT8 = None
+
+def _popcount64(values):
+    if hasattr(np, "bitwise_count"):
+        # NumPy 2.0+ 提供硬件popcount
+        return np.bitwise_count(values)
+    global _POPCOUNT8
+    if _POPCOUNT8 is None:
+        _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.int32)
+
+def _chunk_bounds(threshold):
+    """把64位切成 threshold+1 段，返回 [(起始位, 位数)]"""
+    chunks = min(threshold + 1, 64)
+    base, extra = divmod(64, chunks)
+    bounds, start = [], 0
+    for idx in range(chunks):
+        width = base + (1 if idx < extra else 0)
+        bounds.append((start, width))
+        start += width
+    return bounds
+
+def _segment_buckets(unique_hashes, threshold):
+    """
+    为每个分段建立 分段值 -> 唯一键下标 的桶
+
+    只有一个条目的桶不需要；条目超过 _MAX_BUCKET_SIZE 的退化桶（如大量纯色图片）跳过，
+    其中的近似重复仍可能通过其他分段找到
+    """
+    buckets = []
+    for start, width in _chunk_bounds(threshold):
+        shift, mask = np.uint64(start), np.uint64((1 << width) - 1)
+        segment = (unique_hashes >> shift) & mask
+        order = np.argsort(segment, kind="stable")
+        boundaries = np.flatnonzero(np.diff(segment[order])) + 1
+        segment_buckets = {}
+        for group in np.split(order, boundaries):
+            if len(group) < 2:
+                continue
+            if len(group) > _MAX_BUCKET_SIZE:
+                logger.debug(f"跳过退化的分段桶: 第{start}位起 {len(group)} 个哈希")
+                continue
+            segment_buckets[int(segment[group[0]])] = group
+        buckets.append((shift, mask, segment_buckets))
+    return buckets
+
+def cluster_hashes(hashes, aspects, threshold=DEFAULT_HAMMING_THRESHOLD):
+    """
+    按汉明距离聚类感知哈希（领头者聚类）
+
+    按出现次数从多到少依次取尚未归簇的哈希作为簇的规范哈希，只有与规范哈希的距离不超过阈值、
+    宽高比相差不超过1的哈希才加入该簇。成员只与规范哈希比较，近似关系不会沿链传递
+    （簇内任意两个成员的距离不超过 2 * threshold）。
+
+    Args:
+        hashes: uint64数组
+        aspects: 量化后的宽高比（整数数组）
+        threshold: 汉明距离阈值
+
+    Returns:
+        np.ndarray: 每个元素所在簇的代表下标
+    """
+    count = len(hashes)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # 哈希和宽高比都相同的条目先合并，只在不同的键之间查找近似重复
+    keys = np.stack([hashes.astype(np.uint64), aspects.astype(np.int64).view(np.uint64)], axis=1)
+    unique_keys, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    unique_hashes = unique_keys[:, 0]
+    unique_aspects = unique_keys[:, 1].view(np.int64)
+    buckets = _segment_buckets(unique_hashes, threshold)
+
+    # 出现次数多的哈希优先作为规范哈希，次数相同时按首次出现的顺序
+    first_seen = np.full(len(unique_keys), count, dtype=np.int64)
+    np.minimum.at(first_seen, inverse, np.arange(count))
+    leaders = np.lexsort((first_seen, -counts))
+
+    assigned = np.full(len(unique_keys), -1, dtype=np.int64)
+    for leader in leaders.tolist():
+        if assigned[leader] >= 0:
+            continue
+        assigned[leader] = leader
+        leader_hash = unique_hashes[leader]
+        groups = [segment_buckets.get(int((leader_hash >> shift) & mask))
+                  for shift, mask, segment_buckets in buckets]
+        groups = [group for group in groups if group is not None]
+        if not groups:
+            continue
+        candidates = np.unique(np.concatenate(groups))
+        candidates = candidates[assigned[candidates] < 0]
+        if len(candidates) == 0:
+            continue
+        close = ((_popcount64(unique_hashes[candidates] ^ leader_hash) <= threshold)
+                 & (np.abs(unique_aspects[candidates] - unique_aspects[leader]) <= 1))
+        assigned[candidates[close]] = leader
+
+    # 映射回原始下标：每个簇的代表取簇内第一个原始元素
+    labels = assigned[inverse]
+    first_index = {}
+    result = np.empty(count, dtype=np.int64)
+    for idx, label in enumerate(labels.tolist()):
+        result[idx] = first_index.setdefault(label, idx)
+    return result
+
+def find_near_duplicates(paths, threshold=DEFAULT_HAMMING_THRESHOLD, method="dhash", max_workers=None):
+    """
+    查找近似重复的图片
+
+    Returns:
+        dict: 重复图片路径 -> 规范图片路径（簇内像素最多、其次文件最大的图片），不包含规范图片自身
+    """
+    if not paths:
+        return {}
+    hashes, widths, heights, valid = compute_perceptual_hashes(paths, method, max_workers)
+    indices = np.flatnonzero(valid)
+    if len(indices) < 2:
+        return {}
+    aspects = np.round(np.log(widths[indices] / heights[indices]) / _ASPECT_STEP).astype(np.int64)
+    labels = cluster_hashes(hashes[indices], aspects, threshold)
+
+    clusters = {}
+    for local_idx, label in enumerate(labels.tolist()):
+        clusters.setdefault(label, []).append(int(indices[local_idx]))
+
+    mapping = {}
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        canonical = max(members, key=lambda i: (
+            int(widths[i]) * int(heights[i]), os.path.getsize(paths[i]), -i
+        ))
+        for i in members:
+            if i != canonical:
+                mapping[paths[i]] = paths[canonical]
+    return mapping
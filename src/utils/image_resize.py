@@ -0,0 +1,162 @@
+"""
+图片尺寸上限与降采样
+
+下游只需要屏幕分辨率的图片时，可以在提取阶段把超出上限的图片缩小:
+- max_dimension: 最长边的像素上限
+- max_bytes: 文件大小上限，超出时继续按比例缩小
+- target_format: 输出格式（如 "jpg"、"png"、"webp"），None表示保持原格式
+JPEG使用 draft 在解码时直接按1/2、1/4、1/8缩小，其他格式先用 reduce 做整数倍缩小，
+最后再用高质量滤波缩放到目标尺寸。
+"""
+
+import os
+import math
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 可以降采样的栅格格式（扩展名）
+RESIZABLE_FORMATS = ("png", "jpg", "jpeg", "gif", "bmp", "tiff", "webp")
+
+# 输出格式 -> PIL保存参数
+_SAVE_OPTIONS = {
+    "jpg": ("JPEG", {"quality": 85, "optimize": True}),
+    "png": ("PNG", {"optimize": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "gif": ("GIF", {}),
+    "bmp": ("BMP", {}),
+    "tiff": ("TIFF", {"compression": "tiff_deflate"}),
+}
+
+# 超出字节上限时最多重新缩小的次数
+MAX_SHRINK_ATTEMPTS = 4
+
+class ImageLimits:
+    """
+    单次运行的图片尺寸上限配置
+
+    用法:
+        limits = ImageLimits(max_dimension=1920, max_bytes=500 * 1024, target_format="jpg")
+        parse_docx(docx_path, output_dir, image_limits=limits)
+    """
+
+    def __init__(self, max_dimension=None, max_bytes=None, target_format=None):
+        if target_format is not None:
+            target_format = target_format.lower().lstrip('.')
+            if target_format == "jpeg":
+                target_format = "jpg"
+            if target_format not in _SAVE_OPTIONS:
+                raise ValueError(f"不支持的目标格式: {target_format}")
+        self.max_dimension = max_dimension
+        self.max_bytes = max_bytes
+        self.target_format = target_format
+
+    @property
+    def active(self):
+        return bool(self.max_dimension or self.max_bytes or self.target_format)
+
+    def output_format(self, img_format):
+        return self.target_format or ("jpg" if img_format == "jpeg" else img_format)
+
+    def needs_processing(self, img_format, width, height, size_bytes):
+        """判断图片是否超出上限或需要转换格式"""
+        if img_format not in RESIZABLE_FORMATS:
+            return False
+        if self.target_format and self.output_format(img_format) != img_format:
+            return True
+        if self.max_dimension and max(width, height) > self.max_dimension:
+            return True
+        if self.max_bytes and size_bytes > self.max_bytes:
+            return True
+        return False
+
+def _fit_size(width, height, max_dimension):
+    """按最长边上限计算目标尺寸，保持宽高比"""
+    if not max_dimension or max(width, height) <= max_dimension:
+        return width, height
+    scale = max_dimension / float(max(width, height))
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+def _load_scaled(image_path, target_size):
+    """打开图片并利用 draft/reduce 快速缩小到接近目标尺寸（reduce 生成新图片时关闭原图片）"""
+    img = Image.open(image_path)
+    try:
+        if img.format == "JPEG":
+            # 解码时直接按DCT缩放，不需要解码完整分辨率
+            img.draft("RGB", target_size)
+        img.load()
+        factor = min(img.width // target_size[0], img.height // target_size[1])
+        # reduce 不支持调色板和二值图像，这两种模式直接由 resize 缩放
+        if factor < 2 or img.mode in ("P", "1"):
+            return img
+        reduced = img.reduce(factor)
+    except Exception:
+        img.close()
+        raise
+    img.close()
+    return reduced
+
+def _convert_for_format(img, out_format):
+    """转换为目标格式支持的颜色模式"""
+    if out_format == "jpg":
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            rgba = img.convert("RGBA")
+            background.paste(rgba, mask=rgba.split()[-1])
+            return background
+        if img.mode not in ("RGB", "L"):
+            return img.convert("RGB")
+    elif out_format == "webp" and img.mode not in ("RGB", "RGBA"):
+        return img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+    return img
+
+def limit_image_file(image_path, img_format, limits, dest_path):
+    """
+    将图片缩小到上限以内并保存到 dest_path（可以与 image_path 相同）
+
+    Args:
+        image_path: 原始图片文件
+        img_format: 原始图片格式（扩展名）
+        limits: ImageLimits
+        dest_path: 输出文件路径，扩展名应与 limits.output_format(img_format) 一致
+
+    Returns:
+        dict | None: {"width", "height", "size_bytes", "original_width", "original_height"}；
+            无法处理（如动图、无法解码）时返回None，原始文件保持不变
+    """
+    out_format = limits.output_format(img_format)
+    pil_format, save_options = _SAVE_OPTIONS[out_format]
+    with Image.open(image_path) as probe:
+        original_width, original_height = probe.size
+        if getattr(probe, "n_frames", 1) > 1:
+            logger.debug(f"跳过多帧图片的降采样: {os.path.basename(image_path)}")
+            return None
+
+    target = _fit_size(original_width, original_height, limits.max_dimension)
+    tmp_path = f"{dest_path}.tmp"
+    try:
+        for _ in range(MAX_SHRINK_ATTEMPTS):
+            with _load_scaled(image_path, target) as img:
+                if img.size != target:
+                    img = img.resize(target, Image.LANCZOS)
+                img = _convert_for_format(img, out_format)
+                img.save(tmp_path, pil_format, **save_options)
+            size_bytes = os.path.getsize(tmp_path)
+            if not limits.max_bytes or size_bytes <= limits.max_bytes or min(target) <= 16:
+                break
+            # 文件大小与像素数近似成正比，按比例继续缩小
+            scale = math.sqrt(limits.max_bytes / float(size_bytes)) * 0.9
+            target = (max(1, int(target[0] * scale)), max(1, int(target[1] * scale)))
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        "width": target[0],
+        "height": target[1],
+        "size_bytes": os.path.getsize(dest_path),
+        "original_width": original_width,
+        "original_height": original_height
+    }
@@ -0,0 +1,227 @@
+"""
+提取后图片的并行转码（WebP/AVIF）
+
+BMP/TIFF/PNG截图通常占输出体积的大部分。转码阶段在文档解析完成、输出保存之前运行:
+- 在进程池中把文档引用到的图片转为WebP（Pillow支持时可选AVIF）
+- 转码结果不比原文件小时保留原文件
+- 同步更新文档结构中所有引用该文件的节点（url/format/size 以及嵌入对象的 preview_image），
+  包括超大表格旁路文件中的单元格图片
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, features
+from src.utils.table_sidecar import iter_sidecar_tables, iter_sidecar_rows, rewrite_sidecar_rows
+
+logger = logging.getLogger(__name__)
+
+# 默认参与转码的图片格式（扩展名）
+DEFAULT_SOURCE_FORMATS = ("png", "bmp", "tiff", "tif")
+
+_PIL_FORMATS = {"webp": "WEBP", "avif": "AVIF"}
+
+def avif_available():
+    """当前Pillow是否支持写出AVIF"""
+    try:
+        if features.check("avif"):
+            return True
+    except Exception:
+        pass
+    try:
+        import pillow_avif  # noqa: F401  注册AVIF插件
+        return True
+    except ImportError:
+        return False
+
+def transcode_image_file(src_path, dest_path, target_format, quality, lossless=False, skip_if_larger=True):
+    """
+    将单个图片文件转码（在工作进程中执行）
+
+    Returns:
+        tuple: (是否采用转码结果, 原始字节数, 转码后字节数)
+    """
+    original_size = os.path.getsize(src_path)
+    tmp_path = f"{dest_path}.tmp"
+    try:
+        with Image.open(src_path) as img:
+            if getattr(img, "n_frames", 1) > 1:
+                return False, original_size, original_size
+            if img.mode not in ("RGB", "RGBA"):
+                has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+                img = img.convert("RGBA" if has_alpha else "RGB")
+            img.save(tmp_path, _PIL_FORMATS[target_format], quality=quality, lossless=lossless)
+        new_size = os.path.getsize(tmp_path)
+        if skip_if_larger and new_size >= original_size:
+            return False, original_size, original_size
+        os.replace(tmp_path, dest_path)
+        if dest_path != src_path:
+            os.remove(src_path)
+        return True, original_size, new_size
+    except Exception as e:
+        logger.debug(f"转码 {os.path.basename(src_path)} 失败: {e}")
+        return False, original_size, original_size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def iter_image_refs(node):
+    """遍历文档结构中引用图片文件的节点，产出 (节点, 路径字段名)"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if current.get("type") == "image" and isinstance(current.get("url"), str):
+                yield current, "url"
+            if isinstance(current.get("preview_image"), str):
+                yield current, "preview_image"
+            stack.extend(v for v in current.values() if isinstance(v, (dict, list)))
+        elif isinstance(current, list):
+            stack.extend(v for v in current if isinstance(v, (dict, list)))
+
+class ImageTranscoder:
+    """
+    文档图片转码器（整个批次共享一个进程池）
+
+    用法:
+        transcoder = ImageTranscoder("webp", quality=80)
+        transcoder.transcode_document(document_structure, output_dir)
+        ...
+        transcoder.shutdown()
+        print(transcoder.stats)
+    """
+
+    def __init__(self, target_format="webp", quality=80, lossless=False, skip_if_larger=True,
+                 source_formats=DEFAULT_SOURCE_FORMATS, max_workers=None):
+        target_format = target_format.lower()
+        if target_format not in _PIL_FORMATS:
+            raise ValueError(f"不支持的转码格式: {target_format}")
+        if target_format == "avif" and not avif_available():
+            logger.warning("当前环境不支持AVIF，改为转码为WebP")
+            target_format = "webp"
+        self.target_format = target_format
+        self.quality = quality
+        self.lossless = lossless
+        self.skip_if_larger = skip_if_larger
+        self.source_formats = tuple(f.lower() for f in source_formats)
+        self.max_workers = max_workers
+        self._executor = None
+        self.stats = {
+            "format": target_format,
+            "files_considered": 0,
+            "files_transcoded": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+            "bytes_saved": 0,
+            "seconds": 0.0
+        }
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def throughput(self):
+        """转码吞吐量: (文件数/秒, MB/秒)，按原始字节数计算"""
+        seconds = self.stats["seconds"]
+        if seconds <= 0:
+            return 0.0, 0.0
+        return self.stats["files_considered"] / seconds, self.stats["bytes_before"] / 1024 / 1024 / seconds
+
+    def summary(self):
+        """批次汇总信息"""
+        files_per_sec, mb_per_sec = self.throughput()
+        summary = dict(self.stats)
+        summary["seconds"] = round(summary["seconds"], 3)
+        summary["files_per_second"] = round(files_per_sec, 2)
+        summary["mb_per_second"] = round(mb_per_sec, 2)
+        return summary
+
+    def transcode_document(self, document_structure, output_dir):
+        """
+        转码文档引用到的图片，并更新文档结构中的引用
+
+        Returns:
+            int: 转码成功的文件数量
+        """
+        refs = {}
+
+        def _collect(node, key, keep_node):
+            path = node[key]
+            ext = os.path.splitext(path)[1].lower().lstrip('.')
+            if ext in self.source_formats and not os.path.isabs(path):
+                refs.setdefault(path, [])
+                if keep_node:
+                    refs[path].append((node, key))
+
+        for node, key in iter_image_refs(document_structure):
+            _collect(node, key, True)
+        # 旁路文件中的行逐行扫描，不保留节点
+        sidecar_tables = list(iter_sidecar_tables(document_structure))
+        for table_node in sidecar_tables:
+            for row in iter_sidecar_rows(output_dir, table_node):
+                for node, key in iter_image_refs(row):
+                    _collect(node, key, False)
+        if not refs:
+            return 0
+
+        start = time.time()
+        executor = self._get_executor()
+        futures = {}
+        for rel_path in refs:
+            src_path = os.path.join(output_dir, rel_path)
+            if not os.path.exists(src_path):
+                continue
+            dest_rel = f"{os.path.splitext(rel_path)[0]}.{self.target_format}"
+            futures[rel_path] = (dest_rel, executor.submit(
+                transcode_image_file, src_path, os.path.join(output_dir, dest_rel),
+                self.target_format, self.quality, self.lossless, self.skip_if_larger
+            ))
+
+        replaced = {}
+        for rel_path, (dest_rel, future) in futures.items():
+            try:
+                ok, before, after = future.result()
+            except Exception as e:
+                logger.warning(f"转码 {rel_path} 失败: {e}")
+                continue
+            self.stats["files_considered"] += 1
+            self.stats["bytes_before"] += before
+            self.stats["bytes_after"] += after
+            if ok:
+                replaced[rel_path] = (dest_rel, after)
+
+        def _update(node, key):
+            dest_rel, after = replaced[node[key]]
+            node[key] = dest_rel
+            if key == "url":
+                node["format"] = self.target_format
+                node["size"] = f"{after/1024:.2f} KB"
+
+        for rel_path in replaced:
+            for node, key in refs[rel_path]:
+                _update(node, key)
+
+        def _update_row(row_idx, row):
+            for node, key in iter_image_refs(row):
+                if node[key] in replaced:
+                    _update(node, key)
+            return row
+
+        if replaced:
+            for table_node in sidecar_tables:
+                rewrite_sidecar_rows(output_dir, table_node, _update_row)
+        transcoded = len(replaced)
+
+        self.stats["files_transcoded"] += transcoded
+        self.stats["bytes_saved"] = self.stats["bytes_before"] - self.stats["bytes_after"]
+        self.stats["seconds"] += time.time() - start
+        if transcoded:
+            logger.info(f"转码图片 {transcoded}/{len(futures)} 个为 {self.target_format}")
+        return transcoded
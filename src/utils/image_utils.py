@@ -5,19 +5,129 @@
 import os
 import io
 import uuid
-import signal
 import subprocess
 import platform
 import shutil
 import logging
 from PIL import Image
+from PIL import __version__ as PIL_VERSION
+from src.utils.metafile_pool import run_conversion_with_timeout
+from src.utils.metafile_cache import STATUS_OK, STATUS_FAILED
+from src.utils.metafile_scanner import extract_single_bitmap, get_metafile_dimensions
+
+# 转换器版本，作为持久化转换缓存键的一部分；转换逻辑变化时需要更新
+METAFILE_CONVERTER_VERSION = f"1/pil-{PIL_VERSION}/{platform.system().lower()}"
+
+# 从文件读取图元文件尺寸时读取的文件头长度
+METAFILE_HEADER_PROBE_BYTES = 64 * 1024
 
 logger = logging.getLogger(__name__)
 
-def convert_emf_to_png(emf_data, output_dir, object_id, quick_mode=True):
+def convert_metafile_file(src_path, png_path):
+    """
+    将EMF/WMF文件转换为PNG文件（在转换工作进程中执行，不做超时控制）
+
+    依次尝试 PIL 和系统工具（仅macOS的sips）
+
+    Returns:
+        bool: 是否成功生成PNG文件
+    """
+    png_filename = os.path.basename(png_path)
+    
+    # 方法1: 使用 PIL 读取基本信息并尝试转换
+    try:
+        with Image.open(src_path) as img:
+            logger.info(f"PIL检测到图像: 模式={img.mode}, 尺寸={img.size}, 格式={img.format}")
+            
+            # 验证图像
+            img.verify()
+            # 重新打开进行转换
+            with Image.open(src_path) as img_convert:
+                if img_convert.mode in ('RGBA', 'LA', 'P'):
+                    img_convert = img_convert.convert('RGB')
+                img_convert.save(png_path, 'PNG')
+                if os.path.exists(png_path) and os.path.getsize(png_path) > 0:
+                    logger.info(f"PIL转换成功: {png_filename}")
+                    return True
+    except Exception as e:
+        logger.debug(f"PIL 转换失败: {e}")
+    
+    # 方法2: 使用系统工具转换（仅限macOS，限时5秒）
+    if platform.system() == "Darwin":
+        try:
+            logger.debug(f"尝试sips转换: {src_path}")
+            result = subprocess.run([
+                'sips', '-s', 'format', 'png', src_path, '--out', png_path
+            ], capture_output=True, text=True, timeout=5)
+            
+            if result.returncode == 0 and os.path.exists(png_path) and os.path.getsize(png_path) > 0:
+                logger.info(f"sips转换成功: {png_filename}")
+                return True
+            else:
+                logger.debug(f"sips转换失败: return code {result.returncode}")
+                
+        except subprocess.TimeoutExpired:
+            logger.debug("sips命令超时")
+        except FileNotFoundError:
+            logger.debug("sips命令不可用")
+        except Exception as e:
+            logger.debug(f"sips转换异常: {e}")
+    
+    return False
+
+def save_metafile_bitmap_as_png(emf_data, png_path):
+    """
+    如果EMF/WMF只是单张位图的包装，直接取出位图并保存为PNG（不做栅格化）
+
+    Returns:
+        bool: 是否已生成PNG；包含矢量内容时返回False，由调用方走常规转换流程
+    """
+    try:
+        extracted = extract_single_bitmap(emf_data)
+        if not extracted:
+            return False
+        img_format, image_data, info = extracted
+        if img_format == "png":
+            with open(png_path, "wb") as f:
+                f.write(image_data)
+        else:
+            with Image.open(io.BytesIO(image_data)) as img:
+                if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P', '1'):
+                    img = img.convert('RGB')
+                img.save(png_path, 'PNG')
+        logger.info(f"图元文件仅包含单张位图，已直接提取为PNG: {os.path.basename(png_path)} "
+                    f"({info['format']}, {info.get('width', 0)}x{info.get('height', 0)})")
+        return os.path.exists(png_path) and os.path.getsize(png_path) > 0
+    except Exception as e:
+        logger.debug(f"提取图元文件内嵌位图失败: {e}")
+        try:
+            if os.path.exists(png_path):
+                os.remove(png_path)
+        except OSError:
+            pass
+        return False
+
+def _record_conversion(metafile_cache, full_hash, png_path, ok):
+    """
+    将转换结果（成功的PNG或失败条目）写入持久化缓存
+    ok 为 None 表示超时，可能只是负载过高，不写入失败条目，下次仍会重试
+    """
+    if metafile_cache is None or ok is None:
+        return
+    if ok:
+        metafile_cache.put(full_hash, METAFILE_CONVERTER_VERSION, png_path)
+    else:
+        metafile_cache.put_failure(full_hash, METAFILE_CONVERTER_VERSION)
+
+def convert_emf_to_png(emf_data, output_dir, object_id, quick_mode=True, conversion_pool=None, on_converted=None,
+                       metafile_cache=None):
     """
     自动将EMF格式转换为PNG格式，增强错误处理和健壮性
     quick_mode: 快速模式，跳过耗时的转换尝试，直接保存原格式
+    conversion_pool: 可选的 MetafileConversionPool；提供时先保存原始EMF并立即返回其路径，
+        转换在进程池中异步完成，成功后以PNG相对路径调用 on_converted
+    metafile_cache: 可选的 MetafileCache；在任何转换工作之前查询，命中PNG时直接复用（快速模式同样适用），
+        命中失败条目时跳过转换；新的转换结果会写回缓存
     """
     temp_emf_path = None
     try:
@@ -34,35 +144,66 @@ def convert_emf_to_png(emf_data, output_dir, object_id, quick_mode=True):
             logger.error(f"创建images目录失败: {e}")
             return None
         
+        # 基于内容生成哈希命名，避免重复文件
+        import hashlib
+        full_hash = hashlib.sha256(emf_data).hexdigest()
+        content_hash = full_hash[:16]
+        
+        # 输出PNG路径
+        png_filename = f"embedded_preview_embedded_obj_{content_hash}.png"
+        png_path = os.path.join(images_dir, png_filename)
+        
+        if os.path.exists(png_path):
+            logger.info(f"PNG文件已存在，跳过转换: {png_filename}")
+            return f"images/{png_filename}"
+        
+        # 查询持久化转换缓存
+        cached_status = None
+        if metafile_cache is not None:
+            cached_status = metafile_cache.fetch(full_hash, METAFILE_CONVERTER_VERSION, png_path)
+            if cached_status == STATUS_OK:
+                logger.info(f"转换缓存命中: {png_filename}")
+                return f"images/{png_filename}"
+            if cached_status == STATUS_FAILED:
+                logger.info(f"转换缓存记录该图元文件无法转换，跳过转换: {content_hash}")
+        
+        # 仅包裹单张位图的图元文件直接取出位图，不需要栅格化（快速模式同样适用）；
+        # 成功时写入缓存，下次不再解析。失败条目只在位图提取和转换都失败后写入，命中时跳过
+        if cached_status != STATUS_FAILED and save_metafile_bitmap_as_png(emf_data, png_path):
+            _record_conversion(metafile_cache, full_hash, png_path, True)
+            return f"images/{png_filename}"
+        
         # 快速模式：直接保存原格式，跳过转换
-        if quick_mode:
-            logger.info("快速模式：直接保存EMF文件，跳过转换")
+        # 进程池模式：同样先保存原格式，转换在后台完成后再替换节点中的路径
+        if quick_mode or conversion_pool is not None:
+            if quick_mode:
+                logger.info("快速模式：直接保存EMF文件，跳过转换")
             
-            # 基于内容生成哈希命名，避免重复文件
-            import hashlib
-            content_hash = hashlib.sha256(emf_data).hexdigest()[:16]
             emf_filename = f"embedded_preview_embedded_obj_{content_hash}.emf"
             final_emf_path = os.path.join(images_dir, emf_filename)
             
             # 检查文件是否已存在，避免重复写入
             if os.path.exists(final_emf_path):
                 logger.info(f"EMF文件已存在，跳过: {emf_filename}")
-                return f"images/{emf_filename}"
+            else:
+                try:
+                    with open(final_emf_path, "wb") as f:
+                        f.write(emf_data)
+                    logger.info(f"EMF文件已保存: {emf_filename}")
+                except Exception as e:
+                    logger.error(f"保存EMF文件失败: {e}")
+                    return None
             
-            try:
-                with open(final_emf_path, "wb") as f:
-                    f.write(emf_data)
-                logger.info(f"EMF文件已保存: {emf_filename}")
-                return f"images/{emf_filename}"
-            except Exception as e:
-                logger.error(f"保存EMF文件失败: {e}")
-                return None
+            if not quick_mode and cached_status != STATUS_FAILED:
+                def _on_done(ok):
+                    _record_conversion(metafile_cache, full_hash, png_path, ok)
+                    if ok and on_converted:
+                        on_converted(f"images/{png_filename}")
+                conversion_pool.submit(final_emf_path, png_path, callback=_on_done, group=output_dir)
+            
+            return f"images/{emf_filename}"
         
         # 以下是原有的转换逻辑（在非快速模式下执行）
-        # 基于内容生成哈希命名，避免重复文件
-        import hashlib
-        content_hash = hashlib.sha256(emf_data).hexdigest()[:16]
-        
         # 创建临时EMF文件
         try:
             temp_emf_path = os.path.join(output_dir, f"temp_{content_hash}.emf")
@@ -78,81 +219,12 @@ def convert_emf_to_png(emf_data, output_dir, object_id, quick_mode=True):
             logger.error(f"写入临时EMF文件失败: {e}")
             return None
         
-        # 输出PNG路径
-        png_filename = f"embedded_preview_embedded_obj_{content_hash}.png"
-        png_path = os.path.join(images_dir, png_filename)
-        
-        # 检查PNG文件是否已存在，避免重复转换
-        if os.path.exists(png_path):
-            logger.info(f"PNG文件已存在，跳过转换: {png_filename}")
-            try:
-                os.remove(temp_emf_path)  # 清理临时文件
-            except:
-                pass
-            return f"images/{png_filename}"
-        
-        # 方法1: 使用 PIL 读取基本信息并尝试转换（限时5秒）
-        use_timeout = False
-        try:
-            # 只在Unix系统上使用信号超时
-            use_timeout = hasattr(signal, 'SIGALRM')
-            
-            def timeout_handler(signum, frame):
-                raise TimeoutError("PIL转换超时")
-            
-            # 设置5秒超时（仅在支持的系统上）
-            if use_timeout:
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(5)
-            
-            try:
-                with Image.open(temp_emf_path) as img:
-                    logger.info(f"PIL检测到图像: 模式={img.mode}, 尺寸={img.size}, 格式={img.format}")
-                    
-                    # 验证图像
-                    img.verify()
-                    # 重新打开进行转换
-                    with Image.open(temp_emf_path) as img_convert:
-                        if img_convert.mode in ('RGBA', 'LA', 'P'):
-                            img_convert = img_convert.convert('RGB')
-                        img_convert.save(png_path, 'PNG')
-                        if os.path.exists(png_path) and os.path.getsize(png_path) > 0:
-                            logger.info(f"PIL转换成功: {png_filename}")
-                            return f"images/{png_filename}"
-            finally:
-                if use_timeout:
-                    signal.alarm(0)  # 取消超时
-                            
-        except (TimeoutError, Exception) as e:
-            logger.debug(f"PIL 转换失败或超时: {e}")
-            if use_timeout:
-                signal.alarm(0)  # 确保取消超时
-        
-        # 方法2: 使用系统工具转换（仅限macOS，限时10秒）
-        if platform.system() == "Darwin":
-            try:
-                # 尝试使用sips命令（限时5秒）
-                try:
-                    logger.debug(f"尝试sips转换: {temp_emf_path}")
-                    result = subprocess.run([
-                        'sips', '-s', 'format', 'png', temp_emf_path, '--out', png_path
-                    ], capture_output=True, text=True, timeout=5)
-                    
-                    if result.returncode == 0 and os.path.exists(png_path) and os.path.getsize(png_path) > 0:
-                        logger.info(f"sips转换成功: {png_filename}")
-                        return f"images/{png_filename}"
-                    else:
-                        logger.debug(f"sips转换失败: return code {result.returncode}")
-                        
-                except subprocess.TimeoutExpired:
-                    logger.debug("sips命令超时")
-                except FileNotFoundError:
-                    logger.debug("sips命令不可用")
-                except Exception as e:
-                    logger.debug(f"sips转换异常: {e}")
-            
-            except Exception as e:
-                logger.debug(f"系统命令转换失败: {e}")
+        # 方法1/2: 在独立子进程中转换，超时后终止子进程（不依赖signal，可在任意线程中调用）
+        if cached_status != STATUS_FAILED:
+            converted = run_conversion_with_timeout(temp_emf_path, png_path)
+            _record_conversion(metafile_cache, full_hash, png_path, converted)
+            if converted:
+                return f"images/{png_filename}"
         
         # 方法3: 转换失败，保存原始EMF文件
         try:
@@ -195,9 +267,12 @@ def convert_emf_to_png(emf_data, output_dir, object_id, quick_mode=True):
             except Exception as e:
                 logger.debug(f"清理临时文件失败: {e}")
 
-def extract_preview_image(image_part, output_dir, object_id, quick_mode=True):
+def extract_preview_image(image_part, output_dir, object_id, quick_mode=True, conversion_pool=None, on_converted=None,
+                          metafile_cache=None):
     """
     提取嵌入对象的预览图像并保存为文件
+    conversion_pool/on_converted: 见 convert_emf_to_png，用于异步EMF/WMF转换
+    metafile_cache: 见 convert_emf_to_png，EMF/WMF预览在任何转换工作之前先查询该缓存
     """
     try:
         # 获取图像数据
@@ -225,7 +300,11 @@ def extract_preview_image(image_part, output_dir, object_id, quick_mode=True):
         # 如果是EMF/WMF格式，尝试转换为PNG
         if img_format in ['emf', 'wmf']:
             try:
-                converted_path = convert_emf_to_png(image_data, output_dir, object_id, quick_mode=quick_mode)
+                converted_path = convert_emf_to_png(
+                    image_data, output_dir, object_id, quick_mode=quick_mode,
+                    conversion_pool=conversion_pool, on_converted=on_converted,
+                    metafile_cache=metafile_cache
+                )
                 if converted_path:
                     return converted_path
             except Exception as e:
@@ -239,9 +318,10 @@ def extract_preview_image(image_part, output_dir, object_id, quick_mode=True):
         img_filename = f"embedded_preview_{object_id}.{img_format}"
         image_path = os.path.join(images_dir, img_filename)
         
-        # 保存图像
-        with open(image_path, "wb") as img_file:
-            img_file.write(image_data)
+        # 保存图像（object_id 由内容哈希得出，同名文件内容相同，不再重复写入）
+        if not os.path.exists(image_path):
+            with open(image_path, "wb") as img_file:
+                img_file.write(image_data)
         
         # 返回相对路径
         return f"images/{img_filename}"
@@ -257,6 +337,37 @@ def get_image_dimensions(image_data):
         with Image.open(io.BytesIO(image_data)) as img:
             width, height = img.size
     except Exception:
-        # 对于SVG等无法直接获取尺寸的图片格式，跳过尺寸获取
-        pass
+        # EMF/WMF从文件头读取边界；SVG等无法直接获取尺寸的图片格式，跳过尺寸获取
+        try:
+            width, height = get_metafile_dimensions(image_data)
+        except Exception:
+            pass
+    return width, height
+
+def get_image_stream_dimensions(stream):
+    """从可读的二进制流（如ZIP成员）获取图片尺寸，只读取文件头"""
+    width, height = 0, 0
+    try:
+        with Image.open(stream) as img:
+            width, height = img.size
+    except Exception:
+        try:
+            stream.seek(0)
+            width, height = get_metafile_dimensions(stream.read(METAFILE_HEADER_PROBE_BYTES))
+        except Exception:
+            pass
+    return width, height
+
+def get_image_file_dimensions(image_path):
+    """获取图片文件尺寸，只读取文件头，不把整个文件载入内存"""
+    width, height = 0, 0
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+    except Exception:
+        try:
+            with open(image_path, 'rb') as f:
+                width, height = get_metafile_dimensions(f.read(METAFILE_HEADER_PROBE_BYTES))
+        except Exception:
+            pass
     return width, height
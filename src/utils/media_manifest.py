@@ -0,0 +1,186 @@
+"""
+文档媒体清单
+
+每个文档只构建一次，记录:
+    ZIP成员名 -> 引用它的关系（document/header/footer等部件及rId）-> 内容哈希 -> 输出文件名
+主解析流程（ImageMaterializer）和增强图片提取器共用同一份清单，
+每个媒体成员只从ZIP中读取、哈希一次；同一成员以不同扩展名输出时复制已写出的文件。
+"""
+
+import os
+import shutil
+import hashlib
+import zipfile
+import posixpath
+import threading
+import logging
+
+from src.utils.zip_media import CHUNK_SIZE, get_member_locations, stream_member_to_dir
+
+try:
+    from lxml import etree
+except ImportError:
+    import xml.etree.ElementTree as etree
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "word/media/"
+
+_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_IMAGE_REL_SUFFIX = "/image"
+
+def _source_part_of_rels(rels_name):
+    """word/_rels/document.xml.rels -> word/document.xml"""
+    directory, filename = posixpath.split(rels_name)
+    parent = posixpath.dirname(directory)
+    return posixpath.join(parent, filename[:-len(".rels")]) if parent else filename[:-len(".rels")]
+
+def _resolve_target(source_part, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+class MediaManifest:
+    """
+    单个DOCX文档的媒体清单
+
+    用法:
+        manifest = MediaManifest(docx_path)
+        entry = manifest.entries["word/media/image1.png"]   # {"member", "rels", "sha256", "size", "files"}
+        content_hash, size, filename = manifest.extract("word/media/image1.png", images_dir, ".png")
+        manifest.close()
+    """
+
+    def __init__(self, docx_path):
+        self.docx_path = os.path.abspath(docx_path)
+        self.entries = {}
+        self.relationship_files = []
+        self.image_relationships = []  # 按关系文件及其中条目顺序排列的图片关系 (部件名, 成员名)
+        self._zip = zipfile.ZipFile(self.docx_path)
+        self._lock = threading.Lock()
+        self._member_locks = {}
+        self._locations = None
+        self._build()
+
+    def _build(self):
+        names = self._zip.namelist()
+        for name in names:
+            if name.startswith(MEDIA_PREFIX) and not name.endswith("/"):
+                self._entry(name)
+
+        self.relationship_files = [name for name in names if name.endswith(".rels")]
+        for rels_name in self.relationship_files:
+            source_part = _source_part_of_rels(rels_name)
+            try:
+                root = etree.fromstring(self._zip.read(rels_name))
+            except Exception as e:
+                logger.warning(f"解析关系文件 {rels_name} 失败: {e}")
+                continue
+            for rel in root.iter(f"{{{_RELS_NS}}}Relationship"):
+                if rel.get("TargetMode") == "External":
+                    continue
+                target = _resolve_target(source_part, rel.get("Target", ""))
+                is_image = rel.get("Type", "").endswith(_IMAGE_REL_SUFFIX)
+                if not (is_image or target in self.entries) or target not in self._zip.NameToInfo:
+                    continue
+                self._entry(target)["rels"].append({"part": source_part, "r_id": rel.get("Id"), "image": is_image})
+                if is_image:
+                    self.image_relationships.append((source_part, target))
+
+    def _entry(self, member):
+        entry = self.entries.get(member)
+        if entry is None:
+            entry = {"member": member, "rels": [], "sha256": None, "size": None, "files": {}}
+            self.entries[member] = entry
+        return entry
+
+    def close(self):
+        try:
+            self._zip.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, member):
+        return member in self.entries
+
+    def media_members(self):
+        """word/media/ 下的全部成员"""
+        return [member for member in self.entries if member.startswith(MEDIA_PREFIX)]
+
+    def referencing_parts(self, member):
+        """引用该成员的部件名列表"""
+        return list(dict.fromkeys(rel["part"] for rel in self.entries.get(member, {}).get("rels", [])))
+
+    def _member_lock(self, member):
+        with self._lock:
+            return self._member_locks.setdefault(member, threading.Lock())
+
+    def content_hash(self, member):
+        """成员内容的sha256（首次调用时流式计算，之后直接返回）"""
+        entry = self._entry(member)
+        with self._member_lock(member):
+            if entry["sha256"] is None:
+                hasher = hashlib.sha256()
+                size = 0
+                with self._zip.open(member) as src:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        hasher.update(chunk)
+                        size += len(chunk)
+                entry["sha256"] = hasher.hexdigest()
+                entry["size"] = size
+            return entry["sha256"]
+
+    def extract(self, member, dest_dir, suffix):
+        """
+        将成员写出到目录（按内容哈希命名），同一成员在同一目录下只写出一次
+
+        Returns:
+            tuple: (sha256十六进制摘要, 字节数, 文件名)
+        """
+        entry = self._entry(member)
+        dest_dir = os.path.abspath(dest_dir)
+        with self._member_lock(member):
+            existing = entry["files"].get(dest_dir, {})
+            if suffix in existing:
+                return entry["sha256"], entry["size"], existing[suffix]
+            copy_from = None
+            if entry["sha256"] is not None:
+                copy_from = next((os.path.join(dest_dir, name) for name in existing.values()
+                                  if os.path.exists(os.path.join(dest_dir, name))), None)
+            if copy_from is not None:
+                # 已按其他扩展名写出过：复制文件，不再读取ZIP成员
+                filename = f"img_{entry['sha256'][:16]}{suffix}"
+                dest_path = os.path.join(dest_dir, filename)
+                if not os.path.exists(dest_path):
+                    shutil.copyfile(copy_from, dest_path)
+            else:
+                content_hash, size, filename = stream_member_to_dir(self._zip, member, dest_dir, suffix)
+                entry["sha256"], entry["size"] = content_hash, size
+            entry["files"].setdefault(dest_dir, {})[suffix] = filename
+            return entry["sha256"], entry["size"], filename
+
+    def open(self, member):
+        """以流的方式打开成员（调用方负责关闭），不读取完整数据"""
+        return self._zip.open(member)
+
+    def size(self, member):
+        """成员解压后的字节数（来自ZIP目录，不读取数据）"""
+        return self._zip.getinfo(member).file_size
+
+    def location(self, member):
+        """成员数据在DOCX文件中的字节范围（见 zip_media.get_member_locations）"""
+        with self._lock:
+            if self._locations is None:
+                self._locations = get_member_locations(self.docx_path, list(self.entries))
+            if member not in self._locations:
+                self._locations.update(get_member_locations(self.docx_path, [member]))
+            return self._locations.get(member)
@@ -0,0 +1,221 @@
+"""
+EMF/WMF转换结果的持久化缓存
+
+同一个Visio预览图会出现在大量文档中，缓存按 (输入内容哈希, 转换器版本) 记录:
+- 转换成功：保存PNG数据（blob文件）
+- 转换失败：保存"failed"负缓存条目，避免重复尝试；负缓存条目在 failure_ttl 秒后过期，之后重新尝试转换
+  （超时不写入负缓存，见 image_utils._record_conversion）
+索引保存在SQLite中，blob文件按哈希分目录存放，总大小超过上限时按最近最少使用淘汰。
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存上限: 1GB
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# 负缓存条目的默认有效期: 7天
+DEFAULT_FAILURE_TTL = 7 * 24 * 3600
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+class MetafileCache:
+    """
+    EMF/WMF→PNG转换结果的磁盘缓存（SQLite索引 + blob文件）
+
+    用法:
+        cache = MetafileCache("~/.cache/docx_parser/metafiles")
+        hit = cache.get(content_hash, converter_version)
+        if hit is None:
+            ... 执行转换 ...
+            cache.put(content_hash, converter_version, png_path)   # 或 cache.put_failure(...)
+
+    同一进程内可在多个线程间共享；多个进程可共享同一缓存目录（由SQLite负责加锁）。
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES, failure_ttl=DEFAULT_FAILURE_TTL):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.blobs_dir = os.path.join(self.cache_dir, "blobs")
+        self.max_bytes = max_bytes
+        self.failure_ttl = failure_ttl
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, "index.sqlite"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " content_hash TEXT NOT NULL,"
+            " converter_version TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " blob_name TEXT,"
+            " size INTEGER NOT NULL DEFAULT 0,"
+            " last_access REAL NOT NULL,"
+            " created REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (content_hash, converter_version))"
+        )
+        # 旧版索引没有 created 列：补上后旧的负缓存条目视为已过期
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if "created" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN created REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+    def _blob_path(self, blob_name):
+        return os.path.join(self.blobs_dir, blob_name[:2], blob_name)
+
+    def get(self, content_hash, converter_version):
+        """
+        查询缓存
+
+        Returns:
+            None: 未命中
+            (STATUS_OK, blob文件路径): 命中成功转换的PNG
+            (STATUS_FAILED, None): 命中未过期的失败负缓存
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT status, blob_name, created FROM entries WHERE content_hash=? AND converter_version=?",
+                    (content_hash, converter_version)
+                ).fetchone()
+                if row is None:
+                    return None
+                status, blob_name, created = row
+                if status == STATUS_FAILED and created < time.time() - self.failure_ttl:
+                    # 负缓存过期，重新尝试转换
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE content_hash=? AND converter_version=?",
+                        (content_hash, converter_version)
+                    )
+                    return None
+                if status == STATUS_OK:
+                    blob_path = self._blob_path(blob_name)
+                    if not os.path.exists(blob_path):
+                        # blob文件丢失，视为未命中
+                        self._conn.execute(
+                            "DELETE FROM entries WHERE content_hash=? AND converter_version=?",
+                            (content_hash, converter_version)
+                        )
+                        return None
+                self._conn.execute(
+                    "UPDATE entries SET last_access=? WHERE content_hash=? AND converter_version=?",
+                    (time.time(), content_hash, converter_version)
+                )
+            if status == STATUS_OK:
+                return STATUS_OK, blob_path
+            return STATUS_FAILED, None
+        except Exception as e:
+            logger.warning(f"查询转换缓存失败: {e}")
+            return None
+
+    def fetch(self, content_hash, converter_version, dest_path):
+        """
+        命中成功条目时将PNG复制到 dest_path
+
+        Returns:
+            None / STATUS_OK / STATUS_FAILED，含义同 get()
+        """
+        hit = self.get(content_hash, converter_version)
+        if hit is None:
+            return None
+        status, blob_path = hit
+        if status == STATUS_OK:
+            try:
+                if not os.path.exists(dest_path):
+                    shutil.copyfile(blob_path, dest_path)
+            except (OSError, IOError) as e:
+                logger.warning(f"从转换缓存复制PNG失败: {e}")
+                return None
+        return status
+
+    def put(self, content_hash, converter_version, png_path):
+        """记录成功的转换结果（复制PNG到缓存）"""
+        blob_name = f"{content_hash}_{hashlib.sha1(converter_version.encode('utf-8')).hexdigest()[:8]}.png"
+        blob_path = self._blob_path(blob_name)
+        try:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(png_path, tmp_path)
+            os.replace(tmp_path, blob_path)
+            size = os.path.getsize(blob_path)
+        except (OSError, IOError) as e:
+            logger.warning(f"写入转换缓存失败: {e}")
+            return
+        self._record(content_hash, converter_version, STATUS_OK, blob_name, size)
+        self._evict()
+
+    def put_failure(self, content_hash, converter_version):
+        """记录失败的转换（负缓存，failure_ttl 秒后过期）"""
+        self._record(content_hash, converter_version, STATUS_FAILED, None, 0)
+        self._evict()
+
+    def _record(self, content_hash, converter_version, status, blob_name, size):
+        try:
+            now = time.time()
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries"
+                    " (content_hash, converter_version, status, blob_name, size, last_access, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (content_hash, converter_version, status, blob_name, size, now, now)
+                )
+        except Exception as e:
+            logger.warning(f"写入转换缓存索引失败: {e}")
+
+    def total_bytes(self):
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return row[0]
+
+    def _evict(self):
+        """删除过期的负缓存条目；总大小超过上限时，按最近访问时间从旧到新淘汰（包括负缓存条目）"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE status=? AND created < ?",
+                    (STATUS_FAILED, time.time() - self.failure_ttl)
+                )
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                rows = self._conn.execute(
+                    "SELECT content_hash, converter_version, blob_name, size FROM entries"
+                    " ORDER BY last_access ASC"
+                ).fetchall()
+                for content_hash, converter_version, blob_name, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE content_hash=? AND converter_version=?",
+                        (content_hash, converter_version)
+                    )
+                    if blob_name:
+                        try:
+                            os.remove(self._blob_path(blob_name))
+                        except OSError:
+                            pass
+                    total -= size
+                logger.info(f"转换缓存淘汰完成，当前大小 {total/1024/1024:.2f} MB")
+        except Exception as e:
+            logger.warning(f"转换缓存淘汰失败: {e}")
@@ -0,0 +1,319 @@
+"""
+EMF/WMF转换进程池
+
+将耗时的EMF/WMF→PNG转换放到独立的工作进程中执行:
+- 每个任务有独立的墙钟超时，超时后直接杀死工作进程并重新拉起
+- 不依赖 signal.alarm，可以在任意线程中使用
+- 转换结果通过回调写回文档节点，解析过程不会被慢速图元文件阻塞
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait as wait_connections
+
+logger = logging.getLogger(__name__)
+
+# 单个转换任务的默认墙钟超时（秒），覆盖PIL和系统工具两种转换方式
+DEFAULT_CONVERSION_TIMEOUT = 10.0
+
+# 单个任务分派到工作进程（发送失败）的最多尝试次数，超过后判定任务失败
+MAX_DISPATCH_ATTEMPTS = 3
+
+def _worker_main(conn):
+    """工作进程主循环：接收 (task_id, src_path, png_path)，返回 (task_id, 是否成功)"""
+    from src.utils.image_utils import convert_metafile_file
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        task_id, src_path, png_path = task
+        try:
+            ok = convert_metafile_file(src_path, png_path)
+        except Exception:
+            ok = False
+        try:
+            conn.send((task_id, ok))
+        except (EOFError, OSError):
+            break
+
+def _oneshot_main(src_path, png_path):
+    """一次性转换进程入口"""
+    from src.utils.image_utils import convert_metafile_file
+    ok = convert_metafile_file(src_path, png_path)
+    os._exit(0 if ok else 1)
+
+def run_conversion_with_timeout(src_path, png_path, timeout=DEFAULT_CONVERSION_TIMEOUT, mp_context=None):
+    """
+    在一次性子进程中执行转换，超时后杀死子进程
+
+    Returns:
+        True: 转换成功；False: 转换失败；None: 超时（属于暂时性失败，调用方不应当作永久失败缓存）
+    """
+    ctx = mp_context or multiprocessing.get_context()
+    proc = ctx.Process(target=_oneshot_main, args=(src_path, png_path), daemon=True)
+    try:
+        proc.start()
+        proc.join(timeout)
+        if proc.is_alive():
+            logger.debug(f"图元文件转换超时({timeout}s)，终止子进程: {src_path}")
+            proc.kill()
+            proc.join()
+            return None
+        return proc.exitcode == 0 and os.path.exists(png_path) and os.path.getsize(png_path) > 0
+    except Exception as e:
+        logger.debug(f"启动转换子进程失败: {e}")
+        return False
+
+class _Worker:
+    """单个工作进程及其通信管道"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.deadline = None
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join()
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+class MetafileConversionPool:
+    """
+    EMF/WMF转换专用进程池
+
+    用法:
+        with MetafileConversionPool(max_workers=4) as pool:
+            pool.submit(src_path, png_path, callback=lambda ok: ..., group=output_dir)
+            pool.wait(group=output_dir)
+
+    回调在池的调度线程中执行，参数为转换结果：True 成功，False 失败，None 超时（工作进程被终止）。
+    相同 png_path 的重复提交会合并为同一个任务。任务发送给工作进程失败时换一个工作进程重试，
+    连续 MAX_DISPATCH_ATTEMPTS 次失败后判定为失败。
+    """
+
+    def __init__(self, max_workers=None, timeout=DEFAULT_CONVERSION_TIMEOUT, mp_context=None):
+        self.max_workers = max(1, max_workers or min(4, os.cpu_count() or 1))
+        self.timeout = timeout
+        self._ctx = mp_context or multiprocessing.get_context()
+        self._workers = []
+        self._pending = deque()
+        self._tasks = {}  # task_id -> 任务信息
+        self._by_target = {}  # png_path -> task_id
+        self._next_id = 0
+        self._lock = threading.Condition()
+        self._closed = False
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "timed_out": 0}
+        self._thread = threading.Thread(target=self._run, name="metafile-pool", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def submit(self, src_path, png_path, callback=None, group=None):
+        """
+        提交转换任务，立即返回任务ID
+
+        Args:
+            src_path: 源EMF/WMF文件路径
+            png_path: 目标PNG文件路径
+            callback: 完成回调 callback(ok)，ok 为 True / False / None（超时）
+            group: 任务分组（通常为文档输出目录），用于按组等待
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("转换进程池已关闭")
+            task_id = self._by_target.get(png_path)
+            if task_id is not None and task_id in self._tasks:
+                task = self._tasks[task_id]
+                if callback:
+                    task["callbacks"].append(callback)
+                task["groups"].add(group)
+                return task_id
+            task_id = self._next_id
+            self._next_id += 1
+            self._tasks[task_id] = {
+                "src_path": src_path,
+                "png_path": png_path,
+                "callbacks": [callback] if callback else [],
+                "groups": {group},
+                "dispatch_attempts": 0,
+            }
+            self._by_target[png_path] = task_id
+            self._pending.append(task_id)
+            self._stats["submitted"] += 1
+            self._lock.notify_all()
+            return task_id
+
+    def wait(self, group=None, timeout=None):
+        """
+        等待任务完成
+
+        Args:
+            group: 仅等待该分组的任务；为None时等待全部任务
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            bool: 是否所有目标任务都已完成
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                remaining_tasks = [
+                    t for t in self._tasks.values()
+                    if group is None or group in t["groups"]
+                ]
+                if not remaining_tasks:
+                    return True
+                if end is not None:
+                    left = end - time.monotonic()
+                    if left <= 0:
+                        return False
+                    self._lock.wait(min(left, 0.5))
+                else:
+                    self._lock.wait(0.5)
+
+    def shutdown(self):
+        """等待所有任务完成后关闭进程池"""
+        if not self._closed:
+            self.wait()
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        self._thread.join()
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except Exception:
+                pass
+            worker.process.join(1)
+            if worker.process.is_alive():
+                worker.kill()
+        self._workers = []
+
+    # ----------------- 调度线程 -----------------
+    def _finish(self, task_id, ok, timed_out=False):
+        """
+        在持有锁的情况下标记任务完成，返回需要执行的回调
+
+        任务在回调执行完毕后才从 _tasks 中移除，保证 wait() 返回时结果已写回
+        """
+        task = self._tasks.get(task_id)
+        if task is None or task.get("done"):
+            return []
+        task["done"] = True
+        self._by_target.pop(task["png_path"], None)
+        if ok:
+            self._stats["succeeded"] += 1
+        else:
+            self._stats["failed"] += 1
+        if timed_out:
+            self._stats["timed_out"] += 1
+            ok = None
+        return [(task_id, cb, ok) for cb in task["callbacks"]] or [(task_id, None, ok)]
+
+    def _dispatch(self):
+        """将等待中的任务分配给空闲工作进程（需持有锁），返回需要执行的回调"""
+        callbacks = []
+        while self._pending:
+            idle = next((w for w in self._workers if w.task is None), None)
+            if idle is None:
+                if len(self._workers) >= self.max_workers:
+                    break
+                try:
+                    idle = _Worker(self._ctx)
+                except Exception as e:
+                    logger.error(f"启动转换工作进程失败: {e}")
+                    if not self._workers:
+                        # 没有任何可用的工作进程，直接判定任务失败，避免无限等待
+                        callbacks.extend(self._finish(self._pending.popleft(), False))
+                        continue
+                    break
+                self._workers.append(idle)
+            task_id = self._pending.popleft()
+            task = self._tasks[task_id]
+            try:
+                idle.conn.send((task_id, task["src_path"], task["png_path"]))
+                idle.task = task_id
+                idle.deadline = time.monotonic() + self.timeout
+            except Exception as e:
+                logger.debug(f"分派转换任务失败: {e}")
+                self._workers.remove(idle)
+                idle.kill()
+                task["dispatch_attempts"] += 1
+                if task["dispatch_attempts"] >= MAX_DISPATCH_ATTEMPTS:
+                    logger.error(f"转换任务 {MAX_DISPATCH_ATTEMPTS} 次分派失败，放弃转换: {task['src_path']}")
+                    callbacks.extend(self._finish(task_id, False))
+                else:
+                    self._pending.appendleft(task_id)
+        return callbacks
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._closed and not self._tasks:
+                    return
+                callbacks = self._dispatch()
+                busy = [w for w in self._workers if w.task is not None]
+                if not busy and not self._pending and not callbacks:
+                    self._lock.wait(0.5)
+                    continue
+            # 在锁外等待结果，最多等到最近的截止时间
+            now = time.monotonic()
+            poll = min([max(0.0, w.deadline - now) for w in busy] + [0.1])
+            ready = wait_connections([w.conn for w in busy], timeout=poll) if busy else []
+            with self._lock:
+                for worker in busy:
+                    if worker.conn in ready:
+                        try:
+                            task_id, ok = worker.conn.recv()
+                        except (EOFError, OSError):
+                            # 工作进程异常退出
+                            task_id, ok = worker.task, False
+                            self._workers.remove(worker)
+                            worker.kill()
+                        worker.task = None
+                        worker.deadline = None
+                        callbacks.extend(self._finish(task_id, ok))
+                    elif worker.deadline is not None and time.monotonic() > worker.deadline:
+                        task_id = worker.task
+                        logger.warning(f"图元文件转换超时({self.timeout}s)，终止工作进程: "
+                                       f"{self._tasks.get(task_id, {}).get('src_path')}")
+                        self._workers.remove(worker)
+                        worker.kill()
+                        callbacks.extend(self._finish(task_id, False, timed_out=True))
+            for _, cb, ok in callbacks:
+                if cb is None:
+                    continue
+                try:
+                    cb(ok)
+                except Exception as e:
+                    logger.error(f"转换回调执行失败: {e}")
+            if callbacks:
+                with self._lock:
+                    for task_id, _, _ in callbacks:
+                        self._tasks.pop(task_id, None)
+                    self._lock.notify_all()
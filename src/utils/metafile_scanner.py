@@ -0,0 +1,278 @@
+"""
+EMF/WMF记录扫描器（纯Python实现）
+
+很多OLE预览图虽然保存为EMF/WMF，实际上只是包裹了一张DIB位图
+（EMR_STRETCHDIBITS / META_DIBSTRETCHBLT 等记录）。本模块逐条扫描图元文件记录:
+- 读取文件头中的边界信息，用于获取尺寸
+- 检测"仅包含一张位图、没有矢量绘制"的情况，并直接取出位图数据
+只有真正的矢量内容才需要走耗时的栅格化转换。
+"""
+
+import io
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMF_SIGNATURE = 0x464D4520  # " EMF"
+WMF_PLACEABLE_KEY = 0x9AC6CDD7
+
+# EMF位图记录类型 -> (offBmiSrc, cbBmiSrc, offBitsSrc, cbBitsSrc, UsageSrc) 在记录中的字节偏移
+EMF_BITMAP_RECORDS = {
+    76: (84, 88, 92, 96, 80),   # EMR_BITBLT
+    77: (84, 88, 92, 96, 80),   # EMR_STRETCHBLT
+    80: (48, 52, 56, 60, 64),   # EMR_SETDIBITSTODEVICE
+    81: (48, 52, 56, 60, 64),   # EMR_STRETCHDIBITS
+}
+
+# 不产生可见绘制的EMF记录（状态、坐标变换、对象管理、注释等）
+EMF_NEUTRAL_RECORDS = {
+    1, 9, 10, 11, 12, 13, 14, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32,
+    33, 34, 35, 36, 37, 38, 39, 40, 48, 49, 52, 57, 58, 67, 70, 75, 95, 98, 115, 120,
+}
+
+EMR_HEADER = 1
+EMR_EOF = 14
+
+# WMF位图记录函数号 -> DIB在记录中的字节偏移（含6字节记录头）
+WMF_BITMAP_RECORDS = {
+    0x0940: 22,  # META_DIBBITBLT
+    0x0B41: 26,  # META_DIBSTRETCHBLT
+    0x0D33: 24,  # META_SETDIBTODEV
+    0x0F43: 28,  # META_STRETCHDIB
+}
+
+# 不产生可见绘制的WMF记录
+WMF_NEUTRAL_RECORDS = {
+    0x0000, 0x001E, 0x0035, 0x00F7, 0x0102, 0x0103, 0x0104, 0x0106, 0x0107, 0x0127, 0x012C, 0x012D,
+    0x012E, 0x0142, 0x01F0, 0x0201, 0x0209, 0x020B, 0x020C, 0x020D, 0x020E, 0x020F, 0x0211, 0x0214,
+    0x0220, 0x0231, 0x0234, 0x02FA, 0x02FC, 0x0410, 0x0412, 0x0415, 0x0416, 0x0626,
+}
+
+WMF_EOF = 0x0000
+
+# BITMAPINFOHEADER.biCompression
+BI_BITFIELDS = 3
+BI_JPEG = 4
+BI_PNG = 5
+
+def _open_stream(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if data is None or len(data) != size:
+        raise EOFError("图元文件记录被截断")
+    return data
+
+def _skip(stream, size):
+    if size <= 0:
+        return
+    try:
+        stream.seek(size, io.SEEK_CUR)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        _read_exact(stream, size)
+
+def _dib_header_size(bmi):
+    """计算BITMAPINFO（头 + 颜色表/位掩码）的长度"""
+    header_size = struct.unpack_from('<I', bmi, 0)[0]
+    if header_size == 12:
+        # BITMAPCOREHEADER: 颜色表每项3字节
+        bit_count = struct.unpack_from('<H', bmi, 10)[0]
+        colors = (1 << bit_count) if bit_count <= 8 else 0
+        return header_size + colors * 3
+    bit_count = struct.unpack_from('<H', bmi, 14)[0]
+    compression = struct.unpack_from('<I', bmi, 16)[0]
+    clr_used = struct.unpack_from('<I', bmi, 32)[0]
+    masks = 12 if compression == BI_BITFIELDS and header_size == 40 else 0
+    colors = clr_used or ((1 << bit_count) if bit_count <= 8 else 0)
+    return header_size + masks + colors * 4
+
+def _dib_to_image_bytes(bmi, bits):
+    """
+    将DIB（BITMAPINFO + 像素数据）转换为可直接保存的图像数据
+
+    Returns:
+        (格式, 数据): 格式为 "png"/"jpg"（DIB内嵌压缩数据）或 "bmp"
+    """
+    if len(bmi) >= 20 and struct.unpack_from('<I', bmi, 0)[0] >= 40:
+        compression = struct.unpack_from('<I', bmi, 16)[0]
+        if compression == BI_PNG:
+            return "png", bytes(bits)
+        if compression == BI_JPEG:
+            return "jpg", bytes(bits)
+    pixel_offset = 14 + len(bmi)
+    file_header = struct.pack('<2sIHHI', b'BM', pixel_offset + len(bits), 0, 0, pixel_offset)
+    return "bmp", file_header + bytes(bmi) + bytes(bits)
+
+def _scan_emf(stream, result, first_record):
+    record_type, record_size = struct.unpack_from('<II', first_record, 0)
+    header = first_record + _read_exact(stream, record_size - 8)
+    if len(header) >= 44 and struct.unpack_from('<I', header, 40)[0] == EMF_SIGNATURE:
+        left, top, right, bottom = struct.unpack_from('<iiii', header, 8)
+        f_left, f_top, f_right, f_bottom = struct.unpack_from('<iiii', header, 24)
+        result["bounds"] = (left, top, right, bottom)
+        result["frame_mm"] = tuple(v / 100.0 for v in (f_left, f_top, f_right, f_bottom))
+        result["width"] = right - left + 1
+        result["height"] = bottom - top + 1
+
+    while True:
+        head = stream.read(8)
+        if not head or len(head) < 8:
+            break
+        record_type, record_size = struct.unpack('<II', head)
+        if record_size < 8 or record_size % 4:
+            raise ValueError(f"EMF记录长度无效: {record_size}")
+        result["records"] += 1
+        if record_type == EMR_EOF:
+            _skip(stream, record_size - 8)
+            break
+        if record_type in EMF_BITMAP_RECORDS:
+            record = head + _read_exact(stream, record_size - 8)
+            off_bmi, cb_bmi, off_bits, cb_bits, usage = (
+                struct.unpack_from('<I', record, pos)[0] for pos in EMF_BITMAP_RECORDS[record_type]
+            )
+            if cb_bmi and cb_bits and usage == 0 \
+                    and off_bmi + cb_bmi <= record_size and off_bits + cb_bits <= record_size:
+                result["bitmaps"].append((record[off_bmi:off_bmi + cb_bmi], record[off_bits:off_bits + cb_bits]))
+            else:
+                # 没有源位图（纯光栅操作）或使用调色板索引，按矢量内容处理
+                result["vector_records"] += 1
+        else:
+            if record_type not in EMF_NEUTRAL_RECORDS:
+                result["vector_records"] += 1
+            _skip(stream, record_size - 8)
+
+def _scan_wmf(stream, result, first_bytes):
+    head = first_bytes
+    if struct.unpack_from('<I', head, 0)[0] == WMF_PLACEABLE_KEY:
+        placeable = head + _read_exact(stream, 22 - len(head))
+        left, top, right, bottom, inch = struct.unpack_from('<hhhhH', placeable, 6)
+        result["bounds"] = (left, top, right, bottom)
+        if inch:
+            # 按96 DPI换算为像素
+            result["width"] = round(abs(right - left) * 96 / inch)
+            result["height"] = round(abs(bottom - top) * 96 / inch)
+        head = b''
+
+    header = head + _read_exact(stream, 18 - len(head))
+    header_words = struct.unpack_from('<H', header, 2)[0]
+    if header_words != 9:
+        raise ValueError("不是有效的WMF文件")
+
+    while True:
+        record_head = stream.read(6)
+        if not record_head or len(record_head) < 6:
+            break
+        size_words, function = struct.unpack('<IH', record_head)
+        record_size = size_words * 2
+        if record_size < 6:
+            raise ValueError(f"WMF记录长度无效: {record_size}")
+        result["records"] += 1
+        if function == WMF_EOF:
+            break
+        if function in WMF_BITMAP_RECORDS and record_size > WMF_BITMAP_RECORDS[function] + 40:
+            record = record_head + _read_exact(stream, record_size - 6)
+            color_usage_ok = True
+            if function in (0x0D33, 0x0F43):
+                usage_pos = 10 if function == 0x0F43 else 6
+                color_usage_ok = struct.unpack_from('<H', record, usage_pos)[0] == 0
+            dib = record[WMF_BITMAP_RECORDS[function]:]
+            if color_usage_ok:
+                bmi_size = _dib_header_size(dib)
+                result["bitmaps"].append((dib[:bmi_size], dib[bmi_size:]))
+            else:
+                result["vector_records"] += 1
+        else:
+            if function not in WMF_NEUTRAL_RECORDS:
+                result["vector_records"] += 1
+            _skip(stream, record_size - 6)
+
+def scan_metafile(source, read_records=True):
+    """
+    扫描EMF/WMF图元文件
+
+    Args:
+        source: 图元文件数据（bytes）或可读取的二进制流
+        read_records: False时只读取文件头（用于快速获取尺寸）
+
+    Returns:
+        dict | None: 扫描结果，无法识别时返回None
+            format: "emf" / "wmf"
+            bounds: 头部边界 (left, top, right, bottom)
+            width/height: 像素尺寸（可能缺失）
+            records: 记录数量
+            vector_records: 产生矢量绘制的记录数量
+            bitmaps: [(BITMAPINFO, 像素数据)] 位图记录列表
+    """
+    stream = _open_stream(source)
+    result = {"format": None, "records": 0, "vector_records": 0, "bitmaps": []}
+    try:
+        first = stream.read(8)
+        if not first or len(first) < 8:
+            return None
+        record_type, record_size = struct.unpack('<II', first)
+        if record_type == EMR_HEADER and record_size >= 88:
+            result["format"] = "emf"
+            if not read_records:
+                header = first + _read_exact(stream, 80)
+                if struct.unpack_from('<I', header, 40)[0] != EMF_SIGNATURE:
+                    return None
+                left, top, right, bottom = struct.unpack_from('<iiii', header, 8)
+                result["bounds"] = (left, top, right, bottom)
+                result["width"] = right - left + 1
+                result["height"] = bottom - top + 1
+                return result
+            result["records"] = 1
+            _scan_emf(stream, result, first)
+        elif struct.unpack_from('<I', first, 0)[0] == WMF_PLACEABLE_KEY or \
+                (struct.unpack_from('<H', first, 0)[0] in (1, 2) and struct.unpack_from('<H', first, 2)[0] == 9):
+            result["format"] = "wmf"
+            if not read_records:
+                # 只有可放置WMF头包含尺寸
+                if struct.unpack_from('<I', first, 0)[0] != WMF_PLACEABLE_KEY:
+                    return result
+                placeable = first + _read_exact(stream, 14)
+                left, top, right, bottom, inch = struct.unpack_from('<hhhhH', placeable, 6)
+                result["bounds"] = (left, top, right, bottom)
+                if inch:
+                    result["width"] = round(abs(right - left) * 96 / inch)
+                    result["height"] = round(abs(bottom - top) * 96 / inch)
+                return result
+            _scan_wmf(stream, result, first)
+        else:
+            return None
+    except (EOFError, ValueError, struct.error) as e:
+        logger.debug(f"扫描图元文件失败: {e}")
+        if result["format"] is None:
+            return None
+        # 记录损坏时无法确认内容，按矢量处理
+        result["vector_records"] += 1
+    return result
+
+def get_metafile_dimensions(data):
+    """从EMF/WMF文件头读取像素尺寸，无法获取时返回 (0, 0)"""
+    info = scan_metafile(data, read_records=False)
+    if not info:
+        return 0, 0
+    return max(0, info.get("width", 0)), max(0, info.get("height", 0))
+
+def extract_single_bitmap(data):
+    """
+    如果图元文件只是单张位图的包装（没有任何矢量绘制），取出该位图
+
+    Returns:
+        (格式, 图像数据, 扫描结果) | None: 格式为 "png"/"jpg"/"bmp"；含矢量内容或无法识别时返回None
+    """
+    info = scan_metafile(data)
+    if not info or info["vector_records"] or len(info["bitmaps"]) != 1:
+        return None
+    bmi, bits = info["bitmaps"][0]
+    try:
+        img_format, image_data = _dib_to_image_bytes(bmi, bits)
+    except struct.error as e:
+        logger.debug(f"解析DIB位图失败: {e}")
+        return None
+    return img_format, image_data, info
@@ -0,0 +1,129 @@
+"""
+文档级旁路数据包（sidecar pack）
+
+SmartArt和嵌入对象的详细信息原先各自写成一个JSON文件（smartart/smartart_XXXX.json、
+embedded_objects/object_XXXX.json），大批次下会产生海量小文件。现在解析过程中只在内存中登记，
+每个文档结束时一次性写入输出目录下的两个文件:
+
+    sidecars.jsonl        每行一个对象的JSON
+    sidecars.index.json   {"version": 1, "pack": "sidecars.jsonl",
+                           "entries": {"smartart/smartart_XXXX.json": [字节偏移, 字节长度], ...}}
+
+节点中的 file_path 字段保持原来的相对路径不变，作为包内的键；读取时用 load_sidecar /
+SidecarPackReader 解析，包中没有的路径回退到旧版的独立JSON文件。
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_PACK_FILE = "sidecars.jsonl"
+SIDECAR_INDEX_FILE = "sidecars.index.json"
+SIDECAR_PACK_VERSION = 1
+
+class SidecarPack:
+    """
+    在内存中收集一个文档的旁路数据，统一写出
+
+    登记的是节点本身（而不是副本），写出前对节点的修改（如异步EMF/WMF转换完成后更新
+    preview_image、图片转码改写路径）都会反映在包中；写出时去掉节点自身的 file_path 字段。
+
+    用法:
+        pack = SidecarPack()
+        pack.add("smartart/smartart_XXXX.json", smartart_node)
+        ...
+        pack.write(output_dir)
+    """
+
+    def __init__(self):
+        self.entries = {}  # file_path -> 节点
+
+    def add(self, file_path, node):
+        """登记一个对象；同一路径只保留首次登记的节点（与原来已存在即不覆盖的行为一致）"""
+        if file_path not in self.entries:
+            self.entries[file_path] = node
+
+    def __contains__(self, file_path):
+        return file_path in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def write(self, output_dir):
+        """
+        写出数据包和索引；没有登记任何对象时不写文件
+
+        Returns:
+            int: 写出的对象数量
+        """
+        if not self.entries:
+            return 0
+        os.makedirs(output_dir, exist_ok=True)
+        index = {}
+        offset = 0
+        with open(os.path.join(output_dir, SIDECAR_PACK_FILE), "wb") as f:
+            for file_path, node in self.entries.items():
+                saved = {k: v for k, v in node.items() if k != "file_path"}
+                line = json.dumps(saved, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                index[file_path] = [offset, len(line)]
+                offset += len(line)
+        with open(os.path.join(output_dir, SIDECAR_INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"version": SIDECAR_PACK_VERSION, "pack": SIDECAR_PACK_FILE, "entries": index},
+                      f, ensure_ascii=False)
+        return len(index)
+
+class SidecarPackReader:
+    """
+    按 file_path 读取文档输出目录中的旁路数据
+
+    用法:
+        reader = SidecarPackReader(output_dir)
+        smartart = reader.get(node["file_path"])
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.entries = {}
+        self.pack_path = None
+        index_path = os.path.join(output_dir, SIDECAR_INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.entries = index.get("entries", {})
+            self.pack_path = os.path.join(output_dir, index.get("pack", SIDECAR_PACK_FILE))
+
+    def paths(self):
+        """包中的全部 file_path"""
+        return list(self.entries)
+
+    def get(self, file_path):
+        """
+        读取 file_path 对应的对象
+
+        Returns:
+            dict | None: 包中或旧版独立文件中的对象；都不存在时返回None
+        """
+        if not file_path:
+            return None
+        entry = self.entries.get(file_path)
+        if entry is not None:
+            offset, length = entry
+            with open(self.pack_path, "rb") as f:
+                f.seek(offset)
+                return json.loads(f.read(length).decode("utf-8"))
+        legacy_path = os.path.join(self.output_dir, file_path)
+        if os.path.isfile(legacy_path):
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+def load_sidecar(output_dir, file_path):
+    """读取单个 file_path 对应的对象（多次读取时使用 SidecarPackReader 复用索引）"""
+    try:
+        return SidecarPackReader(output_dir).get(file_path)
+    except Exception as e:
+        logger.warning(f"读取旁路数据 {file_path} 失败: {e}")
+        return None
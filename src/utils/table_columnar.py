@@ -0,0 +1,124 @@
+"""
+表格的列式表示
+
+大表格按行保存为嵌套字典时，每个单元格都是一个带 type/row/col/content 的字典。列式表示
+把单元格文本按位置存为字符串数组（第 j 列为每行第 j 个单元格的文本），并用数组记录每行的
+单元格数和每个单元格所在的网格列（合并单元格被跳过后两者不再对应）:
+
+    "columnar": {
+        "texts": [[第0个单元格文本...], [第1个单元格文本...], ...],
+        "cols": [[网格列...], ...],          # 不存在的单元格为 -1
+        "row_lengths": [每行单元格数...],
+        "extras": {"行,位置": [图片、嵌套表格等非文本内容]}
+    }
+
+标准化文本渲染时按列批量格式化单元格，并用NumPy计算首列连续相同值的分组（RSPAN）。
+columnar_to_rows 可还原为与 parse_table 相同的行结构。
+"""
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class ColumnarTableBuilder:
+    """
+    逐行收集 parse_table 的行结构，生成列式表示（与 TableSidecarWriter 接口相同）
+
+    用法:
+        builder = ColumnarTableBuilder()
+        parse_table(table, idx, image_references, images_dir, materializer, row_writer=builder)
+        table_item.update(builder.table_node())
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.cols = []
+        self.row_lengths = []
+        self.extras = {}
+        self.header_row = None
+
+    def write_row(self, row_nodes):
+        row_idx = len(self.row_lengths)
+        if self.header_row is None:
+            self.header_row = row_nodes
+        while len(self.texts) < len(row_nodes):
+            self.texts.append([""] * row_idx)
+            self.cols.append([-1] * row_idx)
+        for pos in range(len(self.texts)):
+            if pos >= len(row_nodes):
+                self.texts[pos].append("")
+                self.cols[pos].append(-1)
+                continue
+            cell = row_nodes[pos]
+            text = ""
+            others = []
+            for item in cell.get("content", []):
+                if item.get("type") == "text" and not text:
+                    text = item.get("text", "")
+                else:
+                    others.append(item)
+            self.texts[pos].append(text)
+            self.cols[pos].append(cell.get("col", pos))
+            if others:
+                # 与行结构中的节点共享，图片物化后的字段自动可见
+                self.extras[f"{row_idx},{pos}"] = others
+        self.row_lengths.append(len(row_nodes))
+
+    def close(self):
+        pass
+
+    def table_node(self):
+        """表格节点中代替 rows 的字段"""
+        return {
+            "row_count": len(self.row_lengths),
+            "column_count": len(self.texts),
+            "header_row": self.header_row or [],
+            "columnar": {
+                "texts": self.texts,
+                "cols": self.cols,
+                "row_lengths": self.row_lengths,
+                "extras": self.extras
+            }
+        }
+
+def columnar_to_rows(columnar):
+    """还原为 parse_table 的行结构"""
+    texts = columnar.get("texts", [])
+    cols = columnar.get("cols", [])
+    extras = columnar.get("extras", {})
+    rows = []
+    for row_idx, length in enumerate(columnar.get("row_lengths", [])):
+        row_nodes = []
+        for pos in range(length):
+            content = []
+            if texts[pos][row_idx]:
+                content.append({"type": "text", "text": texts[pos][row_idx]})
+            content.extend(extras.get(f"{row_idx},{pos}", []))
+            row_nodes.append({"type": "table_cell", "row": row_idx, "col": cols[pos][row_idx], "content": content})
+        rows.append(row_nodes)
+    return rows
+
+def run_starts(values):
+    """
+    首列分组的起始下标：值与上一行相同且非空时并入上一组
+
+    Returns:
+        list: 每组起始下标（升序）
+    """
+    count = len(values)
+    if count == 0:
+        return []
+    if np is None:
+        return [i for i in range(count) if i == 0 or not values[i] or values[i] != values[i - 1]]
+    _, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+    codes = codes.reshape(-1)
+    empty = np.fromiter((not v for v in values), dtype=bool, count=count)
+    breaks = np.empty(count, dtype=bool)
+    breaks[0] = True
+    breaks[1:] = (codes[1:] != codes[:-1]) | empty[1:]
+    return np.flatnonzero(breaks).tolist()
@@ -0,0 +1,128 @@
+"""
+超大表格的旁路文件（sidecar）
+
+行数超过阈值的表格不再以嵌套字典的形式放入 document.json，而是在解析时逐行写入
+输出目录下的 tables/table_XXXX.jsonl（每行一个JSON数组，与 "rows" 中的一行结构相同）。
+document.json 中的表格节点只保留:
+    {"type": "table", "index": 3, "sidecar": "tables/table_0003.jsonl",
+     "row_count": 100000, "column_count": 8, "header_row": [...]}
+
+单元格图片在文档遍历结束后才物化，含图片的行在写出时暂存，物化后由 finalize() 回写。
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+TABLE_SIDECAR_DIR = "tables"
+
+def _row_has_images(row_nodes):
+    return any(
+        isinstance(item, dict) and item.get("type") == "image"
+        for cell in row_nodes if isinstance(cell, dict)
+        for item in cell.get("content", [])
+    )
+
+class TableSidecarWriter:
+    """
+    逐行写出表格到JSONL旁路文件
+
+    用法:
+        sidecar = TableSidecarWriter(output_dir, table_idx)
+        for row_nodes in rows:
+            sidecar.write_row(row_nodes)
+        sidecar.close()
+        table_item.update(sidecar.table_node())
+        ...
+        sidecar.finalize()   # 图片物化后回写含图片的行
+    """
+
+    def __init__(self, output_dir, table_idx):
+        self.output_dir = output_dir
+        self.rel_path = f"{TABLE_SIDECAR_DIR}/table_{table_idx:04d}.jsonl"
+        self.path = os.path.join(output_dir, self.rel_path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.row_count = 0
+        self.column_count = 0
+        self.header_row = None
+        self._pending = {}  # 行号 -> 含待物化图片的行
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def write_row(self, row_nodes):
+        if self.header_row is None:
+            self.header_row = row_nodes
+        if _row_has_images(row_nodes):
+            self._pending[self.row_count] = row_nodes
+        self._file.write(json.dumps(row_nodes, ensure_ascii=False))
+        self._file.write("\n")
+        self.row_count += 1
+        self.column_count = max(self.column_count, len(row_nodes))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def table_node(self):
+        """表格节点中代替 rows 的字段"""
+        return {
+            "sidecar": self.rel_path,
+            "row_count": self.row_count,
+            "column_count": self.column_count,
+            "header_row": self.header_row or []
+        }
+
+    def finalize(self):
+        """用物化后的图片字段回写含图片的行"""
+        self.close()
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = {}
+        rewrite_sidecar_rows(self.output_dir, self.table_node(), lambda row_idx, row: pending.get(row_idx, row))
+
+def iter_sidecar_tables(node):
+    """遍历文档结构中使用旁路文件的表格节点"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if current.get("type") == "table" and current.get("sidecar"):
+                yield current
+                continue
+            stack.extend(v for v in current.values() if isinstance(v, (dict, list)))
+        elif isinstance(current, list):
+            stack.extend(v for v in current if isinstance(v, (dict, list)))
+
+def iter_sidecar_rows(output_dir, table_node):
+    """逐行读取表格旁路文件"""
+    path = os.path.join(output_dir, table_node["sidecar"])
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def rewrite_sidecar_rows(output_dir, table_node, update_row):
+    """
+    流式改写表格旁路文件
+
+    Args:
+        update_row: (行号, 行) -> 新的行，写回旁路文件
+    """
+    path = os.path.join(output_dir, table_node["sidecar"])
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+            row_idx = 0
+            for line in src:
+                if not line.strip():
+                    continue
+                dst.write(json.dumps(update_row(row_idx, json.loads(line)), ensure_ascii=False))
+                dst.write("\n")
+                row_idx += 1
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
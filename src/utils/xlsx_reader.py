@@ -0,0 +1,173 @@
+"""
+只读、流式的XLSX读取
+
+直接在ZIP成员流上用 iterparse 逐行读取工作表，每读完一行即清除已处理的元素，内存占用
+与工作表大小无关；只读取单元格的存储值（共享字符串、内联字符串、数字、布尔值和错误值
+的原始文本），不计算公式、不应用数字格式（日期保持为序列号）。
+"""
+
+import io
+import time
+import zipfile
+import logging
+import posixpath
+
+# 兼容性导入
+try:
+    from lxml import etree
+except ImportError:
+    try:
+        import xml.etree.ElementTree as etree
+    except ImportError:
+        from xml.etree import ElementTree as etree
+
+logger = logging.getLogger(__name__)
+
+_S_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_S_SI = f"{{{_S_NS}}}si"
+_S_T = f"{{{_S_NS}}}t"
+_S_SHEET = f"{{{_S_NS}}}sheet"
+_S_ROW = f"{{{_S_NS}}}row"
+_S_C = f"{{{_S_NS}}}c"
+_S_V = f"{{{_S_NS}}}v"
+_S_IS = f"{{{_S_NS}}}is"
+_R_ID = f"{{{_R_NS}}}id"
+_PKG_REL = f"{{{_PKG_REL_NS}}}Relationship"
+
+DEFAULT_XLSX_MAX_CELLS = 100000
+
+def _column_index(cell_ref):
+    """单元格引用（如 "AB12"）的列下标（从0开始）；无法解析时返回None"""
+    index = 0
+    seen = False
+    for ch in cell_ref or "":
+        if "A" <= ch <= "Z":
+            index = index * 26 + (ord(ch) - 64)
+            seen = True
+        elif "a" <= ch <= "z":
+            index = index * 26 + (ord(ch) - 96)
+            seen = True
+        else:
+            break
+    return index - 1 if seen else None
+
+def _text_of(elem):
+    """元素下所有 t 元素的文本（富文本的各个run拼接）"""
+    return "".join(t.text or "" for t in elem.iter(_S_T))
+
+def _clear(elem):
+    elem.clear()
+    # lxml：同时删除已处理的前序兄弟节点，避免根元素持有整张工作表
+    getprevious = getattr(elem, "getprevious", None)
+    if getprevious is not None:
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+def _read_shared_strings(archive, path):
+    strings = []
+    if path not in archive.namelist():
+        return strings
+    with archive.open(path) as stream:
+        for _, elem in etree.iterparse(stream, events=("end",)):
+            if elem.tag == _S_SI:
+                strings.append(_text_of(elem))
+                _clear(elem)
+    return strings
+
+def _read_relationships(archive, path):
+    targets = {}
+    if path not in archive.namelist():
+        return targets
+    base = posixpath.dirname(posixpath.dirname(path))
+    root = etree.fromstring(archive.read(path))
+    for rel in root.iter(_PKG_REL):
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target.lstrip("/")
+        else:
+            target = posixpath.normpath(posixpath.join(base, target))
+        targets[rel.get("Id")] = target
+    return targets
+
+def _cell_value(cell, shared_strings):
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        is_elem = cell.find(_S_IS)
+        return _text_of(is_elem) if is_elem is not None else ""
+    v_elem = cell.find(_S_V)
+    value = v_elem.text if v_elem is not None and v_elem.text is not None else ""
+    if cell_type == "s" and value:
+        try:
+            return shared_strings[int(value)]
+        except (ValueError, IndexError):
+            return ""
+    if cell_type == "b":
+        return "TRUE" if value == "1" else "FALSE" if value else ""
+    return value
+
+def read_xlsx(source, max_cells=DEFAULT_XLSX_MAX_CELLS, deadline=None):
+    """
+    流式读取XLSX中全部工作表的单元格值
+
+    Args:
+        source: XLSX的字节内容、文件路径或文件对象
+        max_cells: 读取的单元格总数上限，超出后停止读取
+        deadline: 可选的 time.monotonic() 截止时间，超时后停止读取
+
+    Returns:
+        dict: {"sheets": [{"name", "rows": [[值...]...], "row_count"}...]}；因上限或超时
+            提前停止时带 "truncated": "max_cells" / "time_budget"
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    workbook = {"sheets": []}
+    cells_left = max_cells
+    with zipfile.ZipFile(source) as archive:
+        shared_strings = _read_shared_strings(archive, "xl/sharedStrings.xml")
+        targets = _read_relationships(archive, "xl/_rels/workbook.xml.rels")
+        sheets = [(sheet.get("name", ""), targets.get(sheet.get(_R_ID)))
+                  for sheet in etree.fromstring(archive.read("xl/workbook.xml")).iter(_S_SHEET)]
+        for name, path in sheets:
+            if not path or path not in archive.namelist():
+                logger.warning(f"工作表 {name} 的部件不存在，跳过")
+                continue
+            rows = []
+            sheet_node = {"name": name, "rows": rows}
+            workbook["sheets"].append(sheet_node)
+            with archive.open(path) as stream:
+                for _, elem in etree.iterparse(stream, events=("end",)):
+                    if elem.tag != _S_ROW:
+                        continue
+                    try:
+                        row_idx = int(elem.get("r") or 0) - 1
+                    except ValueError:
+                        row_idx = -1
+                    row = []
+                    for cell in elem.iter(_S_C):
+                        col = _column_index(cell.get("r"))
+                        if col is None:
+                            col = len(row)
+                        if col > len(row):
+                            row.extend([""] * (col - len(row)))
+                        row.append(_cell_value(cell, shared_strings))
+                    _clear(elem)
+                    # 与行号对齐：跳过的空行补为空列表（计入单元格上限）
+                    if row_idx > len(rows):
+                        padding = min(row_idx - len(rows), max(cells_left, 0))
+                        rows.extend([] for _ in range(padding))
+                        cells_left -= padding
+                    rows.append(row)
+                    cells_left -= len(row)
+                    if cells_left <= 0:
+                        workbook["truncated"] = "max_cells"
+                        break
+                    if deadline is not None and time.monotonic() > deadline:
+                        workbook["truncated"] = "time_budget"
+                        break
+            sheet_node["row_count"] = len(rows)
+            if "truncated" in workbook:
+                break
+    return workbook
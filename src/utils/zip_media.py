@@ -0,0 +1,179 @@
+"""
+DOCX（ZIP）成员的字节范围定位与按需读取
+
+虚拟图片模式下，图片节点不再指向 images/ 下的文件，而是记录图片在原始DOCX中的位置:
+ZIP成员名、压缩方式、数据偏移、压缩后/原始大小和CRC。本模块负责生成这些信息，
+并能在需要时直接从原始文档中流式读回图片数据。
+
+提取图片时成员数据按固定大小的块流式写出，边写边计算哈希，单张图片的峰值内存
+只取决于块大小，与图片本身大小无关。
+"""
+
+import os
+import io
+import zlib
+import struct
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 流式读取的块大小
+CHUNK_SIZE = 1024 * 1024
+
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+_LOCAL_HEADER_SIZE = 30
+
+def member_name_from_partname(partname):
+    """将OPC部件名（如 /word/media/image1.png）转换为ZIP成员名"""
+    return str(partname).lstrip('/')
+
+def get_member_locations(zip_path, member_names=None):
+    """
+    获取ZIP成员数据在文件中的位置
+
+    Args:
+        zip_path: ZIP（DOCX）文件路径
+        member_names: 需要定位的成员名列表，None表示全部成员
+
+    Returns:
+        dict: 成员名 -> {"member", "compress_type", "offset", "compressed_size", "size", "crc32"}
+    """
+    locations = {}
+    with open(zip_path, 'rb') as raw, zipfile.ZipFile(raw) as zf:
+        infos = zf.infolist() if member_names is None else [
+            zf.getinfo(name) for name in member_names if name in zf.NameToInfo
+        ]
+        for info in infos:
+            # 本地文件头的扩展字段长度可能与中央目录不同，需要读取本地文件头
+            raw.seek(info.header_offset)
+            header = raw.read(_LOCAL_HEADER_SIZE)
+            if len(header) != _LOCAL_HEADER_SIZE or header[:4] != _LOCAL_HEADER_SIGNATURE:
+                logger.warning(f"ZIP成员 {info.filename} 的本地文件头无效")
+                continue
+            name_len, extra_len = struct.unpack_from('<HH', header, 26)
+            locations[info.filename] = {
+                "member": info.filename,
+                "compress_type": info.compress_type,
+                "offset": info.header_offset + _LOCAL_HEADER_SIZE + name_len + extra_len,
+                "compressed_size": info.compress_size,
+                "size": info.file_size,
+                "crc32": info.CRC
+            }
+    return locations
+
+def iter_virtual_image(docx_path, source, chunk_size=CHUNK_SIZE):
+    """
+    按块流式读取虚拟图片的原始数据
+
+    Args:
+        docx_path: 原始DOCX文件路径
+        source: 图片节点中的 source 字段（见 get_member_locations）
+        chunk_size: 每次读取的压缩数据大小
+
+    Yields:
+        bytes: 解压后的数据块
+    """
+    compress_type = source["compress_type"]
+    if compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        # 其他压缩方式交给zipfile处理
+        with zipfile.ZipFile(docx_path) as zf, zf.open(source["member"]) as member:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    crc = 0
+    remaining = source["compressed_size"]
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if compress_type == zipfile.ZIP_DEFLATED else None
+    with open(docx_path, 'rb') as f:
+        f.seek(source["offset"])
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                raise IOError(f"读取 {source['member']} 时文件提前结束")
+            remaining -= len(data)
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            if data:
+                crc = zlib.crc32(data, crc)
+                yield data
+        if decompressor is not None:
+            tail = decompressor.flush()
+            if tail:
+                crc = zlib.crc32(tail, crc)
+                yield tail
+    if "crc32" in source and crc != source["crc32"]:
+        raise IOError(f"{source['member']} 的CRC校验失败，原始文档可能已被修改")
+
+def read_virtual_image(docx_path, source):
+    """从原始DOCX中读取虚拟图片的完整数据"""
+    return b''.join(iter_virtual_image(docx_path, source))
+
+def open_virtual_image(docx_path, source):
+    """
+    以只读二进制流的形式打开虚拟图片（适用于 PIL.Image.open 等接口）
+
+    数据经 iter_virtual_image 完整读入内存并校验CRC，原始文档被修改时抛出 IOError
+    """
+    return io.BytesIO(read_virtual_image(docx_path, source))
+
+def copy_virtual_image(docx_path, source, dest_path, chunk_size=CHUNK_SIZE):
+    """将虚拟图片流式写出到文件，返回写出的字节数"""
+    written = 0
+    tmp_path = f"{dest_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out:
+            for chunk in iter_virtual_image(docx_path, source, chunk_size):
+                out.write(chunk)
+                written += len(chunk)
+        shutil.move(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return written
+
+def stream_member_to_dir(zip_file, member, dest_dir, suffix, chunk_size=CHUNK_SIZE):
+    """
+    将ZIP成员流式写出到目录，按内容哈希命名（img_<sha256前16位><suffix>）
+
+    数据先写入同目录下的临时文件，完成后再重命名到位；目标文件已存在时丢弃临时文件。
+
+    Args:
+        zip_file: 已打开的 zipfile.ZipFile
+        member: 成员名
+        dest_dir: 输出目录
+        suffix: 文件扩展名（含点号，如 ".png"）
+        chunk_size: 每次读取的块大小
+
+    Returns:
+        tuple: (sha256十六进制摘要, 字节数, 文件名)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as out, zip_file.open(member) as src:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        content_hash = hasher.hexdigest()
+        filename = f"img_{content_hash[:16]}{suffix}"
+        final_path = os.path.join(dest_dir, filename)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return content_hash, size, filename
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+测试批次级模板内容指纹：跨文档重复的段落和表格被识别、替换并可还原
+"""
+
+import io
+import os
+import sys
+import copy
+import json
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from PIL import Image
+from src.utils.boilerplate import BoilerplateIndex, apply_boilerplate, resolve_boilerplate_refs, fingerprint_block
+from src.utils.table_columnar import ColumnarTableBuilder
+from src.parsers.batch_processor import process_docx_folder
+from src.processors.text_processor import process_document_to_text
+
+LEGAL = "本文档版权归公司所有，未经许可不得复制、传播或用于其他用途。"
+
+def _make_document(k):
+    cover = {"type": "table", "index": 0, "rows": [[
+        {"type": "table_cell", "row": 0, "col": 0, "content": [{"type": "text", "text": "文档名称"}]},
+        {"type": "table_cell", "row": 0, "col": 1, "content": [{"type": "text", "text": "需求规格说明书  标准模板 V1.0"}]}
+    ]]}
+    return {"sections": [{"type": "section", "level": 0, "content": [
+        cover,
+        {"type": "section", "level": 1, "content": [
+            {"type": "paragraph", "text": LEGAL if k % 2 else f"  {LEGAL} "},
+            {"type": "paragraph", "text": f"独特内容 {k} " * 5}
+        ]}
+    ]}]}
+
+def test_boilerplate_detect_and_replace():
+    documents = [_make_document(k) for k in range(4)]
+    index = BoilerplateIndex(min_documents=3)
+    for k, document in enumerate(documents):
+        index.add_document(k, document)
+    fingerprints = index.boilerplate()
+    # 封面表格和法律声明（空白不同）各一个，独特段落不计入
+    assert len(fingerprints) == 2
+
+    report = index.report(replaced=True)
+    assert report["boilerplate_occurrences"] == 8
+    assert report["estimated_bytes_saved"] > 0
+
+    original = copy.deepcopy(documents[1])
+    shared = {}
+    assert apply_boilerplate(documents[1], fingerprints, replace=True, shared=shared) == 2
+    refs = [documents[1]["sections"][0]["content"][0], documents[1]["sections"][0]["content"][1]["content"][0]]
+    assert all(ref["type"] == "boilerplate_ref" for ref in refs)
+    assert refs[0]["index"] == 0
+    assert resolve_boilerplate_refs(documents[1], shared) == 2
+    assert documents[1] == original
+
+    # 指纹相同但空白不同的段落无法原样还原，只标记不替换
+    assert apply_boilerplate(documents[0], fingerprints, replace=True, shared=shared) == 2
+    cover, section = documents[0]["sections"][0]["content"]
+    assert cover["type"] == "boilerplate_ref"
+    assert section["content"][0]["type"] == "paragraph" and section["content"][0]["boilerplate"] in fingerprints
+
+def test_columnar_table_fingerprint():
+    """列式表格与按行保存的同一表格指纹相同"""
+    table = _make_document(0)["sections"][0]["content"][0]
+    builder = ColumnarTableBuilder()
+    for row in table["rows"]:
+        builder.write_row(row)
+    columnar = {"type": "table", "index": 0}
+    columnar.update(builder.table_node())
+    assert fingerprint_block(columnar) is not None
+    assert fingerprint_block(columnar) == fingerprint_block(table)
+
+def _make_docx(path, k):
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 20), (200, 0, 0)).save(buffer, "PNG")
+    buffer.seek(0)
+    doc = Document()
+    doc.add_heading("1 概述", 1)
+    doc.add_paragraph(LEGAL)
+    doc.add_paragraph(f"独特内容 {k} " * 5)
+    doc.add_heading("2 修订记录", 1)
+    table = doc.add_table(rows=2, cols=2)
+    for r in range(2):
+        for c in range(2):
+            table.cell(r, c).text = f"修订记录 第{r}行 第{c}列"
+    table.cell(1, 1).paragraphs[0].add_run().add_picture(buffer)
+    doc.save(path)
+
+def test_replaced_documents_render_unchanged():
+    """替换为引用后重新渲染 document.json，输出与 processed_text.txt 相同"""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "in")
+        output_dir = os.path.join(tmp, "out")
+        os.makedirs(input_dir)
+        for k in range(3):
+            _make_docx(os.path.join(input_dir, f"doc{k}.docx"), k)
+        process_docx_folder(input_dir, output_dir, boilerplate_min_documents=3, boilerplate_replace=True)
+        assert os.path.exists(os.path.join(output_dir, "boilerplate.json"))
+
+        refs = 0
+        for k in range(3):
+            doc_dir = os.path.join(output_dir, f"doc{k}")
+            with open(os.path.join(doc_dir, "document.json"), "r", encoding="utf-8") as f:
+                document_structure = json.load(f)
+            refs += json.dumps(document_structure, ensure_ascii=False).count('"boilerplate_ref"')
+            with open(os.path.join(doc_dir, "processed_text.txt"), "r", encoding="utf-8") as f:
+                expected = f.read()
+            assert LEGAL in expected
+            assert process_document_to_text(document_structure, f"doc{k}", doc_dir) == expected
+        assert refs > 0
+
+if __name__ == "__main__":
+    test_boilerplate_detect_and_replace()
+    test_columnar_table_fingerprint()
+    test_replaced_documents_render_unchanged()
+    print("✅ 模板内容指纹测试通过")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+测试嵌入文档解析：嵌入的DOCX递归解析（共用图片目录），嵌入的XLSX流式读取，深度和时间预算限制；
+嵌入对象id由载荷内容得出
+"""
+
+import io
+import os
+import hashlib
+import sys
+import zipfile
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from docx.oxml import parse_xml
+from PIL import Image
+from src.parsers.document_parser import parse_docx
+from src.extractors.embedded_parser import DOCX_CONTENT_TYPE, XLSX_CONTENT_TYPE
+from src.extractors.smartart_extractor import EmbeddedObjectCache
+from src.utils.xlsx_reader import read_xlsx
+
+_S = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+def _make_xlsx():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("xl/workbook.xml",
+                         f'<workbook xmlns="{_S}" xmlns:r="{_R}"><sheets>'
+                         f'<sheet name="参数" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr("xl/_rels/workbook.xml.rels",
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Type="worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+        archive.writestr("xl/sharedStrings.xml",
+                         f'<sst xmlns="{_S}"><si><t>名称</t></si><si><r><t>超时</t></r><r><t>时间</t></r></si></sst>')
+        archive.writestr("xl/worksheets/sheet1.xml",
+                         f'<worksheet xmlns="{_S}"><sheetData>'
+                         f'<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1" t="inlineStr"><is><t>备注</t></is></c></row>'
+                         f'<row r="3"><c r="A3" t="s"><v>1</v></c><c r="B3"><v>30</v></c><c r="C3" t="b"><v>1</v></c></row>'
+                         f'</sheetData></worksheet>')
+    return buffer.getvalue()
+
+def _embed(doc, blob, part_name, content_type, prog_id):
+    part = Part(PackURI(part_name), content_type, blob, doc.part.package)
+    r_id = doc.part.relate_to(part, RT.PACKAGE)
+    paragraph = doc.add_paragraph()
+    paragraph._p.append(parse_xml(
+        '<w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+        'xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office" '
+        f'xmlns:r="{_R}"><w:object><v:shape id="s1" style="width:100pt;height:50pt"/>'
+        f'<o:OLEObject Type="Embed" ProgID="{prog_id}" ShapeID="s1" r:id="{r_id}"/></w:object></w:r>'
+    ))
+
+def _make_docx(path, image_path):
+    inner = Document()
+    inner.add_paragraph("嵌入文档正文")
+    inner.add_paragraph().add_run().add_picture(image_path)
+    _embed(inner, _make_xlsx(), "/word/embeddings/Microsoft_Excel_Worksheet.xlsx", XLSX_CONTENT_TYPE,
+           "Excel.Sheet.12")
+    inner_buffer = io.BytesIO()
+    inner.save(inner_buffer)
+
+    outer = Document()
+    outer.add_paragraph("外层文档")
+    _embed(outer, inner_buffer.getvalue(), "/word/embeddings/Microsoft_Word_Document.docx", DOCX_CONTENT_TYPE,
+           "Word.Document.12")
+    outer.save(path)
+
+def _find_all(node, node_type):
+    """查找节点（不进入嵌入文档）"""
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if current.get("type") == node_type:
+                found.append(current)
+            stack.extend(v for k, v in current.items() if k != "embedded_document")
+        elif isinstance(current, list):
+            stack.extend(current)
+    return found
+
+def test_read_xlsx():
+    workbook = read_xlsx(_make_xlsx())
+    assert workbook["sheets"] == [{"name": "参数", "rows": [["名称", "", "备注"], [], ["超时时间", "30", "TRUE"]],
+                                   "row_count": 3}]
+    assert read_xlsx(_make_xlsx(), max_cells=2)["truncated"] == "max_cells"
+
+def test_embedded_documents():
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "inner.png")
+        Image.new("RGB", (30, 20), (10, 120, 10)).save(image_path)
+        docx_path = os.path.join(tmp, "outer.docx")
+        _make_docx(docx_path, image_path)
+
+        # 默认不解析嵌入文档
+        plain = parse_docx(docx_path, os.path.join(tmp, "plain"))
+        (obj,) = _find_all(plain, "embedded_object")
+        assert obj["object_type"] == "word" and "embedded_document" not in obj
+
+        out_dir = os.path.join(tmp, "deep")
+        result = parse_docx(docx_path, out_dir, embedded_max_depth=2)
+        (obj,) = _find_all(result, "embedded_object")
+        # 嵌入解析不改变对象id
+        assert obj["id"] == _find_all(plain, "embedded_object")[0]["id"]
+        inner = obj["embedded_document"]
+        texts = [p["text"] for p in _find_all(inner, "paragraph")]
+        assert "嵌入文档正文" in texts
+        # 嵌入文档的图片写入外层文档的 images/ 目录
+        images = _find_all(inner, "image")
+        assert images and all(os.path.exists(os.path.join(out_dir, image["url"])) for image in images)
+        (sheet_obj,) = _find_all(inner, "embedded_object")
+        assert sheet_obj["embedded_workbook"]["sheets"][0]["rows"][2] == ["超时时间", "30", "TRUE"]
+
+        # 深度限制：第二层嵌入对象不解析
+        shallow = parse_docx(docx_path, os.path.join(tmp, "shallow"), embedded_max_depth=1)
+        (obj,) = _find_all(shallow, "embedded_object")
+        (sheet_obj,) = _find_all(obj["embedded_document"], "embedded_object")
+        assert "embedded_workbook" not in sheet_obj
+
+        # 时间预算耗尽：不再开始解析
+        skipped = parse_docx(docx_path, os.path.join(tmp, "skipped"), embedded_max_depth=2, embedded_time_budget=0)
+        (obj,) = _find_all(skipped, "embedded_object")
+        assert obj["embedded_skipped"] == "time_budget"
+
+def test_content_based_object_ids():
+    with tempfile.TemporaryDirectory() as tmp:
+        # 同一文档中两个大小相同、内容不同的载荷；另一文档嵌入相同的第一个载荷
+        first, second = Document(), Document()
+        _embed(first, b"A" * 64, "/word/embeddings/oleObject1.bin", "application/vnd.ms-office.oleObject",
+               "Package")
+        _embed(first, b"B" * 64, "/word/embeddings/oleObject2.bin", "application/vnd.ms-office.oleObject",
+               "Package")
+        _embed(second, b"A" * 64, "/word/embeddings/oleObject7.bin", "application/vnd.ms-office.oleObject",
+               "Package")
+        first.save(os.path.join(tmp, "first.docx"))
+        second.save(os.path.join(tmp, "second.docx"))
+
+        batch_cache = EmbeddedObjectCache()
+        ids = []
+        for name in ("first", "second"):
+            result = parse_docx(os.path.join(tmp, f"{name}.docx"), os.path.join(tmp, name),
+                                embedded_cache=batch_cache)
+            ids.append([obj["id"] for obj in _find_all(result, "embedded_object")])
+        assert len(set(ids[0])) == 2
+        assert len(ids[1]) == 1 and ids[1][0] in ids[0]
+        report = batch_cache.report()
+        assert report["unique_objects"] == 2 and report["occurrences"] == 3
+        assert report["cross_document_objects"] == 1 and report["duplicate_payload_bytes"] == 64
+
+        # 载荷摘要按ZIP成员在批次内缓存：两个文档中相同的载荷只哈希一次
+        assert len(batch_cache.digests) == 2
+        reuse_cache = EmbeddedObjectCache()
+        parse_docx(os.path.join(tmp, "first.docx"), os.path.join(tmp, "reuse1"), embedded_cache=reuse_cache)
+        for key in reuse_cache.digests:
+            reuse_cache.digests[key] = hashlib.sha256(repr(key).encode()).digest()
+        reused = parse_docx(os.path.join(tmp, "second.docx"), os.path.join(tmp, "reuse2"), embedded_cache=reuse_cache)
+        (obj,) = _find_all(reused, "embedded_object")
+        assert obj["id"] != ids[1][0]
+
+if __name__ == "__main__":
+    test_read_xlsx()
+    test_embedded_documents()
+    test_content_based_object_ids()
+    print("✅ 嵌入文档解析测试通过")
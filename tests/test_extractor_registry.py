@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+测试提取器注册表：按标签和 graphicData uri 分发、按注册顺序输出、未匹配的提取器不被调用
+"""
+
+import os
+import sys
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx.oxml import parse_xml
+from src.extractors.extractor_registry import ExtractorRegistry, default_registry
+
+_CHART_URI = "http://schemas.openxmlformats.org/drawingml/2006/chart"
+
+_RUN = (
+    '<w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+    '<w:drawing><a:graphic><a:graphicData uri="' + _CHART_URI + '"/></a:graphic></w:drawing>'
+    '<w:t>图表</w:t></w:r>'
+)
+
+def test_dispatch_by_tag_and_uri():
+    calls = []
+
+    def charts(elements, context="", **_):
+        calls.append(("chart", len(elements)))
+        return [{"type": "chart", "context": context}]
+
+    def texts(elements, **_):
+        calls.append(("text", len(elements)))
+        return [{"type": "text", "text": e.text} for e in elements]
+
+    def never(elements, **_):
+        calls.append(("never", len(elements)))
+        return []
+
+    registry = ExtractorRegistry()
+    registry.register("text", texts, tags=["{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t"])
+    registry.register("never", never, tags=["{urn:unused}x"], uris=["urn:unused"])
+    registry.register("chart", charts, uris=[_CHART_URI])
+
+    nodes = registry.extract(parse_xml(_RUN), context="段落")
+    assert nodes == [{"type": "text", "text": "图表"}, {"type": "chart", "context": "段落"}]
+    assert calls == [("text", 1), ("chart", 1)]
+    timings = registry.timings()
+    assert timings["chart"]["calls"] == 1 and timings["chart"]["nodes"] == 1
+    assert timings["never"]["calls"] == 0
+    before = registry.timings()
+    registry.extract(parse_xml(_RUN))
+    assert registry.timings(since=before)["text"]["calls"] == 1
+
+def test_default_registry_ignores_unmatched_runs():
+    registry = default_registry()
+    assert registry.names == ["picture", "diagram", "ole"]
+    assert registry.extract(parse_xml(_RUN)) == []
+    assert all(stats["calls"] == 0 for stats in registry.timings().values())
+
+if __name__ == "__main__":
+    test_dispatch_by_tag_and_uri()
+    test_default_registry_ignores_unmatched_runs()
+    print("✅ 提取器注册表测试通过")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+测试感知哈希近似重复图片聚类
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.utils import image_dedup
+from src.utils.image_dedup import cluster_hashes, find_near_duplicates
+
+def test_cluster_hashes():
+    """汉明距离不超过阈值的哈希聚为一簇，宽高比不同的不合并"""
+    base = np.uint64(0x0F0F_F0F0_1234_5678)
+    hashes = np.array([base, base ^ np.uint64(0b101), base ^ np.uint64(0xFF), base, base], dtype=np.uint64)
+    aspects = np.array([0, 0, 0, 0, 5], dtype=np.int64)
+    labels = cluster_hashes(hashes, aspects, threshold=4)
+    assert labels.tolist() == [0, 0, 2, 0, 4]
+
+def test_cluster_hashes_no_chaining():
+    """每个成员都必须接近簇的规范哈希，逐步偏移的哈希链不会被合并成一簇"""
+    base = np.uint64(0x0F0F_F0F0_1234_5678)
+    chain = [base ^ np.uint64(mask) for mask in (0, 0xF, 0xFF, 0xFFF, 0xFFFF)]
+    labels = cluster_hashes(np.array(chain, dtype=np.uint64), np.zeros(5, dtype=np.int64), threshold=4)
+    assert labels.tolist() == [0, 0, 2, 2, 4]
+
+    # 出现次数最多的哈希作为规范哈希
+    hashes = np.array([chain[1], chain[0], chain[0], chain[2]], dtype=np.uint64)
+    labels = cluster_hashes(hashes, np.zeros(4, dtype=np.int64), threshold=4)
+    assert labels.tolist() == [0, 0, 0, 3]
+
+def test_degenerate_bucket_cap():
+    """分段值大量相同的退化桶被跳过，其他分段仍能找到近似重复"""
+    rng = np.random.RandomState(1)
+    # 低16位全为0，第0段落入同一个桶
+    spread = [np.uint64(int(v) << 16) for v in rng.randint(1, 2 ** 47, size=40, dtype=np.int64)]
+    hashes = np.array(spread + [spread[0] ^ np.uint64(1 << 40)], dtype=np.uint64)
+    original = image_dedup._MAX_BUCKET_SIZE
+    image_dedup._MAX_BUCKET_SIZE = 8
+    try:
+        labels = cluster_hashes(hashes, np.zeros(len(hashes), dtype=np.int64), threshold=4)
+    finally:
+        image_dedup._MAX_BUCKET_SIZE = original
+    assert labels[-1] == 0
+    assert len(set(labels[:-1].tolist())) == 40
+
+def test_find_near_duplicates():
+    """同一图片不同JPEG质量视为近似重复，规范图片取像素最多的一张"""
+    logo = Image.new("RGB", (200, 80), "white")
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse((5, 5, 75, 75), fill="red")
+    draw.rectangle((90, 20, 190, 60), fill="navy")
+    noise = Image.fromarray((np.random.RandomState(0).rand(80, 200, 3) * 255).astype("uint8"))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, name) for name in ("a.jpg", "b.jpg", "big.png", "noise.png")]
+        logo.save(paths[0], quality=95)
+        logo.save(paths[1], quality=40)
+        logo.resize((400, 160)).save(paths[2])
+        noise.save(paths[3])
+        mapping = find_near_duplicates(paths, threshold=6)
+    assert mapping == {paths[0]: paths[2], paths[1]: paths[2]}
+
+if __name__ == "__main__":
+    test_cluster_hashes()
+    test_cluster_hashes_no_chaining()
+    test_degenerate_bucket_cap()
+    test_find_near_duplicates()
+    print("✅ 近似重复图片测试通过")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试图片延迟物化：defer/attach 登记的节点在 materialize() 后补全字段，
+materialize_images=False 时节点只保留部件引用
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from PIL import Image
+from src.extractors.image_materializer import ImageMaterializer
+from src.parsers.document_parser import parse_docx
+
+class _FakePart:
+    def __init__(self, partname, blob, content_type="image/png"):
+        self.partname = partname
+        self.blob = blob
+        self.content_type = content_type
+
+def _png_bytes(color, size=(12, 8)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def _find_all(node, node_type):
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if current.get("type") == node_type:
+                found.append(current)
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return found
+
+def test_defer_attach_materialize():
+    with tempfile.TemporaryDirectory() as tmp:
+        images_dir = os.path.join(tmp, "images")
+        references = {}
+        materializer = ImageMaterializer(images_dir, references)
+        red = _FakePart("/word/media/image1.png", _png_bytes((255, 0, 0)))
+        red_copy = _FakePart("/word/media/image2.png", red.blob)
+        first = materializer.defer(red, "rId1", "段落")
+        again = materializer.defer(red, "rId1", "段落")
+        copy = materializer.defer(red_copy, "rId2", "段落")
+        cell = materializer.attach({"type": "image"}, first)
+        assert set(first) == {"type", "part_name", "r_id", "format", "context"} and "url" not in first
+        assert materializer.unique_parts == 2 and materializer.pending == 4
+
+        assert materializer.materialize() == 4
+        for node in (first, again, copy):
+            assert node["url"].startswith("images/img_") and node["format"] == "png"
+            assert (node["width"], node["height"]) == (12, 8) and node["size"].endswith(" KB")
+            assert "part_name" not in node and "r_id" not in node and node["context"] == "段落"
+        # 内容相同的部件写出为同一个文件
+        assert copy["url"] == first["url"] and os.listdir(images_dir) == [os.path.basename(first["url"])]
+        # 精简节点只有摘要字段，不登记到 image_references
+        assert cell["url"] == first["url"] and "context" not in cell and "part_name" not in cell
+        assert list(references) == [os.path.splitext(os.path.basename(first["url"]))[0]]
+
+        # 源节点已物化后再 attach：直接复制字段
+        late = materializer.attach({"type": "image"}, first)
+        assert late["url"] == first["url"] and materializer.pending == 0
+
+def test_parse_without_materialization():
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "blue.png")
+        with open(image_path, "wb") as f:
+            f.write(_png_bytes((0, 0, 255)))
+        document = Document()
+        document.add_paragraph().add_run().add_picture(image_path)
+        docx_path = os.path.join(tmp, "doc.docx")
+        document.save(docx_path)
+
+        out_dir = os.path.join(tmp, "out")
+        result = parse_docx(docx_path, out_dir, materialize_images=False)
+        (image,) = _find_all(result["sections"], "image")
+        assert image["part_name"] == "/word/media/image1.png" and image["r_id"].startswith("rId")
+        assert "url" not in image and "size" not in image
+        assert result["processing_info"]["images_materialized"] is False
+        assert not os.path.exists(os.path.join(out_dir, "images")) or not os.listdir(os.path.join(out_dir, "images"))
+
+if __name__ == "__main__":
+    test_defer_attach_materialize()
+    test_parse_without_materialization()
+    print("✅ 图片延迟物化测试通过")
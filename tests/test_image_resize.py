@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+测试图片尺寸上限与降采样：上限判断、按最长边和字节上限缩小、格式转换、多帧图片跳过，
+以及降采样不遗留打开的文件句柄
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+from src.utils.image_resize import ImageLimits, limit_image_file, _load_scaled
+
+def _noise(path, size, fmt):
+    Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(path, fmt)
+
+def test_limits():
+    assert not ImageLimits().active
+    limits = ImageLimits(max_dimension=100, max_bytes=1000)
+    assert limits.needs_processing("png", 200, 50, 10)
+    assert limits.needs_processing("png", 50, 50, 5000)
+    assert not limits.needs_processing("png", 100, 80, 1000)
+    assert not limits.needs_processing("svg", 5000, 5000, 10 ** 7)
+    converting = ImageLimits(target_format="JPEG")
+    assert converting.output_format("png") == "jpg" and converting.needs_processing("png", 1, 1, 1)
+    assert not converting.needs_processing("jpg", 1, 1, 1)
+    try:
+        ImageLimits(target_format="psd")
+        assert False, "应当拒绝不支持的格式"
+    except ValueError:
+        pass
+
+def test_downsample_and_convert():
+    with tempfile.TemporaryDirectory() as tmp:
+        png_path = os.path.join(tmp, "big.png")
+        _noise(png_path, (800, 400), "PNG")
+        result = limit_image_file(png_path, "png", ImageLimits(max_dimension=100), png_path)
+        assert (result["width"], result["height"]) == (100, 50)
+        assert (result["original_width"], result["original_height"]) == (800, 400)
+        with Image.open(png_path) as img:
+            assert img.size == (100, 50)
+
+        # 字节上限：在尺寸上限之内继续按比例缩小，并转换为JPEG
+        jpg_src = os.path.join(tmp, "photo.jpg")
+        _noise(jpg_src, (1200, 900), "JPEG")
+        jpg_dest = os.path.join(tmp, "photo_small.jpg")
+        limits = ImageLimits(max_dimension=600, max_bytes=20 * 1024)
+        result = limit_image_file(jpg_src, "jpg", limits, jpg_dest)
+        assert result["width"] <= 600 and result["size_bytes"] == os.path.getsize(jpg_dest)
+        assert result["size_bytes"] <= 20 * 1024 or min(result["width"], result["height"]) <= 16
+
+        rgba = os.path.join(tmp, "alpha.png")
+        Image.new("RGBA", (50, 50), (0, 0, 255, 128)).save(rgba)
+        result = limit_image_file(rgba, "png", ImageLimits(target_format="jpg"), os.path.join(tmp, "alpha.jpg"))
+        with Image.open(os.path.join(tmp, "alpha.jpg")) as img:
+            assert img.format == "JPEG" and img.mode == "RGB" and result["width"] == 50
+
+        # 调色板图片（reduce 不支持的模式）
+        palette_path = os.path.join(tmp, "palette.png")
+        Image.new("RGB", (400, 200), (0, 120, 0)).convert("P").save(palette_path)
+        result = limit_image_file(palette_path, "png", ImageLimits(max_dimension=100), palette_path)
+        assert (result["width"], result["height"]) == (100, 50)
+
+        # 多帧图片不处理，原文件保持不变
+        gif_path = os.path.join(tmp, "anim.gif")
+        frames = [Image.new("RGB", (300, 300), (80 * i, 0, 0)) for i in range(3)]
+        frames[0].save(gif_path, save_all=True, append_images=frames[1:])
+        assert limit_image_file(gif_path, "gif", ImageLimits(max_dimension=50), gif_path) is None
+        with Image.open(gif_path) as img:
+            assert img.size == (300, 300)
+
+def test_no_leaked_file_handles():
+    if not os.path.isdir("/proc/self/fd"):
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        png_path = os.path.join(tmp, "big.png")
+        _noise(png_path, (400, 400), "PNG")
+        before = len(os.listdir("/proc/self/fd"))
+        for _ in range(20):
+            with _load_scaled(png_path, (50, 50)) as img:
+                assert img.size == (50, 50)
+        assert len(os.listdir("/proc/self/fd")) <= before
+
+if __name__ == "__main__":
+    test_limits()
+    test_downsample_and_convert()
+    test_no_leaked_file_handles()
+    print("✅ 图片降采样测试通过")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试图片转码：转码结果不更小时保留原文件，文档结构中的 url/format/size 与 preview_image
+以及表格旁路文件中的单元格图片同步改写
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+from src.utils.image_transcoder import ImageTranscoder, transcode_image_file
+from src.utils.table_sidecar import TableSidecarWriter, iter_sidecar_rows
+
+def _solid_png(path):
+    Image.new("RGB", (400, 400), (0, 100, 200)).save(path, "PNG")
+
+def _checkerboard_png(path):
+    # 1位棋盘格在PNG中极小，转为WebP后反而更大
+    img = Image.new("1", (256, 256))
+    img.putdata([(x + y) % 2 for y in range(256) for x in range(256)])
+    img.save(path, "PNG")
+
+def test_skip_if_larger():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "checker.png")
+        _checkerboard_png(src)
+        size = os.path.getsize(src)
+        dest = os.path.join(tmp, "checker.webp")
+        assert transcode_image_file(src, dest, "webp", 80) == (False, size, size)
+        assert os.path.exists(src) and not os.path.exists(dest)
+        assert not os.path.exists(f"{dest}.tmp")
+
+        # 关闭 skip_if_larger 时即使更大也采用转码结果
+        ok, before, after = transcode_image_file(src, dest, "webp", 80, skip_if_larger=False)
+        assert ok and after > before and os.path.exists(dest) and not os.path.exists(src)
+
+def test_transcode_document_rewrites_refs():
+    with tempfile.TemporaryDirectory() as tmp:
+        images_dir = os.path.join(tmp, "images")
+        os.makedirs(images_dir)
+        _solid_png(os.path.join(images_dir, "a.png"))
+        _checkerboard_png(os.path.join(images_dir, "b.png"))
+        Image.new("RGB", (200, 200), (30, 30, 30)).save(os.path.join(images_dir, "c.bmp"), "BMP")
+
+        sidecar = TableSidecarWriter(tmp, 0)
+        sidecar.write_row([{"content": [{"type": "text", "content": "H"}]}])
+        sidecar.write_row([{"content": [{"type": "image", "url": "images/c.bmp", "format": "bmp"}]}])
+        sidecar.close()
+        table = {"type": "table", "index": 0}
+        table.update(sidecar.table_node())
+
+        image_a = {"type": "image", "url": "images/a.png", "format": "png", "size": "1.00 KB"}
+        image_b = {"type": "image", "url": "images/b.png", "format": "png", "size": "0.10 KB"}
+        embedded = {"type": "embedded_object", "preview_image": "images/a.png"}
+        document = {"sections": [{"content": [image_a, image_b, embedded, table]}]}
+
+        transcoder = ImageTranscoder("webp", max_workers=1)
+        try:
+            assert transcoder.transcode_document(document, tmp) == 2
+        finally:
+            transcoder.shutdown()
+
+        a_size = os.path.getsize(os.path.join(images_dir, "a.webp"))
+        assert image_a == {"type": "image", "url": "images/a.webp", "format": "webp",
+                           "size": f"{a_size/1024:.2f} KB"}
+        # 嵌入对象的预览图只改写路径
+        assert embedded == {"type": "embedded_object", "preview_image": "images/a.webp"}
+        # 转码后更大的图片保持不变
+        assert image_b["url"] == "images/b.png" and image_b["format"] == "png"
+        assert sorted(os.listdir(images_dir)) == ["a.webp", "b.png", "c.webp"]
+
+        rows = list(iter_sidecar_rows(tmp, table))
+        assert rows[0] == [{"content": [{"type": "text", "content": "H"}]}]
+        (cell_image,) = rows[1][0]["content"]
+        assert cell_image["url"] == "images/c.webp" and cell_image["format"] == "webp"
+
+        summary = transcoder.summary()
+        assert summary["files_considered"] == 3 and summary["files_transcoded"] == 2
+        assert summary["bytes_saved"] == summary["bytes_before"] - summary["bytes_after"]
+
+if __name__ == "__main__":
+    test_skip_if_larger()
+    test_transcode_document_rewrites_refs()
+    print("✅ 图片转码测试通过")
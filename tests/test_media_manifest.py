@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+测试媒体清单：解析流程与增强图片提取器共用清单时每个媒体成员只读取一次，
+图片关系分析只统计图片类型的关系并保持关系文件中的顺序
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from PIL import Image
+from src.parsers.document_parser import parse_docx
+from src.extractors.enhanced_image_extractor import extract_all_images_from_docx, analyze_image_relationships
+from src.utils.media_manifest import MediaManifest
+
+_OTHER_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/attachedTemplate"
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 10), color).save(buffer, "PNG")
+    buffer.seek(0)
+    return buffer
+
+def _make_docx(path):
+    document = Document()
+    document.add_paragraph().add_run().add_picture(_png((255, 0, 0)))
+    document.add_paragraph().add_run().add_picture(_png((0, 255, 0)))
+    document.sections[0].header.paragraphs[0].add_run().add_picture(_png((0, 0, 255)))
+    # word/media/ 下只被非图片关系引用的成员不应计入图片关系
+    extra = Part(PackURI("/word/media/extra.bin"), "application/octet-stream", b"\0" * 16, document.part.package)
+    document.part.relate_to(extra, _OTHER_RELTYPE)
+    document.save(path)
+
+def _count_opens(manifest):
+    opened = []
+    original = manifest._zip.open
+
+    def _open(name, *args, **kwargs):
+        opened.append(getattr(name, "filename", name))
+        return original(name, *args, **kwargs)
+
+    manifest._zip.open = _open
+    return opened
+
+def test_shared_manifest_reads_each_member_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        docx_path = os.path.join(tmp, "doc.docx")
+        _make_docx(docx_path)
+        out_dir = os.path.join(tmp, "out")
+        with MediaManifest(docx_path) as manifest:
+            opened = _count_opens(manifest)
+            result = parse_docx(docx_path, out_dir, media_manifest=manifest)
+            extracted = extract_all_images_from_docx(docx_path, os.path.join(out_dir, "images"), media_manifest=manifest)
+            members = manifest.media_members()
+            assert len(members) == 4 and len(extracted) == 4
+            assert sorted(opened) == sorted(members)
+            # 两条流程写出的是同一批文件
+            urls = {f"images/{info['filename']}" for info in extracted}
+            assert {image["url"] for image in result["images"].values()} <= urls
+            assert len(os.listdir(os.path.join(out_dir, "images"))) == 4
+
+def test_analyze_image_relationships():
+    with tempfile.TemporaryDirectory() as tmp:
+        docx_path = os.path.join(tmp, "doc.docx")
+        _make_docx(docx_path)
+        with MediaManifest(docx_path) as manifest:
+            expected_body = [os.path.basename(member) for part, member in manifest.image_relationships
+                             if part == "word/document.xml"]
+            analysis = analyze_image_relationships(docx_path, manifest)
+        assert len(expected_body) == 2
+        assert analysis["document_relationships"] == expected_body
+        assert len(analysis["header_footer_relationships"]) == 1
+        assert len(analysis["media_files"]) == 4
+        assert "extra.bin" not in analysis["document_relationships"]
+        assert "word/_rels/document.xml.rels" in analysis["relationship_files"]
+        # 不提供清单时结果相同
+        assert analyze_image_relationships(docx_path) == analysis
+
+if __name__ == "__main__":
+    test_shared_manifest_reads_each_member_once()
+    test_analyze_image_relationships()
+    print("✅ 媒体清单测试通过")
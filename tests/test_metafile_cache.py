@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+测试EMF/WMF转换结果缓存：命中、未命中、按大小淘汰、负缓存过期，超时不写入负缓存；
+缓存在位图提取之前查询
+"""
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.metafile_cache import MetafileCache, STATUS_OK, STATUS_FAILED
+from src.utils import image_utils
+from src.utils.image_utils import _record_conversion, convert_emf_to_png, METAFILE_CONVERTER_VERSION
+from test_metafile_scanner import _make_emf
+
+def _png(tmp, name, size):
+    path = os.path.join(tmp, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+def test_hit_miss_and_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MetafileCache(os.path.join(tmp, "cache"), max_bytes=250)
+        assert cache.get("a", "v1") is None
+        cache.put("a", "v1", _png(tmp, "a.png", 100))
+        status, blob_path = cache.get("a", "v1")
+        assert status == STATUS_OK and os.path.getsize(blob_path) == 100
+        # 转换器版本不同视为未命中
+        assert cache.get("a", "v2") is None
+        dest = os.path.join(tmp, "copy.png")
+        assert cache.fetch("a", "v1", dest) == STATUS_OK and os.path.getsize(dest) == 100
+
+        cache.put("b", "v1", _png(tmp, "b.png", 100))
+        time.sleep(0.01)
+        cache.get("a", "v1")  # a 变为最近使用
+        cache.put("c", "v1", _png(tmp, "c.png", 100))
+        # 超过上限后淘汰最久未使用的 b
+        assert cache.get("b", "v1") is None
+        assert cache.get("a", "v1") is not None and cache.get("c", "v1") is not None
+        assert cache.total_bytes() <= 250
+        cache.close()
+
+def test_failure_expiry_and_timeouts():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MetafileCache(os.path.join(tmp, "cache"), failure_ttl=0.2)
+        cache.put_failure("bad", "v1")
+        assert cache.get("bad", "v1") == (STATUS_FAILED, None)
+        time.sleep(0.3)
+        # 过期后视为未命中，条目被删除
+        assert cache.get("bad", "v1") is None
+        # 过期的负缓存在写入时被清理
+        cache.put_failure("old", "v1")
+        time.sleep(0.3)
+        cache.put_failure("new", "v1")
+        count = cache._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        assert count == 1
+
+        # 超时（ok 为 None）不写入负缓存，失败（False）写入
+        _record_conversion(cache, "slow", None, None)
+        assert cache.get("slow", METAFILE_CONVERTER_VERSION) is None
+        _record_conversion(cache, "broken", None, False)
+        assert cache.get("broken", METAFILE_CONVERTER_VERSION) == (STATUS_FAILED, None)
+        cache.close()
+
+def test_cache_checked_before_bitmap_scan():
+    emf = _make_emf()
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MetafileCache(os.path.join(tmp, "cache"))
+        # 位图提取成功的结果写入缓存
+        first = convert_emf_to_png(emf, os.path.join(tmp, "doc1"), "obj", metafile_cache=cache)
+        assert first.endswith(".png")
+        status, _ = cache.get(hashlib.sha256(emf).hexdigest(), METAFILE_CONVERTER_VERSION)
+        assert status == STATUS_OK
+
+        # 命中缓存时不再解析图元文件
+        calls = []
+        original = image_utils.save_metafile_bitmap_as_png
+        image_utils.save_metafile_bitmap_as_png = lambda *args: calls.append(args) or False
+        try:
+            second = convert_emf_to_png(emf, os.path.join(tmp, "doc2"), "obj", metafile_cache=cache)
+        finally:
+            image_utils.save_metafile_bitmap_as_png = original
+        assert calls == [] and second == first
+        assert os.path.getsize(os.path.join(tmp, "doc2", second)) == os.path.getsize(os.path.join(tmp, "doc1", first))
+        cache.close()
+
+if __name__ == "__main__":
+    test_hit_miss_and_eviction()
+    test_failure_expiry_and_timeouts()
+    test_cache_checked_before_bitmap_scan()
+    print("✅ 转换缓存测试通过")
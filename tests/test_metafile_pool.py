@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试EMF/WMF转换进程池：回调写回、按分组等待、挂起的转换在截止时间后被终止，分派失败的次数有上限
+工作进程以 fork 方式启动，继承测试中替换的转换函数
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import src.utils.image_utils as image_utils
+from src.utils import metafile_pool
+from src.utils.metafile_pool import MetafileConversionPool, MAX_DISPATCH_ATTEMPTS
+
+def _fake_convert(src_path, png_path):
+    """文件名含 hang 时挂起，含 bad 时失败，否则写出PNG"""
+    name = os.path.basename(src_path)
+    if "hang" in name:
+        time.sleep(60)
+    if "bad" in name:
+        return False
+    with open(png_path, "wb") as f:
+        f.write(b"png")
+    return True
+
+@contextmanager
+def _run(tmp, names, timeout=1.0, max_workers=2):
+    original = image_utils.convert_metafile_file
+    image_utils.convert_metafile_file = _fake_convert
+    results = {}
+    lock = threading.Lock()
+
+    def _callback(name):
+        def _done(ok):
+            with lock:
+                results.setdefault(name, []).append(ok)
+        return _done
+
+    try:
+        pool = MetafileConversionPool(max_workers=max_workers, timeout=timeout,
+                                      mp_context=multiprocessing.get_context("fork"))
+        with pool:
+            for name, group in names:
+                pool.submit(os.path.join(tmp, name + ".emf"), os.path.join(tmp, name + ".png"),
+                            callback=_callback(name), group=group)
+            yield pool, results
+    finally:
+        image_utils.convert_metafile_file = original
+
+def test_callbacks_and_group_wait():
+    with tempfile.TemporaryDirectory() as tmp:
+        with _run(tmp, [("a", "doc1"), ("bad", "doc1"), ("c", "doc2"), ("a", "doc2")]) as (pool, results):
+            assert pool.wait(group="doc1", timeout=20)
+            # wait 返回时该分组的回调都已执行；相同目标的重复提交合并为一个任务，两个回调都被调用
+            assert results["a"] == [True, True] and results["bad"] == [False]
+            assert pool.wait(timeout=20)
+            assert results["c"] == [True]
+            assert os.path.exists(os.path.join(tmp, "c.png"))
+        assert pool.stats["submitted"] == 3 and pool.stats["failed"] == 1
+
+def test_deadline_kills_hanging_worker():
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.monotonic()
+        with _run(tmp, [("hang", "slow"), ("after", "fast")], timeout=0.5, max_workers=1) as (pool, results):
+            assert pool.wait(timeout=20)
+            elapsed = time.monotonic() - started
+        assert not results["hang"][0]
+        # 挂起的工作进程被杀死后重新拉起，后续任务照常完成
+        assert results["after"] == [True]
+        assert pool.stats["timed_out"] == 1
+        assert elapsed < 20
+
+class _BrokenPipeWorker:
+    """发送任务总是失败的工作进程"""
+
+    created = 0
+
+    def __init__(self, ctx):
+        _BrokenPipeWorker.created += 1
+        self.conn = self
+        self.task = None
+        self.deadline = None
+
+    def send(self, task):
+        raise BrokenPipeError("pipe closed")
+
+    def kill(self):
+        pass
+
+def test_dispatch_failures_are_bounded():
+    original = metafile_pool._Worker
+    metafile_pool._Worker = _BrokenPipeWorker
+    _BrokenPipeWorker.created = 0
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = MetafileConversionPool(max_workers=1)
+            pool.submit(os.path.join(tmp, "a.emf"), os.path.join(tmp, "a.png"), callback=results.append)
+            # 不再无限重试：达到上限后以失败结束
+            assert pool.wait(timeout=5)
+            pool.shutdown()
+    finally:
+        metafile_pool._Worker = original
+    assert results == [False]
+    assert _BrokenPipeWorker.created == MAX_DISPATCH_ATTEMPTS
+    assert pool.stats["failed"] == 1
+
+if __name__ == "__main__":
+    test_callbacks_and_group_wait()
+    test_deadline_kills_hanging_worker()
+    test_dispatch_failures_are_bounded()
+    print("✅ 转换进程池测试通过")
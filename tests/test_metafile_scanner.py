@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+测试EMF/WMF记录扫描器
+使用手工构造的图元文件验证位图提取和尺寸读取
+"""
+
+import io
+import os
+import sys
+import struct
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+
+from src.utils.metafile_scanner import scan_metafile, extract_single_bitmap, get_metafile_dimensions
+
+def _make_dib(width=3, height=2, color=(10, 200, 30)):
+    """生成 (BITMAPINFOHEADER, 像素数据)"""
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "BMP")
+    data = buf.getvalue()
+    return data[14:54], data[54:]
+
+def _make_emf(with_vector=False):
+    """构造只包含一条 EMR_STRETCHDIBITS 的EMF，可选追加一条矢量记录"""
+    bmi, bits = _make_dib()
+    header = struct.pack(
+        '<II4i4iIIIIHHIII2i2i',
+        1, 88, 0, 0, 2, 1, 0, 0, 100, 50, 0x464D4520, 0x10000, 0, 3, 0, 0, 0, 0, 0, 1024, 768, 320, 240
+    )
+    fixed = 80
+    stretch = struct.pack(
+        '<II4i6iIIIIIIii',
+        81, fixed + len(bmi) + len(bits), 0, 0, 2, 1, 0, 0, 0, 0, 3, 2,
+        fixed, len(bmi), fixed + len(bmi), len(bits), 0, 0xCC0020, 3, 2
+    ) + bmi + bits
+    records = [struct.pack('<III', 17, 12, 8), stretch]  # EMR_SETMAPMODE + 位图
+    if with_vector:
+        records.append(struct.pack('<II4i', 43, 24, 0, 0, 1, 1))  # EMR_RECTANGLE
+    records.append(struct.pack('<IIIII', 14, 20, 0, 16, 20))  # EMR_EOF
+    return header + b''.join(records)
+
+def _make_wmf():
+    """构造带可放置头、只包含一条 META_DIBSTRETCHBLT 的WMF"""
+    bmi, bits = _make_dib()
+    placeable = struct.pack('<IHhhhhHIH', 0x9AC6CDD7, 0, 0, 0, 300, 200, 1440, 0, 0)
+    header = struct.pack('<HHHIHIH', 1, 9, 0x300, 0, 1, 0, 0)
+    params = struct.pack('<I8h', 0xCC0020, 2, 3, 0, 0, 2, 3, 0, 0) + bmi + bits
+    record = struct.pack('<IH', (6 + len(params)) // 2, 0x0B41) + params
+    return placeable + header + record + struct.pack('<IH', 3, 0)
+
+def test_emf_single_bitmap():
+    """单位图EMF应直接取出位图"""
+    extracted = extract_single_bitmap(_make_emf())
+    assert extracted is not None
+    img_format, image_data, info = extracted
+    assert img_format == "bmp"
+    assert info["format"] == "emf"
+    with Image.open(io.BytesIO(image_data)) as img:
+        assert img.size == (3, 2)
+        assert img.convert("RGB").getpixel((0, 0)) == (10, 200, 30)
+
+def test_emf_with_vector_content():
+    """包含矢量绘制的EMF不做位图提取"""
+    assert extract_single_bitmap(_make_emf(with_vector=True)) is None
+    info = scan_metafile(_make_emf(with_vector=True))
+    assert info["vector_records"] == 1
+    assert len(info["bitmaps"]) == 1
+
+def test_wmf_single_bitmap():
+    """单位图WMF应直接取出位图，并从可放置头读取尺寸"""
+    extracted = extract_single_bitmap(_make_wmf())
+    assert extracted is not None
+    assert extracted[0] == "bmp"
+    assert get_metafile_dimensions(_make_wmf()) == (20, 13)
+
+def test_header_dimensions():
+    """只读取文件头即可得到尺寸，无法识别的数据返回(0, 0)"""
+    assert get_metafile_dimensions(_make_emf()) == (3, 2)
+    assert get_metafile_dimensions(b"not a metafile at all") == (0, 0)
+    assert scan_metafile(_make_emf()[:100]) is not None
+
+if __name__ == "__main__":
+    test_emf_single_bitmap()
+    test_emf_with_vector_content()
+    test_wmf_single_bitmap()
+    test_header_dimensions()
+    print("✅ 图元文件扫描测试通过")
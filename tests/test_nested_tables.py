@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+测试嵌套表格解析：子表格节点、图片归属以及深度和单元格预算上限
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from PIL import Image
+from src.parsers.table_parser import parse_table
+from src.processors.text_processor import DocumentProcessor
+from src.utils.table_columnar import ColumnarTableBuilder
+
+def _make_nested_table(image_path, levels):
+    doc = Document()
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "outer"
+    cell = table.cell(1, 1)
+    for level in range(levels):
+        nested = cell.add_table(rows=2, cols=2)
+        nested.cell(0, 0).text = f"level{level + 1}"
+        cell = nested.cell(1, 1)
+    cell.paragraphs[0].add_run().add_picture(image_path)
+    return table
+
+def _nested_child(cell_node):
+    return next(item for item in cell_node["content"] if item["type"] == "table")
+
+def test_nested_tables():
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "cell.png")
+        Image.new("RGB", (40, 30), (10, 200, 10)).save(image_path)
+        images_dir = os.path.join(tmp, "images")
+        os.makedirs(images_dir)
+
+        table = _make_nested_table(image_path, 3)
+        rows = parse_table(table, 0, {}, images_dir)
+        cell = rows[1][1]
+        for depth in (1, 2, 3):
+            child = _nested_child(cell)
+            assert child["depth"] == depth
+            assert child["rows"][0][0]["content"][0]["text"] == f"level{depth}"
+            # 图片只出现在最内层单元格中
+            assert not any(item["type"] == "image" for item in cell["content"])
+            cell = child["rows"][1][1]
+        assert [item["type"] for item in cell["content"]] == ["image"]
+
+        # 超出深度：只保留展平文本，图片归属最深一层被解析的单元格
+        rows = parse_table(table, 0, {}, images_dir, max_depth=1)
+        cell = _nested_child(rows[1][1])["rows"][1][1]
+        truncated = _nested_child(cell)
+        assert truncated["truncated"] == "max_depth"
+        assert "level2" in truncated["text"] and "level3" in truncated["text"]
+        assert any(item["type"] == "image" for item in cell["content"])
+
+        # 单元格预算不足：第一层嵌套表格即被截断
+        rows = parse_table(table, 0, {}, images_dir, max_nested_cells=3)
+        assert _nested_child(rows[1][1])["truncated"] == "cell_budget"
+
+def test_nested_table_text():
+    """嵌套表格的内容以展平文本出现在父单元格中，列式表示输出相同"""
+    doc = Document()
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "名称"
+    table.cell(0, 1).text = "说明"
+    table.cell(1, 0).text = "外层"
+    inner = table.cell(1, 1).add_table(rows=2, cols=2)
+    for r in range(2):
+        for c in range(2):
+            inner.cell(r, c).text = f"inner{r}{c}"
+    inner.cell(1, 1).add_table(rows=1, cols=1).cell(0, 0).text = "deep"
+
+    processor = DocumentProcessor()
+    rows = parse_table(table, 0, {}, None)
+    text = processor._process_table({"type": "table", "rows": rows})
+    assert "说明:inner00 inner01 inner10 inner11 deep" in text
+
+    # 超出深度的嵌套表格使用其展平文本
+    truncated = parse_table(table, 0, {}, None, max_depth=1)
+    assert processor._process_table({"type": "table", "rows": truncated}) == text
+
+    builder = ColumnarTableBuilder()
+    parse_table(table, 0, {}, None, row_writer=builder)
+    columnar = {"type": "table"}
+    columnar.update(builder.table_node())
+    assert processor._process_table(columnar) == text
+
+if __name__ == "__main__":
+    test_nested_tables()
+    test_nested_table_text()
+    print("✅ 嵌套表格测试通过")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+测试文档级旁路数据包：写出后按 file_path 读回，写出前对节点的修改生效，旧版独立文件可回退读取
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.sidecar_pack import (SidecarPack, SidecarPackReader, load_sidecar, SIDECAR_PACK_FILE,
+                                    SIDECAR_INDEX_FILE)
+
+def test_pack_roundtrip_and_legacy_fallback():
+    with tempfile.TemporaryDirectory() as tmp:
+        smartart = {"type": "smartart", "id": "smartart_1", "text_content": ["  根", "    子"]}
+        embedded = {"type": "embedded_object", "id": "embedded_obj_2", "preview_image": "images/p.emf"}
+        pack = SidecarPack()
+        pack.add("smartart/smartart_1.json", smartart)
+        pack.add("embedded_objects/object_2.json", embedded)
+        # 同一路径只保留首次登记的节点
+        pack.add("smartart/smartart_1.json", {"type": "smartart", "id": "other"})
+        smartart["file_path"] = "smartart/smartart_1.json"
+        # 写出前的修改（如异步转换完成）反映在包中
+        embedded["preview_image"] = "images/p.png"
+        assert pack.write(tmp) == 2
+        assert sorted(os.listdir(tmp)) == [SIDECAR_INDEX_FILE, SIDECAR_PACK_FILE]
+
+        # 旧版输出中的独立文件
+        os.makedirs(os.path.join(tmp, "smartart"))
+        with open(os.path.join(tmp, "smartart", "smartart_old.json"), "w", encoding="utf-8") as f:
+            json.dump({"type": "smartart", "id": "smartart_old"}, f)
+
+        reader = SidecarPackReader(tmp)
+        assert sorted(reader.paths()) == ["embedded_objects/object_2.json", "smartart/smartart_1.json"]
+        assert reader.get("smartart/smartart_1.json") == {k: v for k, v in smartart.items() if k != "file_path"}
+        assert reader.get("embedded_objects/object_2.json")["preview_image"] == "images/p.png"
+        assert load_sidecar(tmp, "smartart/smartart_old.json")["id"] == "smartart_old"
+        assert load_sidecar(tmp, "smartart/missing.json") is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert SidecarPack().write(tmp) == 0
+        assert os.listdir(tmp) == []
+
+if __name__ == "__main__":
+    test_pack_roundtrip_and_legacy_fallback()
+    print("✅ 旁路数据包测试通过")
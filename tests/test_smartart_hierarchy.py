@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+测试SmartArt层次结构提取（按srcOrd排序、超深层级和环状连接）和布局类型识别
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lxml import etree
+from src.extractors import smartart_extractor
+from src.extractors.smartart_extractor import (
+    SmartArtCache, extract_diagram_type, extract_smartart_details, extract_smartart_hierarchy, extract_smartart_text
+)
+
+_NS = ('xmlns:dgm="http://schemas.openxmlformats.org/drawingml/2006/diagram" '
+       'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"')
+
+def _data_model(points, cxns):
+    pts = "".join(
+        f'<dgm:pt modelId="{mid}"{" type=%r" % ptype if ptype else ""}>'
+        f'<dgm:t><a:p><a:r><a:t>{text}</a:t></a:r></a:p></dgm:t></dgm:pt>'
+        for mid, ptype, text in points
+    )
+    links = "".join(f'<dgm:cxn modelId="c{i}" srcId="{src}" destId="{dest}" srcOrd="{order}"/>'
+                    for i, (src, dest, order) in enumerate(cxns))
+    return f'<dgm:dataModel {_NS}><dgm:ptLst>{pts}</dgm:ptLst><dgm:cxnLst>{links}</dgm:cxnLst></dgm:dataModel>'
+
+def test_hierarchy_order_and_tree():
+    xml = _data_model(
+        [("0", "doc", ""), ("1", None, "根"), ("2", None, "子B"), ("3", None, "子A"), ("4", None, "孙")],
+        [("0", "1", 0), ("1", "2", 1), ("1", "3", 0), ("3", "4", 0)]
+    )
+    text_nodes, tree = extract_smartart_hierarchy(xml.encode("utf-8"))
+    assert text_nodes == ["  根", "    子A", "      孙", "    子B"]
+    assert extract_smartart_text(xml) == text_nodes
+    assert tree["model_id"] == "0"
+    root = tree["children"][0]
+    assert root["text"] == "根"
+    assert [child["model_id"] for child in root["children"]] == ["3", "2"]
+    assert root["children"][0]["children"][0]["text"] == "孙"
+
+def test_deep_chain_and_cycle():
+    depth = 5000
+    points = [("0", "doc", "")] + [(str(i), None, f"n{i}") for i in range(1, depth + 1)]
+    cxns = [(str(i), str(i + 1), 0) for i in range(depth)]
+    # 环状连接：最深的节点指回根节点和第一个节点
+    cxns += [(str(depth), "0", 0), (str(depth), "1", 1)]
+    text_nodes, tree = extract_smartart_hierarchy(_data_model(points, cxns))
+    assert len(text_nodes) == depth
+    assert text_nodes[-1] == "  " * depth + f"n{depth}"
+    node = tree
+    for _ in range(depth):
+        assert len(node["children"]) == 1
+        node = node["children"][0]
+    assert node["children"] == []
+
+def _layout_def(unique_id, categories=(), body='<dgm:layoutNode name="listText"/>'):
+    cats = "".join(f'<dgm:cat type="{cat}" pri="{pri}"/>' for cat, pri in categories)
+    return (f'<dgm:layoutDef {_NS} uniqueId="{unique_id}"><dgm:title val=""/>'
+            f'<dgm:catLst>{cats}</dgm:catLst>{body}</dgm:layoutDef>').encode("utf-8")
+
+def test_diagram_type_from_layout_definition():
+    builtin = "urn:microsoft.com/office/officeart/2005/8/layout/"
+    # 内置布局按 uniqueId 识别，不受布局内容中 "listText" 等关键词影响
+    assert extract_diagram_type(_layout_def(builtin + "hierarchy1")) == "hierarchy"
+    assert extract_diagram_type(_layout_def(builtin + "process1", [("list", 500)])) == "process"
+    # 未知布局按优先级最高的已知分类识别
+    assert extract_diagram_type(_layout_def("urn:custom/layout/x", [("picture", 100), ("cycle", 300),
+                                                                    ("list", 400)])) == "cycle"
+    # 都无法确定时回退到关键词
+    assert extract_diagram_type(_layout_def("urn:custom/layout/x")) == "list"
+
+class _FakePart:
+    def __init__(self, partname, blob):
+        self.partname = partname
+        self.blob = blob
+
+class _FakeDocPart:
+    def __init__(self, related_parts):
+        self.related_parts = related_parts
+
+_GRAPHIC_DATA = (
+    '<a:graphicData xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:dgm="http://schemas.openxmlformats.org/drawingml/2006/diagram" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'uri="http://schemas.openxmlformats.org/drawingml/2006/diagram">'
+    '<dgm:relIds r:dm="{dm}" r:lo="{lo}" r:qs="" r:cs=""/></a:graphicData>'
+)
+
+def _count_calls(name, calls):
+    original = getattr(smartart_extractor, name)
+
+    def _wrapper(*args, **kwargs):
+        calls[name] = calls.get(name, 0) + 1
+        return original(*args, **kwargs)
+
+    setattr(smartart_extractor, name, _wrapper)
+    return original
+
+def test_smartart_cache_reuse():
+    """同一部件多次引用只解析一次；批次共享的 layout_types 使相同布局在不同文档中只分类一次"""
+    data_blob = _data_model([("0", "doc", ""), ("1", None, "步骤")], [("0", "1", 0)]).encode("utf-8")
+    layout_blob = _layout_def("urn:microsoft.com/office/officeart/2005/8/layout/process1")
+    graphic_data = etree.fromstring(_GRAPHIC_DATA.format(dm="rId1", lo="rId2"))
+    calls = {}
+    originals = {name: _count_calls(name, calls) for name in ("extract_smartart_hierarchy", "extract_diagram_type")}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            batch_cache = SmartArtCache()
+            results = []
+            for doc in range(2):
+                # 每个文档有自己的部件（部件名相同、内容相同），共享批次的 layout_types
+                doc_part = _FakeDocPart({
+                    "rId1": _FakePart("/word/diagrams/data1.xml", data_blob),
+                    "rId2": _FakePart("/word/diagrams/layout1.xml", layout_blob)
+                })
+                doc_cache = SmartArtCache(layout_types=batch_cache.layout_types)
+                for _ in range(3):
+                    results.append(extract_smartart_details(graphic_data, doc_part, tmp,
+                                                            smartart_extractor._SMARTART_NAMESPACES, doc_cache))
+                assert len(doc_cache.data) == 1 and len(doc_cache.layouts) == 1
+    finally:
+        for name, original in originals.items():
+            setattr(smartart_extractor, name, original)
+
+    # 数据模型每个文档解析一次（部件名缓存只在文档内有效），布局在整个批次只分类一次
+    assert calls == {"extract_smartart_hierarchy": 2, "extract_diagram_type": 1}
+    assert len(batch_cache.layout_types) == 1
+    assert all(r["diagram_type"] == "process" and r["text_content"] == ["  步骤"] for r in results)
+    assert len({r["id"] for r in results}) == 1
+
+if __name__ == "__main__":
+    test_hierarchy_order_and_tree()
+    test_deep_chain_and_cycle()
+    test_diagram_type_from_layout_definition()
+    test_smartart_cache_reuse()
+    print("✅ SmartArt层次结构和布局类型测试通过")
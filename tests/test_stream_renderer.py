@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试流式文本渲染：任意缓冲大小下输出与 process_document_to_text 逐字节相同
+"""
+
+import io
+import os
+import sys
+import gzip
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.processors.text_processor import process_document_to_text, render_document_to_stream
+
+_SEPARATOR = "\n\n\\n\\n\n\n"
+
+def _paragraph(text):
+    return {"type": "paragraph", "text": text}
+
+def _cell(text):
+    return {"content": [{"type": "text", "text": text}]}
+
+def _section(title, level, content):
+    return {"type": "section", "title": title, "level": level, "content": content}
+
+def _document(root_content):
+    return {"metadata": {}, "sections": [_section("", 0, root_content)]}
+
+_TABLE = {"type": "table", "index": 3, "rows": [
+    [_cell("步骤"), _cell("说明")],
+    [_cell("审核"), _cell("  提交\n审批  ")],
+    [_cell("审核"), _cell("归档")],
+    [_cell("发布"), _cell("")]
+]}
+
+_DOCUMENTS = {
+    "sections": _document([
+        # 目录占位章节
+        _section("1 概述 3", 1, []),
+        _section("2 流程说明 5", 1, [_section("2.1 审核 5", 2, [])]),
+        _section("1 概述", 1, [_paragraph("  第一段  "), _paragraph("第二段"), _TABLE,
+                               {"type": "image", "url": "/abs/img.png"}, _paragraph("  ")]),
+        _section("空白章节", 1, [_paragraph("   ")]),
+        # 没有标题的章节不输出，也不追加分隔符
+        _section("", 1, [_paragraph("无标题")]),
+        _section("2 流程说明", 1, [
+            _paragraph("引言"),
+            _section("2.1 审核", 2, [_paragraph("审核内容"), _TABLE,
+                                     _section("2.1.1 细则", 3, [{"type": "list_item", "text": "条目 "}])]),
+            _section("2.2 接口", 2, [])
+        ]),
+        _section("流程示意图", 1, [_paragraph("示意  ")])
+    ]),
+    # 没有一级章节：内容项以空格连接，末尾换行保留
+    "fallback": _document([_paragraph("甲"), _TABLE, _paragraph("乙")]),
+    "empty": {"sections": []}
+}
+
+def test_stream_matches_text():
+    for name, document in _DOCUMENTS.items():
+        expected = process_document_to_text(document, "文档")
+        for buffer_chars in (1, 5, 1 << 16):
+            stream = io.StringIO()
+            stats = render_document_to_stream(document, "文档", stream, buffer_chars=buffer_chars)
+            assert stream.getvalue() == expected, (name, buffer_chars)
+            assert stats["chars"] == len(expected)
+            assert stats["peak_buffered_chars"] <= buffer_chars + 2 * stats["largest_fragment_chars"]
+    assert process_document_to_text(_DOCUMENTS["fallback"], "文档").endswith("\n")
+    assert "<|SECTION|>" in process_document_to_text(_DOCUMENTS["sections"], "文档")
+
+def test_error_path_matches_text():
+    """章节、二级章节和表格中途出错时整体丢弃，两种方式输出相同"""
+    bad_table = {"type": "table", "rows": [
+        [_cell("步骤"), _cell("说明")],
+        [_cell("审核"), _cell("提交")],
+        [_cell("发布"), _cell("上线")],
+        [_cell("归档"), {"content": 5}],
+        [_cell("结束"), _cell("完成")]
+    ]}
+    document = _document([
+        _section("1 概述", 1, [_paragraph("开头"), bad_table, _paragraph("表格之后")]),
+        _section("2 流程", 1, [_section("2.1 细则", 2, [bad_table, _paragraph("细则内容")]),
+                               _section("2.2 其他", 2, [_paragraph("其他内容")])]),
+        _section("3 说明", 1, [_section("3.1 细则", 2, [_paragraph("不会输出"), "不是内容项"])]),
+        _section("4 结尾", 1, [_paragraph("结尾内容")])
+    ])
+    expected = process_document_to_text(document, "文档")
+    for buffer_chars in (1, 1 << 16):
+        stream = io.StringIO()
+        render_document_to_stream(document, "文档", stream, buffer_chars=buffer_chars)
+        assert stream.getvalue() == expected, buffer_chars
+    # 出错的表格和章节不输出任何内容（没有不完整的表格，也没有章节标题），后续内容继续处理
+    assert expected == (
+        "文档-1 概述：\n<|PARAGRAPH|>开头</|PARAGRAPH|>\n<|PARAGRAPH|>表格之后</|PARAGRAPH|>" + _SEPARATOR +
+        "文档-2 流程：\n<|SECTION|>\n    文档-2 流程-2.1 细则：\n    <|PARAGRAPH|>细则内容</|PARAGRAPH|>\n</|SECTION|>"
+        "\n<|SECTION|>\n    文档-2 流程-2.2 其他：\n    <|PARAGRAPH|>其他内容</|PARAGRAPH|>\n</|SECTION|>" + _SEPARATOR +
+        "文档-4 结尾：\n<|PARAGRAPH|>结尾内容</|PARAGRAPH|>" + _SEPARATOR.rstrip()
+    )
+
+def test_large_table_fragments():
+    """表格逐行写出：单个片段的长度与表格行数无关"""
+    rows = [[_cell("编号"), _cell("说明")]] + [[_cell(f"分组{k // 3}"), _cell(f"第{k}行说明")] for k in range(3000)]
+    document = _document([
+        _section("1 概述", 1, [{"type": "table", "rows": rows}]),
+        _section("2 流程", 1, [_section("2.1 明细", 2, [{"type": "table", "rows": rows}])])
+    ])
+    expected = process_document_to_text(document, "文档")
+    stream = io.StringIO()
+    stats = render_document_to_stream(document, "文档", stream, buffer_chars=256)
+    assert stream.getvalue() == expected
+    assert len(expected) > 100000
+    assert stats["largest_fragment_chars"] < 100
+    assert stats["peak_buffered_chars"] <= 256 + 2 * stats["largest_fragment_chars"]
+
+def test_stream_to_gzip_with_memory_stats():
+    document = _DOCUMENTS["sections"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "processed_text.txt.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as stream:
+            stats = render_document_to_stream(document, "文档", stream, buffer_chars=64, measure_memory=True)
+        with gzip.open(path, "rt", encoding="utf-8") as stream:
+            assert stream.read() == process_document_to_text(document, "文档")
+    assert stats["peak_memory_bytes"] > 0
+
+if __name__ == "__main__":
+    test_stream_matches_text()
+    test_error_path_matches_text()
+    test_large_table_fragments()
+    test_stream_to_gzip_with_memory_stats()
+    print("✅ 流式文本渲染测试通过")
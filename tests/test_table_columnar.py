@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+测试表格列式表示：还原的行结构和标准化文本与逐行处理一致（包括含嵌套表格的单元格）
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from src.utils.table_columnar import ColumnarTableBuilder, columnar_to_rows, run_starts
+from src.processors.text_processor import DocumentProcessor
+from src.parsers.batch_processor import process_docx_folder
+
+def _random_nested(rng):
+    """嵌套表格：展平文本可能为空（空单元格或截断后没有文本）"""
+    if rng.random() < 0.3:
+        return {"type": "table", "truncated": "max_depth", "text": rng.choice(["", " 子表 "])}
+    cells = [{"type": "table_cell", "row": 0, "col": c,
+              "content": [{"type": "text", "text": rng.choice(["子项", "", "  "])}]} for c in range(2)]
+    return {"type": "table", "depth": 1, "rows": [cells]}
+
+def _random_rows(rng):
+    rows = []
+    for row_idx in range(rng.randint(1, 40)):
+        row = []
+        for pos in range(rng.choice([0, 2, 3, 4, 4, 4])):
+            content = []
+            if rng.random() < 0.85:
+                content.append({"type": "text", "text": rng.choice(["登录", "查询", " 登录 ", "a b", "   "])})
+            if rng.random() < 0.1:
+                content.append({"type": "image", "url": "images/img_0000000000000000.png"})
+            if rng.random() < 0.15:
+                content.extend(_random_nested(rng) for _ in range(rng.choice([1, 2])))
+            row.append({"type": "table_cell", "row": row_idx, "col": pos + rng.randint(0, 1), "content": content})
+        rows.append(row)
+    return rows
+
+def test_columnar_matches_rows():
+    processor = DocumentProcessor()
+    for seed in range(200):
+        rows = _random_rows(random.Random(seed))
+        builder = ColumnarTableBuilder()
+        for row in rows:
+            builder.write_row(row)
+        table_item = {"type": "table", "index": 2}
+        table_item.update(builder.table_node())
+        # 经过JSON序列化，与读取 document.json 时相同
+        table_item = json.loads(json.dumps(table_item, ensure_ascii=False))
+
+        assert columnar_to_rows(table_item["columnar"]) == rows
+        assert processor._process_table(table_item) == processor._process_table({"type": "table", "rows": rows})
+
+def test_batch_columnar_tables():
+    """批量处理同样可启用列式表示，标准化文本与按行保存时相同"""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "in")
+        os.makedirs(input_dir)
+        doc = Document()
+        doc.add_heading("1 概述", 1)
+        doc.add_paragraph("参数说明")
+        doc.add_heading("2 参数", 1)
+        table = doc.add_table(rows=4, cols=2)
+        for r in range(4):
+            table.cell(r, 0).text = "分组" if r else "名称"
+            table.cell(r, 1).text = f"值{r}"
+        doc.save(os.path.join(input_dir, "doc.docx"))
+
+        texts = {}
+        for name, rows in (("rows", None), ("columnar", 2)):
+            output_dir = os.path.join(tmp, name)
+            process_docx_folder(input_dir, output_dir, columnar_table_rows=rows)
+            with open(os.path.join(output_dir, "doc", "document.json"), "r", encoding="utf-8") as f:
+                assert ('"columnar"' in f.read()) == (rows is not None)
+            with open(os.path.join(output_dir, "doc", "processed_text.txt"), "r", encoding="utf-8") as f:
+                texts[name] = f.read()
+        assert "<|RSPAN|>" in texts["rows"] and texts["columnar"] == texts["rows"]
+
+def test_run_starts():
+    assert run_starts([]) == []
+    assert run_starts(["a", "a", "", "", "b", "a", "a", "a"]) == [0, 2, 3, 4, 5]
+
+if __name__ == "__main__":
+    test_columnar_matches_rows()
+    test_batch_columnar_tables()
+    test_run_starts()
+    print("✅ 表格列式表示测试通过")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+测试表格单元格图片提取：直接在元素上查询与序列化为XML字符串的结果一致，
+没有图片的表格跳过逐单元格的图片查找
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from PIL import Image
+
+from src.extractors.image_extractor import extract_images_from_element, extract_images_from_xml, has_blip
+from src.parsers import table_parser
+from src.parsers.table_parser import parse_table
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 12), (10, 200, 10)).save(buffer, "PNG")
+    buffer.seek(0)
+    return buffer
+
+def test_cell_image_matches_xml_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = Document()
+        doc.add_paragraph().add_run().add_picture(_png())
+        table = doc.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = "图片"
+        table.cell(1, 1).paragraphs[0].add_run().add_picture(_png())
+        assert has_blip(table._tbl)
+
+        images_dir = os.path.join(tmp, "images")
+        cell = table.cell(1, 1)
+        from_element = extract_images_from_element(cell._tc, cell.part, images_dir, {}, "ctx")
+        from_xml = extract_images_from_xml(cell._tc.xml, cell.part, images_dir, {}, "ctx")
+        assert len(from_element) == 1 and from_element == from_xml
+        assert extract_images_from_element(table.cell(0, 0)._tc, cell.part, images_dir, {}, "ctx") == []
+
+        rows = parse_table(table, 0, {}, images_dir)
+        (image,) = [item for item in rows[1][1]["content"] if item["type"] == "image"]
+        assert image["url"] == from_element[0]["url"] and (image["width"], image["height"]) == (16, 12)
+        assert all(item["type"] == "text" for item in rows[0][0]["content"])
+
+def test_image_free_table_skips_lookup():
+    doc = Document()
+    # 文档其他位置有图片，但表格本身没有
+    doc.add_paragraph().add_run().add_picture(_png())
+    table = doc.add_table(rows=3, cols=3)
+    for r in range(3):
+        for c in range(3):
+            table.cell(r, c).text = f"{r}{c}"
+    assert not has_blip(table._tbl)
+
+    calls = []
+    original = table_parser.extract_table_images
+    table_parser.extract_table_images = lambda *args, **kwargs: calls.append(args) or []
+    try:
+        rows = parse_table(table, 0, {}, None)
+    finally:
+        table_parser.extract_table_images = original
+    assert calls == []
+    assert [cell["content"][0]["text"] for cell in rows[2]] == ["20", "21", "22"]
+
+if __name__ == "__main__":
+    test_cell_image_matches_xml_path()
+    test_image_free_table_skips_lookup()
+    print("✅ 表格图片提取测试通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试表格解析：直接遍历 w:tc 的结果与逐行读取 python-docx row.cells / cell.text 的原实现一致
+（横向/纵向合并、gridBefore 行、制表符和换行）
+"""
+
+import os
+import sys
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from src.parsers.table_parser import parse_table
+from src.utils.document_utils import identify_merged_cells
+from src.utils.text_utils import clean_text
+
+def reference_rows(table):
+    """原实现：逐行读取 row.cells，单元格文本取 cell.text"""
+    merged_cells = identify_merged_cells(table)
+    rows = []
+    for row_idx, row in enumerate(table.rows):
+        row_nodes = []
+        for cell_idx, cell in enumerate(row.cells):
+            if (row_idx, cell_idx) in merged_cells:
+                continue
+            content = []
+            cell_text = clean_text(cell.text)
+            if cell_text:
+                content.append({"type": "text", "text": cell_text})
+            row_nodes.append({"type": "table_cell", "row": row_idx, "col": cell_idx, "content": content})
+        rows.append(row_nodes)
+    return rows
+
+def _fill(table):
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            if not cell.text:
+                cell.text = f"r{r}c{c}"
+
+def test_merged_table_matches_row_cells():
+    doc = Document()
+    table = doc.add_table(rows=5, cols=4)
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(3, 2))
+    table.cell(2, 0).merge(table.cell(3, 1))
+    _fill(table)
+    # 制表符、换行和多段落
+    run = table.cell(4, 3).paragraphs[0].add_run("a\tb")
+    run.add_break()
+    run.add_text("c")
+    table.cell(4, 3).add_paragraph("第二段")
+    assert parse_table(table, 0, {}, None) == reference_rows(table)
+
+def test_grid_before_matches_row_cells():
+    doc = Document()
+    table = doc.add_table(rows=3, cols=4)
+    _fill(table)
+    # 第1行从第2列开始：删除前两个单元格并声明 gridBefore=2
+    tr = table._tbl.tr_lst[1]
+    for tc in tr.tc_lst[:2]:
+        tr.remove(tc)
+    tr.insert(0, parse_xml(f'<w:trPr {nsdecls("w")}><w:gridBefore w:val="2"/></w:trPr>'))
+    # 第2行纵向合并到第1行第2列的单元格
+    table._tbl.tr_lst[1].tc_lst[0].get_or_add_tcPr().vMerge_val = "restart"
+    table._tbl.tr_lst[2].tc_lst[2].get_or_add_tcPr().vMerge_val = "continue"
+
+    rows = parse_table(table, 0, {}, None)
+    assert rows == reference_rows(table)
+    assert [cell["content"][0]["text"] for cell in rows[1]] == ["r1c2", "r1c3"]
+    assert rows[2][2]["content"] == rows[1][0]["content"]
+
+if __name__ == "__main__":
+    test_merged_table_matches_row_cells()
+    test_grid_before_matches_row_cells()
+    print("✅ 表格解析与 row.cells 原实现一致")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+测试超大表格旁路文件：写入旁路文件后的结构和标准化文本与内存中的表格一致
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from PIL import Image
+from src.parsers.document_parser import parse_docx
+from src.processors.text_processor import process_document_to_text
+from src.utils.table_sidecar import iter_sidecar_rows, iter_sidecar_tables
+
+def _make_docx(path, image_path):
+    doc = Document()
+    doc.add_heading("1 概述", 1)
+    doc.add_heading("1.1 需求", 2)
+    table = doc.add_table(rows=40, cols=4)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"H{j}" if i == 0 else (f"g{i // 3}" if j == 0 else f"v{i}-{j}")
+    table.cell(7, 2).paragraphs[0].add_run().add_picture(image_path)
+    doc.save(path)
+
+def _find_table(node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if current.get("type") == "table":
+                return current
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return None
+
+def test_spilled_table_matches_inline():
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "cell.png")
+        Image.new("RGB", (40, 30), (200, 10, 10)).save(image_path)
+        docx_path = os.path.join(tmp, "big_table.docx")
+        _make_docx(docx_path, image_path)
+
+        inline_dir = os.path.join(tmp, "inline")
+        spill_dir = os.path.join(tmp, "spill")
+        inline = parse_docx(docx_path, inline_dir)
+        spilled = parse_docx(docx_path, spill_dir, table_spill_rows=10)
+
+        inline_table = _find_table(inline)
+        spilled_table = _find_table(spilled)
+        assert "rows" not in spilled_table
+        assert spilled_table["row_count"] == 40 and spilled_table["column_count"] == 4
+        assert spilled_table["header_row"] == inline_table["rows"][0]
+        assert list(iter_sidecar_tables(spilled)) == [spilled_table]
+        # 单元格图片在物化后回写到旁路文件
+        assert list(iter_sidecar_rows(spill_dir, spilled_table)) == inline_table["rows"]
+        assert spilled["processing_info"]["tables_spilled"] == 1
+
+        assert process_document_to_text(spilled, "demo", spill_dir) == process_document_to_text(inline, "demo", inline_dir)
+
+if __name__ == "__main__":
+    test_spilled_table_matches_inline()
+    print("✅ 超大表格旁路文件测试通过")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试ZIP成员的字节范围读取和流式写出；虚拟图片节点（不读取图片部件数据）及其文本渲染
+"""
+
+import os
+import sys
+import zlib
+import hashlib
+import zipfile
+import tempfile
+
+# 添加父目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from docx.parts.image import ImagePart
+from PIL import Image
+from src.utils.zip_media import (get_member_locations, read_virtual_image, open_virtual_image, copy_virtual_image,
+                                  stream_member_to_dir)
+from src.parsers.document_parser import parse_docx
+from src.processors.text_processor import process_document_to_text
+
+def _make_zip(path):
+    """构造同时包含压缩和未压缩成员的ZIP"""
+    payload = os.urandom(4096) + b"A" * 200000
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("word/media/image1.png", payload, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("word/media/image2.jpg", payload[:5000], compress_type=zipfile.ZIP_STORED)
+    return payload
+
+def test_virtual_read():
+    """按记录的偏移读回的数据与原成员一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "doc.docx")
+        payload = _make_zip(zip_path)
+        locations = get_member_locations(zip_path)
+        deflated = locations["word/media/image1.png"]
+        stored = locations["word/media/image2.jpg"]
+        assert deflated["compress_type"] == zipfile.ZIP_DEFLATED
+        assert deflated["size"] == len(payload)
+        assert read_virtual_image(zip_path, deflated) == payload
+        assert read_virtual_image(zip_path, stored) == payload[:5000]
+        for source in (deflated, stored):
+            assert open_virtual_image(zip_path, source).read() == read_virtual_image(zip_path, source)
+
+        dest = os.path.join(tmp, "out.bin")
+        assert copy_virtual_image(zip_path, deflated, dest, chunk_size=1000) == len(payload)
+        with open(dest, "rb") as f:
+            assert f.read() == payload
+
+        # 原始文档被修改后CRC校验失败
+        broken = dict(stored, crc32=zlib.crc32(b"other"))
+        for reader in (read_virtual_image, open_virtual_image):
+            try:
+                reader(zip_path, broken)
+                assert False, "应当检测到CRC不一致"
+            except IOError:
+                pass
+
+def test_stream_member_to_dir():
+    """流式写出按内容hash命名，重复内容不产生新文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "doc.docx")
+        payload = _make_zip(zip_path)
+        out_dir = os.path.join(tmp, "images")
+        os.makedirs(out_dir)
+        with zipfile.ZipFile(zip_path) as zf:
+            content_hash, size, filename = stream_member_to_dir(zf, "word/media/image1.png", out_dir, ".png", chunk_size=777)
+            again = stream_member_to_dir(zf, "word/media/image1.png", out_dir, ".png")
+        assert content_hash == hashlib.sha256(payload).hexdigest()
+        assert size == len(payload)
+        assert filename == f"img_{content_hash[:16]}.png"
+        assert again == (content_hash, size, filename)
+        assert os.listdir(out_dir) == [filename]
+
+def _find_all(node, node_type):
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if current.get("type") == node_type:
+                found.append(current)
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return found
+
+def test_virtual_image_nodes():
+    """虚拟模式：节点只记录字节范围，不读取图片部件数据，文本中渲染为 文档路径#成员名"""
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "pic.png")
+        Image.new("RGB", (40, 30), (200, 10, 10)).save(image_path)
+        document = Document()
+        document.add_heading("1 概述", level=1)
+        document.add_paragraph("正文")
+        document.add_paragraph().add_run().add_picture(image_path)
+        docx_path = os.path.join(tmp, "doc.docx")
+        document.save(docx_path)
+
+        original_blob = ImagePart.blob
+
+        def _no_blob(part):
+            raise AssertionError("虚拟模式不应读取图片部件数据")
+
+        out_dir = os.path.join(tmp, "out")
+        ImagePart.blob = property(_no_blob)
+        try:
+            result = parse_docx(docx_path, out_dir, image_mode="virtual")
+        finally:
+            ImagePart.blob = original_blob
+
+        images = _find_all(result["sections"], "image")
+        assert images
+        for image in images:
+            assert "url" not in image and image["source"]["member"] == "word/media/image1.png"
+            assert (image["width"], image["height"]) == (40, 30)
+            with open(image_path, "rb") as f:
+                data = f.read()
+            assert image["sha256"] == hashlib.sha256(data).hexdigest()
+            assert read_virtual_image(docx_path, image["source"]) == data
+        assert not os.path.exists(os.path.join(out_dir, "images")) or not os.listdir(os.path.join(out_dir, "images"))
+
+        text = process_document_to_text(result, "doc", out_dir)
+        assert f"<|IMAGE|>![image]({os.path.abspath(docx_path)}#word/media/image1.png)</|IMAGE|>" in text
+
+if __name__ == "__main__":
+    test_virtual_read()
+    test_stream_member_to_dir()
+    test_virtual_image_nodes()
+    print("✅ ZIP成员读取测试通过")